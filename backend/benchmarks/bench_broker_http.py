@@ -0,0 +1,160 @@
+"""
+Benchmark: pooled vs per-call HTTP clients for stock broker APIs.
+
+Starts a local aiohttp stand-in for the Tradier API (with --tls, over HTTPS
+using a throwaway self-signed certificate) and times the same Tradier calls
+two ways:
+  - per-call: a new httpx.AsyncClient per request, as the broker clients did
+    before pooling (TCP + TLS setup every time)
+  - pooled:   TradierClient on the shared BrokerHTTPPool (keep-alive)
+
+Reports median and p95 latency per request for sequential and concurrent
+calls. --delay-ms adds server-side latency to emulate a remote API.
+
+Usage (from backend/):
+    python benchmarks/bench_broker_http.py
+    python benchmarks/bench_broker_http.py --tls --requests 500 --concurrency 20
+"""
+
+import argparse
+import asyncio
+import datetime
+import os
+import ssl
+import statistics
+import sys
+import tempfile
+import time
+
+from aiohttp import web
+import httpx
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.stock_broker_service import BrokerHTTPPool, TradierClient  # noqa: E402
+
+PROFILE = {
+    "profile": {
+        "id": "bench",
+        "account": [
+            {"account_number": f"VA{i:06d}", "type": "margin", "value": "1000",
+             "cash": {"cash_available": "100"}, "buying_power": "200"}
+            for i in range(3)
+        ],
+    }
+}
+
+
+def self_signed_context() -> ssl.SSLContext:
+    """Server SSL context with a fresh self-signed localhost certificate."""
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "localhost")])
+    now = datetime.datetime.utcnow()
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name).issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now).not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    folder = tempfile.mkdtemp(prefix="bench-broker-http-")
+    cert_path, key_path = os.path.join(folder, "cert.pem"), os.path.join(folder, "key.pem")
+    with open(cert_path, "wb") as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, "wb") as f:
+        f.write(key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        ))
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(cert_path, key_path)
+    return context
+
+
+async def start_server(port: int, tls: bool, delay: float) -> web.AppRunner:
+    async def profile(request: web.Request) -> web.Response:
+        if delay:
+            await asyncio.sleep(delay)
+        return web.json_response(PROFILE)
+
+    app = web.Application()
+    app.router.add_get("/v1/user/profile", profile)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port, ssl_context=self_signed_context() if tls else None).start()
+    return runner
+
+
+async def timed(call, count: int, concurrency: int) -> list:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            await call()
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(one() for _ in range(count)))
+    return latencies
+
+
+def report(label: str, latencies: list, elapsed: float) -> None:
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(
+        f"  {label:<10} median {statistics.median(latencies) * 1000:7.2f} ms  "
+        f"p95 {p95 * 1000:7.2f} ms  {len(latencies) / elapsed:8.0f} req/s"
+    )
+
+
+async def main(args) -> None:
+    runner = await start_server(args.port, args.tls, args.delay_ms / 1000)
+    base_url = f"{'https' if args.tls else 'http'}://127.0.0.1:{args.port}/v1"
+    headers = {"Authorization": "Bearer bench", "Accept": "application/json"}
+
+    async def per_call():
+        async with httpx.AsyncClient(verify=False) as client:
+            response = await client.get(f"{base_url}/user/profile", headers=headers)
+            response.raise_for_status()
+            return response.json()
+
+    # Same pool settings, but trusting the stand-in's self-signed certificate
+    defaults = BrokerHTTPPool()
+    pool = BrokerHTTPPool(transport=httpx.AsyncHTTPTransport(
+        verify=False, http2=defaults.http2, limits=defaults.limits,
+    ))
+    tradier = TradierClient("bench", pool=pool)
+    tradier.base_url = base_url
+
+    async def pooled():
+        return await tradier.get_profile()
+
+    try:
+        for concurrency in (1, args.concurrency):
+            print(f"{args.requests} requests, concurrency {concurrency}, {'https' if args.tls else 'http'}:")
+            for label, call in (("per-call", per_call), ("pooled", pooled)):
+                await call()  # warm up
+                started = time.perf_counter()
+                latencies = await timed(call, args.requests, concurrency)
+                report(label, latencies, time.perf_counter() - started)
+    finally:
+        await pool.close()
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--delay-ms", type=float, default=0, help="server-side latency per request")
+    parser.add_argument("--tls", action="store_true", help="serve HTTPS with a self-signed certificate")
+    parser.add_argument("--port", type=int, default=8765)
+    asyncio.run(main(parser.parse_args()))
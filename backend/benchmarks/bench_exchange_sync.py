@@ -0,0 +1,135 @@
+"""
+Benchmark: end-to-end exchange sync throughput against the fake exchange.
+
+Runs `sync_trades_to_db` for a fresh connection whose venue holds N fills
+(served by tests/fake_exchange.py with configurable latency), then re-syncs
+it to measure the incremental path. Reports fills/s, exchange API calls and
+database round trips for each size.
+
+Runs against a local mongod (MONGODB_URL). --mock swaps in mongomock to
+smoke-test the harness without a server; its upserts scan the collection,
+so timings there are meaningless beyond a few thousand fills.
+
+Usage (from backend/):
+    MONGODB_URL=mongodb://localhost:27017 python benchmarks/bench_exchange_sync.py --fills 1000 10000 100000 1000000
+    python benchmarks/bench_exchange_sync.py --fills 1000 --latency-ms 20 --exchange bybit
+    python benchmarks/bench_exchange_sync.py --mock --fills 500
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import exchange_service  # noqa: E402
+from services.exchange_service import encrypt_api_key, sync_trades_to_db  # noqa: E402
+from tests.fake_exchange import (  # noqa: E402
+    CountingDatabase, FakeExchange, install_fake_exchange, synthetic_fills,
+)
+
+BENCH_DATABASE = "tradetracking_bench"
+SYMBOLS = ["BTC/USDT", "ETH/USDT", "SOL/USDT", "XRP/USDT", "DOGE/USDT", "ADA/USDT", "AVAX/USDT", "LINK/USDT"]
+
+
+async def open_database(mongo_url, mock):
+    if not mock:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        from pymongo import ASCENDING, IndexModel
+
+        client = AsyncIOMotorClient(mongo_url)
+        await client.drop_database(BENCH_DATABASE)
+        db = client[BENCH_DATABASE]
+        await db["trades"].create_indexes([
+            IndexModel(
+                [("user_id", ASCENDING), ("source", ASCENDING), ("external_id", ASCENDING)],
+                unique=True,
+                partialFilterExpression={"external_id": {"$exists": True}},
+            )
+        ])
+        return client, db
+
+    from mongomock_motor import AsyncMongoMockClient
+
+    client = AsyncMongoMockClient()
+    return client, client[BENCH_DATABASE]
+
+
+async def run_sync(label: str, connection, db, fake: FakeExchange) -> dict:
+    counting = CountingDatabase(db)
+    fake.calls.clear()
+    started = time.perf_counter()
+    result = await sync_trades_to_db(connection, counting)
+    elapsed = time.perf_counter() - started
+    if not result.get("success"):
+        raise RuntimeError(result.get("error"))
+
+    rate = result["total_fetched"] / elapsed if elapsed else 0
+    print(
+        f"  {label:<12} {elapsed:8.2f} s  {rate:10.0f} fills/s  "
+        f"synced={result['synced_trades']:<8} pages={result['pages']:<6} "
+        f"api_calls={fake.api_calls:<6} db_round_trips={counting.total}"
+    )
+    return result
+
+
+async def bench(size: int, args, db) -> None:
+    fake = FakeExchange(
+        args.exchange,
+        fills=synthetic_fills(size, SYMBOLS[: args.symbols]),
+        latency=args.latency_ms / 1000,
+        rate_limit_ms=args.rate_limit_ms,
+        all_symbols=args.exchange in ("bybit", "okx"),
+    )
+    install_fake_exchange(exchange_service, fake)
+
+    connection = {
+        "user_id": f"bench-{size}",
+        "exchange": args.exchange,
+        "api_key_encrypted": encrypt_api_key("key"),
+        "api_secret_encrypted": encrypt_api_key("secret"),
+        "passphrase_encrypted": None,
+    }
+    await db["exchange_connections"].insert_one(connection)
+
+    print(f"{size} fills, {args.symbols} symbols, {args.latency_ms} ms/call, page limit {exchange_service.EXCHANGE_SYNC_PAGE_LIMIT}:")
+    await run_sync("full sync", connection, db, fake)
+
+    # Incremental sync: a handful of new fills past the stored watermarks
+    newest = fake.fills[-1]["timestamp"] if fake.fills else 0
+    extra = synthetic_fills(args.new_fills, SYMBOLS[: args.symbols], start_ms=newest + 1, span_ms=60_000, seed=size)
+    for i, fill in enumerate(extra):
+        fill["id"] = f"new{i}"
+    fake.set_fills(fake.fills + extra)
+    stored = await db["exchange_connections"].find_one({"_id": connection["_id"]})
+    await run_sync("incremental", stored, db, fake)
+
+    await exchange_service.exchange_clients.close()
+
+
+async def main(args) -> None:
+    exchange_service.EXCHANGE_SYNC_PAGE_LIMIT = args.page_limit
+    client, db = await open_database(args.mongo, args.mock)
+    try:
+        for size in args.fills:
+            await bench(size, args, db)
+    finally:
+        if not args.mock:
+            await client.drop_database(BENCH_DATABASE)
+            client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fills", type=int, nargs="+", default=[1000, 10000, 100000, 1000000])
+    parser.add_argument("--symbols", type=int, default=4, help=f"symbols traded (max {len(SYMBOLS)})")
+    parser.add_argument("--exchange", default="binance", help="binance syncs per symbol; bybit/okx fetch all symbols at once")
+    parser.add_argument("--latency-ms", type=float, default=0, help="simulated latency per API call")
+    parser.add_argument("--rate-limit-ms", type=float, default=1, help="advertised rateLimit of the fake venue")
+    parser.add_argument("--page-limit", type=int, default=exchange_service.EXCHANGE_SYNC_PAGE_LIMIT)
+    parser.add_argument("--new-fills", type=int, default=50, help="fills added before the incremental sync")
+    parser.add_argument("--mongo", default=os.getenv("MONGODB_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--mock", action="store_true", help="use in-memory mongomock instead of --mongo")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,64 @@
+"""
+Benchmark: API cold-start time.
+
+Imports `main` in fresh interpreters and reports the median wall time, plus
+which heavy optional dependencies (ccxt, pandas, stripe) the import pulled
+in. None of them should load before first use; a regression shows up here
+as a slower import and a non-empty "heavy modules" list.
+
+Usage (from backend/):
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --runs 20 --module services.exchange_service
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ["ccxt", "pandas", "stripe", "numpy"]
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(json.dumps({{
+    "seconds": elapsed,
+    "modules": len(sys.modules),
+    "heavy": [m for m in {heavy!r} if m in sys.modules],
+}}))
+"""
+
+
+def measure(module: str) -> dict:
+    """Import `module` in a fresh interpreter and return the probe result."""
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY_MODULES)],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(args) -> None:
+    # First run warms the bytecode cache and is not counted
+    measure(args.module)
+    runs = [measure(args.module) for _ in range(args.runs)]
+    times = sorted(r["seconds"] for r in runs)
+
+    print(f"import {args.module}: {args.runs} runs")
+    print(f"  median {statistics.median(times) * 1000:8.1f} ms")
+    print(f"  min    {times[0] * 1000:8.1f} ms")
+    print(f"  max    {times[-1] * 1000:8.1f} ms")
+    print(f"  modules loaded: {runs[-1]['modules']}")
+    print(f"  heavy modules:  {', '.join(runs[-1]['heavy']) or 'none'}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--module", default="main", help="module to import")
+    main(parser.parse_args())
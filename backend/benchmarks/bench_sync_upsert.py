@@ -0,0 +1,113 @@
+"""
+Benchmark: storing a page of synced trades against a local mongod.
+
+Compares the old per-trade dedupe (find_one + insert_one per trade, no
+supporting index) with one unordered bulk of $setOnInsert upserts on the
+unique (user_id, source, external_id) index. Each strategy writes a fresh
+page and then re-writes it, since repeat syncs mostly hit stored trades.
+
+Usage (from backend/):
+    MONGODB_URL=mongodb://localhost:27017 python benchmarks/bench_sync_upsert.py --trades 500
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, IndexModel
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.trade_store import bulk_upsert_trades  # noqa: E402
+
+BENCH_DATABASE = "tradetracking_bench"
+
+
+def make_trades(count: int, user_id: str):
+    start = datetime.utcnow() - timedelta(days=30)
+    return [
+        {
+            "user_id": user_id,
+            "source": "binance",
+            "external_id": str(i),
+            "symbol": "BTC/USDT",
+            "side": "BUY" if i % 2 else "SELL",
+            "quantity": 0.01,
+            "entry_price": 40000.0 + i,
+            "entry_time": start + timedelta(seconds=i),
+            "fee": 0.1,
+            "fee_currency": "USDT",
+            "pnl": None,
+            "status": "CLOSED",
+            "synced_at": datetime.utcnow(),
+        }
+        for i in range(count)
+    ]
+
+
+async def store_one_by_one(db, trades) -> int:
+    inserted = 0
+    for trade in trades:
+        existing = await db["trades"].find_one({
+            "user_id": trade["user_id"],
+            "source": trade["source"],
+            "external_id": trade["external_id"],
+        })
+        if not existing:
+            await db["trades"].insert_one(dict(trade))
+            inserted += 1
+    return inserted
+
+
+async def store_bulk(db, trades) -> int:
+    return (await bulk_upsert_trades(db, trades))["inserted"]
+
+
+async def timed(label: str, fn, db, trades):
+    started = time.perf_counter()
+    inserted = await fn(db, trades)
+    elapsed = time.perf_counter() - started
+    print(f"  {label:<28} {elapsed * 1000:9.1f} ms  inserted={inserted}")
+    return elapsed
+
+
+async def main(trade_count: int) -> None:
+    client = AsyncIOMotorClient(os.getenv("MONGODB_URL", "mongodb://localhost:27017"))
+    db = client[BENCH_DATABASE]
+    await client.drop_database(BENCH_DATABASE)
+
+    print(f"Storing {trade_count} trades per sync page")
+
+    print("find_one + insert_one per trade (baseline):")
+    trades = make_trades(trade_count, "baseline")
+    baseline_new = await timed("new page", store_one_by_one, db, trades)
+    baseline_repeat = await timed("repeat page", store_one_by_one, db, trades)
+
+    await db["trades"].create_indexes([
+        IndexModel(
+            [("user_id", ASCENDING), ("source", ASCENDING), ("external_id", ASCENDING)],
+            unique=True,
+            partialFilterExpression={"external_id": {"$exists": True}},
+        )
+    ])
+
+    print("bulk_write of $setOnInsert upserts:")
+    trades = make_trades(trade_count, "bulk")
+    bulk_new = await timed("new page", store_bulk, db, trades)
+    bulk_repeat = await timed("repeat page", store_bulk, db, trades)
+
+    print(f"Speedup: new page {baseline_new / bulk_new:.1f}x, repeat page {baseline_repeat / bulk_repeat:.1f}x")
+
+    await client.drop_database(BENCH_DATABASE)
+    client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trades", type=int, default=500, help="trades per sync page")
+    args = parser.parse_args()
+    asyncio.run(main(args.trades))
@@ -0,0 +1,84 @@
+"""
+Database settings for TradeTracking.io, read from MONGODB_* environment
+variables (e.g. MONGODB_URL, MONGODB_MAX_POOL_SIZE).
+"""
+
+from importlib.util import find_spec
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+from pydantic import Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+load_dotenv()
+
+# Python packages each wire compressor needs; zlib is always available
+COMPRESSOR_MODULES = {"zstd": "zstandard", "snappy": "snappy", "zlib": "zlib"}
+
+
+class DatabaseSettings(BaseSettings):
+    model_config = SettingsConfigDict(env_prefix="MONGODB_")
+
+    url: str = "mongodb://localhost:27017"
+    database: str = "tradetracking"
+
+    # Connection pool (per worker process)
+    max_pool_size: int = 100
+    min_pool_size: int = 0
+    max_connecting: int = 2
+    max_idle_time_ms: Optional[int] = None
+    wait_queue_timeout_ms: Optional[int] = None
+
+    # Timeouts
+    connect_timeout_ms: int = 5000
+    server_selection_timeout_ms: int = 5000
+    socket_timeout_ms: Optional[int] = None
+
+    # Wire compression in order of preference; ones whose package is not
+    # installed are skipped
+    compressors: str = "zstd,snappy,zlib"
+
+    # Read preference per kind of operation. Analytics aggregations can run
+    # on secondaries; CRUD reads stay on the primary.
+    crud_read_preference: str = "primary"
+    analytics_read_preference: str = "secondaryPreferred"
+    # MongoDB requires at least 90 seconds
+    analytics_max_staleness_seconds: int = Field(90, ge=90)
+    # After a user's own write, their reads go to the primary for this long
+    # so they never see analytics missing their change
+    read_your_writes_seconds: float = 90
+
+    # Monitoring (mongo_monitor.py): commands at least this slow are logged,
+    # and with debug_headers responses report their database round trips
+    slow_command_ms: float = 100
+    debug_headers: bool = False
+
+    def available_compressors(self) -> List[str]:
+        return [
+            name for name in (c.strip() for c in self.compressors.split(","))
+            if name in COMPRESSOR_MODULES and find_spec(COMPRESSOR_MODULES[name])
+        ]
+
+    def client_options(self) -> Dict[str, Any]:
+        """Keyword arguments for AsyncIOMotorClient."""
+        options: Dict[str, Any] = {
+            "maxPoolSize": self.max_pool_size,
+            "minPoolSize": self.min_pool_size,
+            "maxConnecting": self.max_connecting,
+            "connectTimeoutMS": self.connect_timeout_ms,
+            "serverSelectionTimeoutMS": self.server_selection_timeout_ms,
+            "appname": "tradetracking-api",
+        }
+        optional = {
+            "maxIdleTimeMS": self.max_idle_time_ms,
+            "waitQueueTimeoutMS": self.wait_queue_timeout_ms,
+            "socketTimeoutMS": self.socket_timeout_ms,
+        }
+        options.update({k: v for k, v in optional.items() if v is not None})
+        compressors = self.available_compressors()
+        if compressors:
+            options["compressors"] = compressors
+        return options
+
+
+database_settings = DatabaseSettings()
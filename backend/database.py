@@ -1,11 +1,21 @@
-import os
+import time
+from typing import Dict, Optional
+
 from motor.motor_asyncio import AsyncIOMotorClient
-from dotenv import load_dotenv
+from pymongo.read_preferences import (
+    Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred,
+)
 
-load_dotenv()
+from config import database_settings as settings
+from mongo_monitor import mongo_monitor, pool_monitor
 
-MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
-DATABASE_NAME = "tradetracking"
+READ_PREFERENCE_MODES = {
+    "primary": Primary,
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
 
 class Database:
     client: AsyncIOMotorClient = None
@@ -13,14 +23,55 @@ class Database:
 
 db = Database()
 
+# user_id -> monotonic time until which the user's reads stay on the primary
+_recent_writes: Dict[str, float] = {}
+
 async def get_database():
     return db.db
 
 async def connect_to_mongo():
-    db.client = AsyncIOMotorClient(MONGODB_URL)
-    db.db = db.client[DATABASE_NAME]
-    print("Connected to MongoDB")
+    db.client = AsyncIOMotorClient(
+        settings.url, event_listeners=[mongo_monitor, pool_monitor], **settings.client_options()
+    )
+    db.db = db.client[settings.database]
+    print(f"Connected to MongoDB (compressors: {settings.available_compressors() or 'none'})")
 
 async def close_mongo_connection():
     db.client.close()
     print("Closed MongoDB connection")
+
+
+def read_preference(operation: str):
+    """Configured read preference for "crud" or "analytics" operations."""
+    if operation == "analytics":
+        mode = READ_PREFERENCE_MODES[settings.analytics_read_preference]
+        if mode is Primary:
+            return Primary()
+        return mode(max_staleness=settings.analytics_max_staleness_seconds)
+    return READ_PREFERENCE_MODES[settings.crud_read_preference]()
+
+
+def note_user_write(user_id: str) -> None:
+    """Keep a user's reads on the primary for a while after they change data."""
+    now = time.monotonic()
+    _recent_writes[user_id] = now + settings.read_your_writes_seconds
+    if len(_recent_writes) > 10000:
+        for key, until in list(_recent_writes.items()):
+            if until < now:
+                del _recent_writes[key]
+
+
+def recently_wrote(user_id: str) -> bool:
+    until = _recent_writes.get(user_id)
+    return until is not None and until > time.monotonic()
+
+
+def get_collection(name: str, operation: str = "crud", user_id: Optional[str] = None):
+    """Collection handle using the read preference for an operation.
+
+    Pass the requesting user's id so their reads go to the primary right
+    after their own writes (read-your-writes).
+    """
+    if user_id is not None and recently_wrote(user_id):
+        return db.db.get_collection(name, read_preference=Primary())
+    return db.db.get_collection(name, read_preference=read_preference(operation))
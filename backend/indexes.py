@@ -1,4 +1,5 @@
 from pymongo import IndexModel, ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
 from database import db
 
 async def create_indexes():
@@ -16,4 +17,48 @@ async def create_indexes():
         IndexModel([("user_id", ASCENDING), ("symbol", ASCENDING)]),
     ]
     await db.db["trades"].create_indexes(trade_indexes)
+
+    # Synced trades are deduplicated by this index (see services/trade_store.py).
+    # Manually entered trades have no external_id and are excluded.
+    try:
+        await db.db["trades"].create_indexes([
+            IndexModel(
+                [("user_id", ASCENDING), ("source", ASCENDING), ("external_id", ASCENDING)],
+                unique=True,
+                partialFilterExpression={"external_id": {"$exists": True}},
+                name="trade_external_id_unique",
+            )
+        ])
+    except OperationFailure as e:
+        print(f"Could not create unique external_id index (duplicate synced trades?): {e}")
+
+    # Import job indexes
+    import_job_indexes = [
+        IndexModel([("status", ASCENDING), ("updated_at", ASCENDING)]),
+    ]
+    await db.db["import_jobs"].create_indexes(import_job_indexes)
+
+    # Background sync scheduler scans active connections by due time
+    exchange_connection_indexes = [
+        IndexModel([("user_id", ASCENDING)]),
+        IndexModel([("status", ASCENDING), ("next_sync_at", ASCENDING)]),
+    ]
+    await db.db["exchange_connections"].create_indexes(exchange_connection_indexes)
+
+    # Stock broker sync state (per-account watermarks), one document per login
+    await db.db["broker_connections"].create_indexes([
+        IndexModel([("user_id", ASCENDING), ("broker", ASCENDING)], unique=True),
+    ])
+
+    # Stripe webhook queue: the worker scans pending events in creation order,
+    # then re-reads each leased customer's pending events
+    await db.db["stripe_events"].create_indexes([
+        IndexModel([("status", ASCENDING), ("created", ASCENDING), ("received_at", ASCENDING)]),
+        IndexModel([("customer", ASCENDING), ("status", ASCENDING), ("created", ASCENDING)]),
+    ])
+
+    # Shared rate limit windows (RATE_LIMIT_SHARED) expire on their own
+    await db.db["rate_limit_windows"].create_indexes([
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+    ])
     print("Indexes created successfully")
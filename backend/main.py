@@ -1,30 +1,48 @@
-from fastapi import FastAPI, HTTPException, Body, status, UploadFile, File, Depends, Query
+from fastapi import FastAPI, HTTPException, Body, status, UploadFile, File, Depends, Query, Request, Header
 from datetime import datetime
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from pydantic import BaseModel
+import asyncio
 import os
-import pandas as pd
-import io
 from typing import List, Optional
 from jose import JWTError, jwt
 
-from database import connect_to_mongo, close_mongo_connection, db
+from database import connect_to_mongo, close_mongo_connection, db, get_collection, note_user_write
 from indexes import create_indexes
+from mongo_monitor import MongoRequestStatsMiddleware
+from telemetry import RequestMetricsMiddleware, loop_lag, render_metrics
 from models import Trade, TradeCreate, TradeUpdate, TradeSide, TradeStatus, User, UserCreate, UserInDB
 from schemas import JournalResponse, DailyJournalStat, EquityCurveResponse, EquityPoint
 from auth import get_password_hash, verify_password, create_access_token, SECRET_KEY, ALGORITHM, validate_password_strength
 from services.exchange_service import (
     test_connection, fetch_balances, fetch_trades, fetch_positions,
-    sync_trades_to_db, get_supported_exchanges, encrypt_api_key, decrypt_api_key,
-    ExchangeCredentials
+    get_supported_exchanges, encrypt_api_key, get_balances, get_positions,
+    invalidate_live_data, ExchangeCredentials, exchange_clients
 )
+from services.sync_scheduler import sync_scheduler, SYNC_SCHEDULER_ENABLED
+from services.stream_service import stream_hub, sse_events
+from services.portfolio_service import get_portfolio
+from services.import_service import import_jobs, job_from_doc, ImportJob, ImportLimitError
+from services.import_profiles import get_supported_import_profiles
+from services.market_data import ticker_cache, mark_open_trades
+from services.markets_cache import markets_cache
+from services.stock_broker_service import broker_http, ibkr_sessions
 from services.payment_service import (
     create_checkout_session, create_customer_portal_session,
-    get_subscription_status, cancel_subscription, handle_webhook_event,
-    get_pricing_info, CheckoutSessionRequest
+    get_subscription_status, cancel_subscription, verify_webhook_event,
+    get_pricing_info, CheckoutSessionRequest, SubscriptionInfo,
+    cache_subscription, shutdown_stripe_executor
 )
+from services.stripe_events import stripe_events
+from services.request_limits import RequestLimitMiddleware
+
+# Readiness probe: how long /api/v1/health waits for a MongoDB ping
+HEALTH_TIMEOUT_SECONDS = float(os.getenv("HEALTH_TIMEOUT_SECONDS", "2"))
+# Bearer token required by /metrics when set
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
 
 app = FastAPI(title="TradeTracking API", version="0.1.0")
 
@@ -91,6 +109,16 @@ def build_mongo_query(user_id: str, filters: dict) -> dict:
 
     return query
 
+# Per-user rate limits and concurrency caps by tier (added before CORS so
+# that 429 responses still carry CORS headers)
+app.add_middleware(RequestLimitMiddleware)
+
+# Database round trips per request (outside the limiter so its tier lookups count)
+app.add_middleware(MongoRequestStatsMiddleware)
+
+# Route latency, status counts and requests in flight for /metrics
+app.add_middleware(RequestMetricsMiddleware)
+
 # CORS Configuration
 origins = os.getenv("ALLOWED_ORIGINS", "http://localhost:3000").split(",")
 app.add_middleware(
@@ -104,11 +132,30 @@ app.add_middleware(
 # Database Events
 @app.on_event("startup")
 async def startup_db_client():
+    loop_lag.start()
     await connect_to_mongo()
     await create_indexes()
+    await import_jobs.recover_interrupted(db.db)
+    import_jobs.start(db.db)
+    exchange_clients.start()
+    markets_cache.start()
+    stripe_events.start(db.db)
+    if SYNC_SCHEDULER_ENABLED:
+        sync_scheduler.start(db.db)
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await sync_scheduler.stop()
+    await stripe_events.stop()
+    await stream_hub.close()
+    await import_jobs.shutdown()
+    await exchange_clients.close()
+    await ibkr_sessions.close()
+    await broker_http.close()
+    shutdown_stripe_executor()
+    await ticker_cache.close()
+    await markets_cache.stop()
+    await loop_lag.stop()
     await close_mongo_connection()
 
 class HealthCheck(BaseModel):
@@ -130,7 +177,25 @@ async def root():
 
 @app.get("/api/v1/health")
 async def health():
-    return {"status": "healthy", "service": "backend"}
+    """Readiness probe: 503 until MongoDB answers a ping.
+
+    `/` stays a plain liveness check.
+    """
+    try:
+        await asyncio.wait_for(db.db.command("ping"), HEALTH_TIMEOUT_SECONDS)
+    except Exception as e:
+        return JSONResponse(
+            status_code=503,
+            content={"status": "unavailable", "service": "backend", "checks": {"mongodb": str(e) or type(e).__name__}},
+        )
+    return {"status": "healthy", "service": "backend", "checks": {"mongodb": "ok"}}
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics(authorization: Optional[str] = Header(None)):
+    """Prometheus metrics. Set METRICS_TOKEN to require `Authorization: Bearer <token>`."""
+    if METRICS_TOKEN and authorization != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
 
 # --- Auth Routes ---
 
@@ -271,7 +336,7 @@ async def get_dashboard_stats(
         }}
     ]
 
-    result = await db.db["trades"].aggregate(pipeline).to_list(1)
+    result = await get_collection("trades", "analytics", str(current_user.id)).aggregate(pipeline).to_list(1)
 
     stats = {
         "total_trades": 0,
@@ -361,7 +426,7 @@ async def get_journal_stats(
         }
     ]
 
-    results = await db.db["trades"].aggregate(pipeline).to_list(10000)
+    results = await get_collection("trades", "analytics", str(current_user.id)).aggregate(pipeline).to_list(10000)
 
     final_stats = {}
     for r in results:
@@ -420,7 +485,7 @@ async def get_equity_curve(
         {"$sort": {"_id": 1}} # Sort by date ascending
     ]
 
-    results = await db.db["trades"].aggregate(pipeline).to_list(10000)
+    results = await get_collection("trades", "analytics", str(current_user.id)).aggregate(pipeline).to_list(10000)
 
     equity_curve = []
     running_equity = 0.0
@@ -440,129 +505,57 @@ async def get_equity_curve(
 
 # --- Trade Routes (Basic Implementation) ---
 
-@app.post("/api/v1/trades/import", response_description="Import trades from CSV")
+@app.post("/api/v1/trades/import", response_description="Import trades from CSV", status_code=status.HTTP_202_ACCEPTED)
 async def import_trades(file: UploadFile = File(...), current_user: User = Depends(get_current_user)):
+    """Accept a CSV upload as a background import job."""
     try:
-        contents = await file.read()
-        # Attempt to decode as utf-8
-        df = pd.read_csv(io.StringIO(contents.decode('utf-8')))
-
-        # Normalize columns: lower case and strip whitespace
-        df.columns = df.columns.str.lower().str.strip()
-
-        imported_count = 0
-        trades_to_insert = []
-
-        for _, row in df.iterrows():
-            try:
-                # Basic column mapping logic
-                # Symbol mappings
-                symbol = None
-                for col in ['symbol', 'ticker', 'pair', 'instrument']:
-                    if col in df.columns and pd.notna(row[col]):
-                        symbol = str(row[col])
-                        break
-
-                # Side mappings
-                side_str = 'BUY'
-                for col in ['side', 'type', 'direction', 'action']:
-                    if col in df.columns and pd.notna(row[col]):
-                        side_str = str(row[col])
-                        break
-
-                # Quantity mappings
-                quantity = 0.0
-                for col in ['quantity', 'qty', 'size', 'amount', 'volume']:
-                    if col in df.columns and pd.notna(row[col]):
-                        # remove commas if string
-                        val = row[col]
-                        if isinstance(val, str):
-                            val = val.replace(',', '')
-                        quantity = float(val)
-                        break
-
-                # Price mappings
-                price = 0.0
-                for col in ['price', 'entry price', 'avg price', 'fill price']:
-                    if col in df.columns and pd.notna(row[col]):
-                        val = row[col]
-                        if isinstance(val, str):
-                            val = val.replace(',', '').replace('$', '')
-                        price = float(val)
-                        break
-
-                # Time mappings
-                time_val = None
-                for col in ['time', 'date', 'entry time', 'timestamp', 'open time']:
-                    if col in df.columns and pd.notna(row[col]):
-                        time_val = row[col]
-                        break
-
-                if not symbol or not quantity or not price or not time_val:
-                    continue
-
-                # Robust Date Parsing
-                parsed_date = None
-                # List of supported date formats to try
-                date_formats = [
-                    '%Y-%m-%d %H:%M:%S',
-                    '%Y-%m-%dT%H:%M:%S',
-                    '%Y-%m-%d',
-                    '%d/%m/%Y %H:%M:%S',
-                    '%m/%d/%Y %H:%M:%S',
-                    '%d-%m-%Y %H:%M:%S',
-                    'ISO8601'
-                ]
-
-                # First try pandas flexible parsing with dayfirst=False (US default)
-                try:
-                    parsed_date = pd.to_datetime(time_val)
-                except:
-                    # Fallback to manual parsing if pandas fails completely
-                    pass
-
-                # Ensure we have a valid timestamp
-                if pd.isna(parsed_date):
-                     print(f"Skipping row due to invalid date: {time_val}")
-                     continue
-
-                # Parse Side
-                side_enum = TradeSide.BUY
-                if side_str.upper() in ['SELL', 'SHORT', 'S']:
-                    side_enum = TradeSide.SELL
-
-                # Create trade object
-                trade = TradeCreate(
-                    symbol=symbol.upper(),
-                    side=side_enum,
-                    quantity=abs(quantity),
-                    entry_price=abs(price),
-                    entry_time=parsed_date,
-                    status=TradeStatus.OPEN
-                )
-
-                trade_dict = jsonable_encoder(trade)
-                trade_dict["user_id"] = str(current_user.id)
-                trades_to_insert.append(trade_dict)
-                imported_count += 1
-
-            except Exception as e:
-                print(f"Error parsing row: {e}")
-                continue
-
-        if trades_to_insert:
-            await db.db["trades"].insert_many(trades_to_insert)
-
-        return {"status": "success", "imported": imported_count, "message": f"Successfully imported {imported_count} trades"}
-
+        job = await import_jobs.submit(db.db, str(current_user.id), file)
+    except ImportLimitError as e:
+        raise HTTPException(status_code=429, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to process file: {str(e)}")
 
+    return {
+        "status": "accepted",
+        "job_id": str(job["_id"]),
+        "message": "Import queued. Poll /api/v1/imports/{job_id} for progress."
+    }
+
+@app.post("/api/v1/imports/archive", status_code=status.HTTP_202_ACCEPTED)
+async def import_trades_archive(file: UploadFile = File(...), current_user: User = Depends(get_current_user)):
+    """Accept a ZIP of CSV exports as a background import job."""
+    try:
+        job = await import_jobs.submit(db.db, str(current_user.id), file, kind="archive")
+    except ImportLimitError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Failed to process archive: {str(e)}")
+
+    return {
+        "status": "accepted",
+        "job_id": str(job["_id"]),
+        "message": "Archive import queued. Poll /api/v1/imports/{job_id} for progress."
+    }
+
+@app.get("/api/v1/imports/profiles")
+async def list_import_profiles():
+    """List broker CSV formats recognized by the importer."""
+    return {"profiles": get_supported_import_profiles()}
+
+@app.get("/api/v1/imports/{job_id}", response_model=ImportJob)
+async def get_import_job(job_id: str, current_user: User = Depends(get_current_user)):
+    """Get progress, counts and errors for an import job."""
+    job = await import_jobs.get(db.db, job_id, str(current_user.id))
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Import job {job_id} not found")
+    return job_from_doc(job)
+
 @app.post("/api/v1/trades", response_description="Add new trade", response_model=Trade)
 async def create_trade(trade: TradeCreate = Body(...), current_user: User = Depends(get_current_user)):
     trade_dict = jsonable_encoder(trade)
     trade_dict["user_id"] = str(current_user.id)
     new_trade = await db.db["trades"].insert_one(trade_dict)
+    note_user_write(str(current_user.id))
     created_trade = await db.db["trades"].find_one({"_id": new_trade.inserted_id})
     return created_trade
 
@@ -576,6 +569,23 @@ async def list_trades(
     trades = await db.db["trades"].find(query).sort("entry_time", -1).to_list(limit)
     return trades
 
+@app.get("/api/v1/trades/mark-to-market", response_description="Unrealized PnL of open trades")
+async def mark_trades_to_market(current_user: User = Depends(get_current_user)):
+    """Mark all open trades to the latest cached market prices."""
+    open_trades = await db.db["trades"].find(
+        {"user_id": str(current_user.id), "status": TradeStatus.OPEN.value},
+        {"symbol": 1, "side": 1, "quantity": 1, "entry_price": 1, "source": 1}
+    ).to_list(None)
+
+    marks = await mark_open_trades(open_trades)
+    priced = [m for m in marks if m["unrealized_pnl"] is not None]
+    return {
+        "trades": marks,
+        "total_unrealized_pnl": round(sum(m["unrealized_pnl"] for m in priced), 2),
+        "priced": len(priced),
+        "unpriced": len(marks) - len(priced),
+    }
+
 @app.get("/api/v1/trades/{id}", response_description="Get a single trade", response_model=Trade)
 async def show_trade(id: str, current_user: User = Depends(get_current_user)):
     if (trade := await db.db["trades"].find_one({"_id": id, "user_id": str(current_user.id)})) is not None:
@@ -593,6 +603,7 @@ async def update_trade(id: str, trade: TradeUpdate = Body(...), current_user: Us
         )
 
         if update_result.modified_count == 1:
+            note_user_write(str(current_user.id))
             if (updated_trade := await db.db["trades"].find_one({"_id": id})) is not None:
                 return updated_trade
 
@@ -606,6 +617,7 @@ async def delete_trade(id: str, current_user: User = Depends(get_current_user)):
     delete_result = await db.db["trades"].delete_one({"_id": id, "user_id": str(current_user.id)})
 
     if delete_result.deleted_count == 1:
+        note_user_write(str(current_user.id))
         return {"status": "success", "message": f"Trade {id} deleted"}
 
     raise HTTPException(status_code=404, detail=f"Trade {id} not found")
@@ -748,29 +760,9 @@ async def sync_exchange_trades(
     if not connection:
         raise HTTPException(status_code=404, detail="Exchange connection not found")
 
-    # Decrypt credentials
-    api_key = decrypt_api_key(connection["api_key_encrypted"])
-    api_secret = decrypt_api_key(connection["api_secret_encrypted"])
-    passphrase = decrypt_api_key(connection["passphrase_encrypted"]) if connection.get("passphrase_encrypted") else None
-
-    # Sync trades
-    result = await sync_trades_to_db(
-        connection["exchange"],
-        api_key,
-        api_secret,
-        passphrase,
-        str(current_user.id),
-        db.db
-    )
-
-    if result.get("success"):
-        # Update last sync time
-        await db.db["exchange_connections"].update_one(
-            {"_id": ObjectId(connection_id)},
-            {"$set": {"last_sync": datetime.utcnow()}}
-        )
-
-    return result
+    # Joins a background sync of this connection if one is already running;
+    # the scheduler records last_sync and the next scheduled sync.
+    return await sync_scheduler.sync_now(db.db, connection)
 
 
 @app.delete("/api/v1/exchanges/{connection_id}")
@@ -789,15 +781,20 @@ async def delete_exchange_connection(
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Exchange connection not found")
 
+    await stream_hub.stop(connection_id)
+    await exchange_clients.evict(connection_id)
+    invalidate_live_data(connection_id)
+
     return {"status": "success", "message": "Exchange disconnected"}
 
 
 @app.get("/api/v1/exchanges/{connection_id}/balances")
 async def get_exchange_balances(
     connection_id: str,
+    fresh: bool = Query(False, description="Bypass the short-lived cache"),
     current_user: User = Depends(get_current_user)
 ):
-    """Get real-time balances from exchange."""
+    """Get real-time balances from exchange, cached for a few seconds per connection."""
     from bson import ObjectId
 
     connection = await db.db["exchange_connections"].find_one({
@@ -808,20 +805,17 @@ async def get_exchange_balances(
     if not connection:
         raise HTTPException(status_code=404, detail="Exchange connection not found")
 
-    api_key = decrypt_api_key(connection["api_key_encrypted"])
-    api_secret = decrypt_api_key(connection["api_secret_encrypted"])
-    passphrase = decrypt_api_key(connection["passphrase_encrypted"]) if connection.get("passphrase_encrypted") else None
-
-    balances = await fetch_balances(connection["exchange"], api_key, api_secret, passphrase)
+    balances = await get_balances(connection, fresh=fresh)
     return {"balances": [b.model_dump() for b in balances]}
 
 
 @app.get("/api/v1/exchanges/{connection_id}/positions")
 async def get_exchange_positions(
     connection_id: str,
+    fresh: bool = Query(False, description="Bypass the short-lived cache"),
     current_user: User = Depends(get_current_user)
 ):
-    """Get open positions from exchange."""
+    """Get open positions from exchange, cached for a few seconds per connection."""
     from bson import ObjectId
 
     connection = await db.db["exchange_connections"].find_one({
@@ -832,14 +826,48 @@ async def get_exchange_positions(
     if not connection:
         raise HTTPException(status_code=404, detail="Exchange connection not found")
 
-    api_key = decrypt_api_key(connection["api_key_encrypted"])
-    api_secret = decrypt_api_key(connection["api_secret_encrypted"])
-    passphrase = decrypt_api_key(connection["passphrase_encrypted"]) if connection.get("passphrase_encrypted") else None
-
-    positions = await fetch_positions(connection["exchange"], api_key, api_secret, passphrase)
+    positions = await get_positions(connection, fresh=fresh)
     return {"positions": [p.model_dump() for p in positions]}
 
 
+@app.get("/api/v1/portfolio")
+async def get_portfolio_overview(current_user: User = Depends(get_current_user)):
+    """Balances, positions and net exposure per asset across all connections.
+
+    Venues are queried concurrently with a per-venue timeout; slow or failing
+    venues are reported in `venues` instead of delaying the response.
+    """
+    connections = await db.db["exchange_connections"].find({
+        "user_id": str(current_user.id),
+        "status": "active"
+    }).to_list(None)
+
+    return await get_portfolio(connections)
+
+
+@app.get("/api/v1/exchanges/{connection_id}/stream")
+async def stream_exchange_events(
+    connection_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Live fills and position changes as Server-Sent Events."""
+    from bson import ObjectId
+
+    connection = await db.db["exchange_connections"].find_one({
+        "_id": ObjectId(connection_id),
+        "user_id": str(current_user.id)
+    })
+
+    if not connection:
+        raise HTTPException(status_code=404, detail="Exchange connection not found")
+
+    return StreamingResponse(
+        sse_events(connection, db.db),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 # --- Payment/Subscription Routes ---
 
 @app.get("/api/v1/pricing")
@@ -893,12 +921,26 @@ async def create_billing_portal(
 
 @app.get("/api/v1/subscription/status")
 async def get_user_subscription(current_user: User = Depends(get_current_user)):
-    """Get current user's subscription status."""
-    user_doc = await db.db["users"].find_one({"_id": current_user.id})
+    """Get current user's subscription status.
+
+    Served from the snapshot cached on the user document, which webhooks
+    keep current; Stripe is only asked once for subscriptions that predate
+    the cache.
+    """
+    from bson import ObjectId
+
+    user_doc = await db.db["users"].find_one({"_id": ObjectId(current_user.id)})
+
+    cached = user_doc.get("subscription")
+    if cached:
+        cached.pop("updated_at", None)
+        return cached
 
     subscription_id = user_doc.get("stripe_subscription_id")
     if subscription_id:
         status = await get_subscription_status(subscription_id)
+        if status.status != "none":
+            await cache_subscription(db.db, current_user.id, status)
         return status.model_dump()
 
     return {
@@ -914,7 +956,9 @@ async def cancel_user_subscription(
     current_user: User = Depends(get_current_user)
 ):
     """Cancel subscription."""
-    user_doc = await db.db["users"].find_one({"_id": current_user.id})
+    from bson import ObjectId
+
+    user_doc = await db.db["users"].find_one({"_id": ObjectId(current_user.id)})
     subscription_id = user_doc.get("stripe_subscription_id")
 
     if not subscription_id:
@@ -924,43 +968,42 @@ async def cancel_user_subscription(
 
     if result.get("success") and immediate:
         await db.db["users"].update_one(
-            {"_id": current_user.id},
-            {"$set": {"subscription_tier": "starter", "stripe_subscription_id": None}}
+            {"_id": user_doc["_id"]},
+            {"$set": {
+                "subscription_tier": "starter",
+                "stripe_subscription_id": None,
+                "subscription": SubscriptionInfo(tier="starter", status=result.get("status")).model_dump()
+            }}
+        )
+    elif result.get("success") and user_doc.get("subscription"):
+        await db.db["users"].update_one(
+            {"_id": user_doc["_id"]},
+            {"$set": {
+                "subscription.status": result.get("status"),
+                "subscription.cancel_at_period_end": result.get("cancel_at_period_end")
+            }}
         )
 
     return result
 
 
 @app.post("/api/v1/webhooks/stripe")
-async def stripe_webhook(request):
-    """Handle Stripe webhook events."""
-    from starlette.requests import Request
+async def stripe_webhook(request: Request):
+    """Receive Stripe webhook events.
+
+    Events are stored and acknowledged straight away; the stripe_events
+    worker applies them in order per customer. Redeliveries are acknowledged
+    without being stored again.
+    """
     payload = await request.body()
     sig_header = request.headers.get("stripe-signature", "")
 
-    result = await handle_webhook_event(payload, sig_header)
+    result = verify_webhook_event(payload, sig_header)
 
     if not result.get("success"):
         raise HTTPException(status_code=400, detail=result.get("error"))
 
-    # Process the webhook action
-    action = result.get("action")
-    user_id = result.get("user_id")
-
-    if action == "subscription_created" and user_id:
-        await db.db["users"].update_one(
-            {"_id": user_id},
-            {"$set": {
-                "subscription_tier": result.get("tier"),
-                "stripe_customer_id": result.get("stripe_customer_id"),
-                "stripe_subscription_id": result.get("stripe_subscription_id")
-            }}
-        )
-    elif action == "subscription_cancelled" and user_id:
-        await db.db["users"].update_one(
-            {"_id": user_id},
-            {"$set": {"subscription_tier": "starter"}}
-        )
+    await stripe_events.ingest(db.db, result["event"])
 
     return {"received": True}
 
@@ -0,0 +1,184 @@
+"""
+In-process metrics for TradeTracking.io.
+Fixed-bucket histograms and counters cheap enough to update on every request
+and database command, and their Prometheus text rendering (GET /metrics).
+Updates may come from worker threads (PyMongo events fire on Motor's
+executor), so each histogram and counter family has its own lock.
+"""
+
+import math
+import threading
+from bisect import bisect_left
+from typing import Any, Dict, Hashable, Iterable, List, Sequence, Tuple
+
+# Latency buckets in milliseconds
+LATENCY_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Database round trips per request
+ROUND_TRIP_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250, 500)
+
+
+class Histogram:
+    """Counts of observations per upper bound (`value <= bound`), plus sum and count."""
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot: above every bound
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def cumulative(self) -> List[Tuple[float, int]]:
+        """(upper bound, observations <= bound) pairs, ending with +Inf."""
+        total = 0
+        pairs = []
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            pairs.append((bound, total))
+        return pairs
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile (0 when empty)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        for bound, seen in self.cumulative():
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 3),
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+
+class HistogramFamily:
+    """Histograms keyed by label values, created on first observation."""
+
+    def __init__(self, labels: Sequence[str], buckets: Sequence[float] = LATENCY_BUCKETS_MS):
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._histograms: Dict[Tuple[Hashable, ...], Histogram] = {}
+        self._lock = threading.Lock()
+
+    def get(self, *values: Hashable) -> Histogram:
+        histogram = self._histograms.get(values)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(values, Histogram(self.buckets))
+        return histogram
+
+    def observe(self, value: float, *label_values: Hashable) -> None:
+        self.get(*label_values).observe(value)
+
+    def items(self) -> List[Tuple[Tuple[Hashable, ...], Histogram]]:
+        with self._lock:
+            return list(self._histograms.items())
+
+    def clear(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+
+
+class CounterFamily:
+    """Monotonic counters keyed by label values."""
+
+    def __init__(self, labels: Sequence[str]):
+        self.labels = tuple(labels)
+        self._counts: Dict[Tuple[Hashable, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: Hashable, amount: float = 1) -> None:
+        with self._lock:
+            self._counts[label_values] = self._counts.get(label_values, 0) + amount
+
+    def items(self) -> List[Tuple[Tuple[Hashable, ...], float]]:
+        with self._lock:
+            return list(self._counts.items())
+
+
+def route_path(scope: Dict[str, Any]) -> str:
+    """Route template of a request ("/api/v1/trades/{id}"), for use as a label.
+
+    FastAPI stores the matched route in the scope once routing is done;
+    unmatched paths share one label so they cannot blow up cardinality.
+    """
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+Sample = Tuple[Dict[str, Any], float]
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Dict[str, Any]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+class PrometheusText:
+    """Builds a Prometheus text exposition (format 0.0.4)."""
+
+    def __init__(self):
+        self._lines: List[str] = []
+
+    def _family(self, name: str, kind: str, help_text: str) -> None:
+        self._lines.append(f"# HELP {name} {help_text}")
+        self._lines.append(f"# TYPE {name} {kind}")
+
+    def _sample(self, name: str, labels: Dict[str, Any], value: float) -> None:
+        self._lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+    def gauge(self, name: str, help_text: str, samples: Iterable[Sample]) -> None:
+        self._family(name, "gauge", help_text)
+        for labels, value in samples:
+            self._sample(name, labels, value)
+
+    def counter(self, name: str, help_text: str, samples: Iterable[Sample]) -> None:
+        self._family(name, "counter", help_text)
+        for labels, value in samples:
+            self._sample(name, labels, value)
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        family: HistogramFamily,
+        scale: float = 1.0,
+    ) -> None:
+        """Render a histogram family; `scale` converts units (e.g. ms to seconds)."""
+        self._family(name, "histogram", help_text)
+        for values, histogram in family.items():
+            labels = dict(zip(family.labels, values))
+            for bound, count in histogram.cumulative():
+                le = bound if bound == math.inf else round(bound * scale, 9)
+                self._sample(f"{name}_bucket", {**labels, "le": _format_value(le)}, count)
+            self._sample(f"{name}_sum", labels, histogram.sum * scale)
+            self._sample(f"{name}_count", labels, histogram.count)
+
+    def render(self) -> str:
+        return "\n".join(self._lines) + "\n"
@@ -24,6 +24,7 @@ class TradeBase(BaseModel):
     exit_time: Optional[datetime] = None
     status: TradeStatus = TradeStatus.OPEN
     pnl: Optional[float] = None
+    fee: Optional[float] = None
     setup: Optional[str] = None
     notes: Optional[str] = None
 
@@ -40,6 +41,7 @@ class TradeUpdate(BaseModel):
     exit_time: Optional[datetime] = None
     status: Optional[TradeStatus] = None
     pnl: Optional[float] = None
+    fee: Optional[float] = None
     setup: Optional[str] = None
     notes: Optional[str] = None
 
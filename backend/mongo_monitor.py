@@ -0,0 +1,260 @@
+"""
+MongoDB command monitoring for TradeTracking.io.
+
+A PyMongo command listener records latency per command and collection,
+logs slow commands (with filter values redacted and the route that issued
+them) and counts database round trips per HTTP request. With
+MONGODB_DEBUG_HEADERS the counts are returned as response headers, so N+1
+query patterns show up while developing. A pool listener tracks open and
+checked-out connections.
+"""
+
+import threading
+from contextvars import ContextVar
+from typing import Any, Dict, Optional, Tuple
+
+from pymongo import monitoring
+from starlette.datastructures import MutableHeaders
+
+from config import database_settings as settings
+from metrics import LATENCY_BUCKETS_MS, ROUND_TRIP_BUCKETS, HistogramFamily, route_path
+
+# Where each command keeps its filter, by command name
+FILTER_FIELDS = {
+    "find": "filter",
+    "aggregate": "pipeline",
+    "count": "query",
+    "distinct": "query",
+    "findAndModify": "query",
+    "update": "updates",
+    "delete": "deletes",
+}
+
+
+def redact(value: Any, depth: int = 0) -> Any:
+    """Filter shape without values: keys and operators stay, values become "?"."""
+    if depth > 8:
+        return "..."
+    if isinstance(value, dict):
+        return {key: redact(item, depth + 1) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        shown = [redact(item, depth + 1) for item in value[:5]]
+        return shown + ["..."] if len(value) > 5 else shown
+    if isinstance(value, str) and value.startswith("$"):
+        # Field paths in aggregations ("$pnl") are schema, not data
+        return value
+    return "?"
+
+
+def command_filter(command_name: str, command: Dict[str, Any]) -> Any:
+    field = FILTER_FIELDS.get(command_name)
+    if field is None:
+        return None
+    value = command.get(field)
+    if command_name == "update":
+        value = [u.get("q") for u in value or []]
+    elif command_name == "delete":
+        value = [d.get("q") for d in value or []]
+    return redact(value)
+
+
+def command_collection(command_name: str, command: Dict[str, Any]) -> str:
+    target = command.get("collection") if command_name == "getMore" else command.get(command_name)
+    return target if isinstance(target, str) else ""
+
+
+class RequestStats:
+    """Database work done on behalf of one HTTP request."""
+
+    def __init__(self, scope: Dict[str, Any]):
+        self.scope = scope
+        self.round_trips = 0
+        self.duration_ms = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def route(self) -> str:
+        return f"{self.scope.get('method', '')} {route_path(self.scope)}"
+
+    def add(self, duration_ms: float) -> None:
+        with self._lock:
+            self.round_trips += 1
+            self.duration_ms += duration_ms
+
+
+_current_request: ContextVar[Optional[RequestStats]] = ContextVar("mongo_request_stats", default=None)
+
+
+class MongoMonitor(monitoring.CommandListener):
+    """Command latency histograms, slow-command log and per-request round trips."""
+
+    def __init__(self, slow_ms: float = settings.slow_command_ms):
+        self.slow_ms = slow_ms
+        self.commands = HistogramFamily(("command", "collection"))
+        self.round_trips = HistogramFamily(("route",), ROUND_TRIP_BUCKETS)
+        self.failures: Dict[Tuple[str, str], int] = {}
+        self.slow_commands = 0
+        self._started: Dict[Tuple[Any, int], Tuple[str, Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    # --- listener callbacks (run on the thread that issued the command) ---
+
+    def started(self, event) -> None:
+        self._started[(event.connection_id, event.request_id)] = (
+            command_collection(event.command_name, event.command),
+            event.command,
+        )
+
+    def succeeded(self, event) -> None:
+        self._finish(event, failed=False)
+
+    def failed(self, event) -> None:
+        self._finish(event, failed=True)
+
+    def _finish(self, event, failed: bool) -> None:
+        collection, command = self._started.pop((event.connection_id, event.request_id), ("", {}))
+        duration_ms = event.duration_micros / 1000
+        self.commands.observe(duration_ms, event.command_name, collection)
+
+        request = _current_request.get()
+        if request is not None:
+            request.add(duration_ms)
+        if failed:
+            key = (event.command_name, collection)
+            with self._lock:
+                self.failures[key] = self.failures.get(key, 0) + 1
+        if duration_ms >= self.slow_ms:
+            self.slow_commands += 1
+            route = request.route if request is not None else "background"
+            print(
+                f"Slow MongoDB {event.command_name} on {collection or '-'}: {duration_ms:.1f} ms "
+                f"route={route} filter={command_filter(event.command_name, command)}"
+            )
+
+    # --- reporting ---
+
+    def metrics(self) -> Dict[str, Any]:
+        """Latency per command/collection and round trips per route."""
+        return {
+            "slow_command_ms": self.slow_ms,
+            "slow_commands_total": self.slow_commands,
+            "commands": {
+                f"{command} {collection}".strip(): {
+                    **histogram.snapshot(),
+                    "failed": self.failures.get((command, collection), 0),
+                }
+                for (command, collection), histogram in self.commands.items()
+            },
+            "round_trips_per_request": {
+                route: histogram.snapshot() for (route,), histogram in self.round_trips.items()
+            },
+        }
+
+
+mongo_monitor = MongoMonitor()
+
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    """Connection pool usage per server: open and checked-out connections, waits."""
+
+    def __init__(self):
+        self.open: Dict[Any, int] = {}
+        self.checked_out: Dict[Any, int] = {}
+        self.checkout_failures: Dict[Tuple[Any, str], int] = {}
+        self.checkout_wait = HistogramFamily(("address",), LATENCY_BUCKETS_MS)
+        self._lock = threading.Lock()
+
+    def _add(self, counts: Dict, key: Any, amount: int) -> None:
+        with self._lock:
+            counts[key] = counts.get(key, 0) + amount
+
+    def connection_created(self, event) -> None:
+        self._add(self.open, event.address, 1)
+
+    def connection_closed(self, event) -> None:
+        self._add(self.open, event.address, -1)
+
+    def connection_checked_out(self, event) -> None:
+        self._add(self.checked_out, event.address, 1)
+        # How long the checkout waited (PyMongo 4.7+)
+        duration = getattr(event, "duration", None)
+        if duration is not None:
+            self.checkout_wait.observe(duration * 1000, _address_label(event.address))
+
+    def connection_checked_in(self, event) -> None:
+        self._add(self.checked_out, event.address, -1)
+
+    def connection_check_out_failed(self, event) -> None:
+        self._add(self.checkout_failures, (event.address, str(event.reason)), 1)
+
+    def pool_cleared(self, event) -> None:
+        with self._lock:
+            self.checked_out.pop(event.address, None)
+
+    def pool_created(self, event) -> None:
+        pass
+
+    def pool_ready(self, event) -> None:
+        pass
+
+    def pool_closed(self, event) -> None:
+        with self._lock:
+            self.open.pop(event.address, None)
+            self.checked_out.pop(event.address, None)
+
+    def connection_ready(self, event) -> None:
+        pass
+
+    def connection_check_out_started(self, event) -> None:
+        pass
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_pool_size": settings.max_pool_size,
+                "open": {_address_label(a): n for a, n in self.open.items()},
+                "checked_out": {_address_label(a): n for a, n in self.checked_out.items()},
+                "checkout_failures": {
+                    f"{_address_label(a)} {reason}": n for (a, reason), n in self.checkout_failures.items()
+                },
+            }
+
+
+def _address_label(address: Any) -> str:
+    if isinstance(address, tuple) and len(address) == 2:
+        return f"{address[0]}:{address[1]}"
+    return str(address)
+
+
+pool_monitor = PoolMonitor()
+
+
+class MongoRequestStatsMiddleware:
+    """ASGI middleware counting each request's MongoDB round trips."""
+
+    def __init__(self, app, monitor: Optional[MongoMonitor] = None, debug_headers: bool = settings.debug_headers):
+        self.app = app
+        self.monitor = monitor
+        self.debug_headers = debug_headers
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        monitor = self.monitor if self.monitor is not None else mongo_monitor
+        stats = RequestStats(scope)
+        token = _current_request.set(stats)
+
+        async def send_with_headers(message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append("X-DB-Round-Trips", str(stats.round_trips))
+                headers.append("X-DB-Time-Ms", f"{stats.duration_ms:.1f}")
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers if self.debug_headers else send)
+        finally:
+            _current_request.reset(token)
+            monitor.round_trips.observe(stats.round_trips, stats.route)
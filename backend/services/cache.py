@@ -0,0 +1,142 @@
+"""
+Cache Service - In-process TTL caches for TradeTracking.io
+Short-lived caches for live exchange data (balances, positions). Concurrent
+misses for the same key share a single fetch, and entries past their TTL can
+still be served for a grace period while one background refresh runs.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Set, Tuple
+
+
+class TTLCache:
+    """Async TTL cache with single-flight loads and stale-while-revalidate.
+
+    - Younger than `ttl`: served from cache.
+    - Between `ttl` and `ttl + stale_ttl`: served from cache while a
+      background refresh runs (at most one per key).
+    - Older, missing, or `fresh=True`: loaded, with concurrent callers for
+      the same key awaiting the same load.
+
+    Failed loads are not cached; every caller waiting on the load gets the
+    exception.
+    """
+
+    def __init__(self, name: str, ttl: float, stale_ttl: float = 0, max_entries: int = 10000):
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._background: Set[asyncio.Task] = set()
+        self._stats = {
+            "hits": 0,
+            "stale_hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "refreshes": 0,
+            "errors": 0,
+        }
+
+    async def get(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Any]],
+        fresh: bool = False,
+    ) -> Any:
+        """Return the cached value for key, calling loader when needed."""
+        entry = self._entries.get(key)
+        if entry is not None and not fresh:
+            value, stored_at = entry
+            age = time.monotonic() - stored_at
+            if age < self.ttl:
+                self._stats["hits"] += 1
+                self._entries.move_to_end(key)
+                return value
+            if age < self.ttl + self.stale_ttl:
+                self._stats["stale_hits"] += 1
+                self._entries.move_to_end(key)
+                if key not in self._inflight:
+                    self._stats["refreshes"] += 1
+                    refresh = self._load(key, loader)
+                    self._background.add(refresh)
+                    refresh.add_done_callback(self._finish_background)
+                return value
+
+        self._stats["misses"] += 1
+        # Shield so a cancelled request does not cancel the load other
+        # callers are waiting on.
+        return await asyncio.shield(self._load(key, loader))
+
+    def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        task = self._inflight.get(key)
+        if task is not None:
+            self._stats["coalesced"] += 1
+            return task
+
+        task = asyncio.ensure_future(self._fill(key, loader))
+        self._inflight[key] = task
+        task.add_done_callback(partial(self._forget, key))
+        return task
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    async def _fill(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await loader()
+        except Exception:
+            self._stats["errors"] += 1
+            raise
+
+        # Skip the write if the key was invalidated while loading
+        if self._inflight.get(key) is asyncio.current_task():
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def _finish_background(self, task: asyncio.Task) -> None:
+        self._background.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Background refresh failed in {self.name} cache: {task.exception()}")
+
+    def age(self, key: Hashable) -> Optional[float]:
+        """Seconds since the cached value for key was loaded, if cached."""
+        entry = self._entries.get(key)
+        return time.monotonic() - entry[1] if entry else None
+
+    def peek(self, key: Hashable) -> Optional[Any]:
+        """Last loaded value for key regardless of age, without loading."""
+        entry = self._entries.get(key)
+        return entry[0] if entry else None
+
+    def invalidate(self, key: Hashable) -> None:
+        """Drop a cached value and detach any load in progress for it."""
+        self._entries.pop(key, None)
+        self._inflight.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._inflight.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size."""
+        lookups = self._stats["hits"] + self._stats["stale_hits"] + self._stats["misses"]
+        served = self._stats["hits"] + self._stats["stale_hits"]
+        return {
+            "name": self.name,
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+            "hit_rate": round(served / lookups, 4) if lookups else 0.0,
+            **self._stats,
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
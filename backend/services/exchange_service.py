@@ -7,20 +7,60 @@ Supports 23+ exchanges and brokers:
   - Stocks via Direct API (6): Tradier, E*TRADE, Schwab, Interactive Brokers, Webull, Firstrade
 
 For stock brokers with direct API integration, see stock_broker_service.py
+
+Clients use CCXT's native asyncio API. Clients for saved connections are kept
+in a pool keyed by connection id, so HTTP sessions, loaded markets and
+decrypted credentials are reused across requests; idle clients are evicted.
+CCXT itself is imported on first use; exchange classes are resolved by id.
 """
 
-import ccxt
-from typing import List, Dict, Optional, Any
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import List, Dict, Optional, Any, AsyncIterator
 from pydantic import BaseModel
 from datetime import datetime, timedelta
 from cryptography.fernet import Fernet
 import os
+import time
 import asyncio
 
+from services.cache import TTLCache
+from services.market_data import ticker_cache
+from services.markets_cache import markets_cache
+from services.rate_limiter import exchange_bucket
+from services.sync_pipeline import (
+    FillPage, SyncContext, fill_document, merge_pages, register_adapter, run_pipeline,
+)
+from services.trade_store import bulk_upsert_trades
+
 # Encryption key for API keys (should be in env vars in production)
 ENCRYPTION_KEY = os.getenv("ENCRYPTION_KEY", Fernet.generate_key().decode())
 cipher = Fernet(ENCRYPTION_KEY.encode() if isinstance(ENCRYPTION_KEY, str) else ENCRYPTION_KEY)
 
+# Seconds a pooled exchange client may sit unused before it is closed
+EXCHANGE_CLIENT_IDLE_SECONDS = int(os.getenv("EXCHANGE_CLIENT_IDLE_SECONDS", "600"))
+
+# Concurrent per-symbol trade requests per sync; requests are additionally
+# paced by a per-exchange token bucket derived from CCXT's rateLimit.
+EXCHANGE_FETCH_CONCURRENCY = int(os.getenv("EXCHANGE_FETCH_CONCURRENCY", "5"))
+
+# Trades requested per page while backfilling, and how far back the first
+# sync of a symbol reaches
+EXCHANGE_SYNC_PAGE_LIMIT = int(os.getenv("EXCHANGE_SYNC_PAGE_LIMIT", "500"))
+EXCHANGE_BACKFILL_DAYS = int(os.getenv("EXCHANGE_BACKFILL_DAYS", "365"))
+
+# Live balances/positions are cached per connection for this many seconds,
+# then served stale for up to EXCHANGE_CACHE_STALE_SECONDS more while a
+# background refresh runs
+EXCHANGE_CACHE_TTL_SECONDS = float(os.getenv("EXCHANGE_CACHE_TTL_SECONDS", "15"))
+EXCHANGE_CACHE_STALE_SECONDS = float(os.getenv("EXCHANGE_CACHE_STALE_SECONDS", "45"))
+
+# Watermark key for venues synced with a single all-symbols cursor
+ALL_SYMBOLS = "*"
+
+# Quote currencies tried when turning balance holdings into market symbols
+DISCOVERY_QUOTES = ["USDT", "USDC", "USD", "FDUSD", "EUR", "BTC", "ETH"]
+
 
 class ExchangeCredentials(BaseModel):
     exchange: str
@@ -52,41 +92,62 @@ class ExchangeTrade(BaseModel):
 class ExchangePosition(BaseModel):
     symbol: str
     side: str
-    size: float
+    size: float  # contracts
     entry_price: float
     mark_price: float
     unrealized_pnl: float
     leverage: Optional[int] = None
-
-
-# Supported exchanges configuration
+    # Base units per contract on linear markets, quote units (e.g. USD) per
+    # contract on inverse ones
+    contract_size: float = 1.0
+    inverse: bool = False
+
+    def base_size(self) -> float:
+        """Position size in units of the base asset, unsigned."""
+        if not self.inverse:
+            return self.size * self.contract_size
+        price = self.mark_price or self.entry_price
+        return self.size * self.contract_size / price if price else 0.0
+
+
+# Supported exchanges configuration, keyed by CCXT exchange id
+# all_symbol_trades: fetchMyTrades works without a symbol (one call covers all markets)
+# discovery_types: CCXT market types searched for symbols to sync (default:
+#   spot, plus swap and future markets when has_futures)
 SUPPORTED_EXCHANGES = {
     # === CRYPTO SPOT & FUTURES (CEX) ===
-    "binance": {"class": ccxt.binance, "has_futures": True, "category": "crypto"},
-    "bybit": {"class": ccxt.bybit, "has_futures": True, "category": "crypto"},
-    "okx": {"class": ccxt.okx, "has_futures": True, "requires_passphrase": True, "category": "crypto"},
-    "coinbase": {"class": ccxt.coinbase, "has_futures": False, "category": "crypto"},
-    "kraken": {"class": ccxt.kraken, "has_futures": True, "category": "crypto"},
-    "kucoin": {"class": ccxt.kucoin, "has_futures": True, "requires_passphrase": True, "category": "crypto"},
-    "bitget": {"class": ccxt.bitget, "has_futures": True, "requires_passphrase": True, "category": "crypto"},
-    "gate": {"class": ccxt.gate, "has_futures": True, "category": "crypto"},
-    "mexc": {"class": ccxt.mexc, "has_futures": True, "category": "crypto"},
-    "cryptocom": {"class": ccxt.cryptocom, "has_futures": True, "category": "crypto"},
-    "htx": {"class": ccxt.htx, "has_futures": True, "category": "crypto"},  # Formerly Huobi
-    "woo": {"class": ccxt.woo, "has_futures": True, "category": "crypto"},  # WOO X
+    "binance": {"has_futures": True, "category": "crypto"},
+    "bybit": {"has_futures": True, "all_symbol_trades": True, "category": "crypto"},
+    "okx": {"has_futures": True, "all_symbol_trades": True, "requires_passphrase": True, "category": "crypto"},
+    "coinbase": {"has_futures": False, "all_symbol_trades": True, "category": "crypto"},
+    "kraken": {"has_futures": True, "all_symbol_trades": True, "category": "crypto"},
+    "kucoin": {"has_futures": True, "all_symbol_trades": True, "requires_passphrase": True, "category": "crypto"},
+    "bitget": {"has_futures": True, "requires_passphrase": True, "category": "crypto"},
+    "gate": {"has_futures": True, "all_symbol_trades": True, "category": "crypto"},
+    "mexc": {"has_futures": True, "category": "crypto"},
+    "cryptocom": {"has_futures": True, "all_symbol_trades": True, "category": "crypto"},
+    "htx": {"has_futures": True, "category": "crypto"},  # Formerly Huobi
+    "woo": {"has_futures": True, "all_symbol_trades": True, "category": "crypto"},  # WOO X
 
     # === CRYPTO DERIVATIVES (DEX) ===
-    "hyperliquid": {"class": ccxt.hyperliquid, "has_futures": True, "category": "crypto-derivatives"},
-    "dydx": {"class": ccxt.dydx, "has_futures": True, "category": "crypto-derivatives"},
-    "phemex": {"class": ccxt.phemex, "has_futures": True, "category": "crypto-derivatives"},
-    "bitmex": {"class": ccxt.bitmex, "has_futures": True, "category": "crypto-derivatives"},
-    "apex": {"class": ccxt.apex, "has_futures": True, "category": "crypto-derivatives"},
+    "hyperliquid": {"has_futures": True, "all_symbol_trades": True, "category": "crypto-derivatives"},
+    "dydx": {"has_futures": True, "category": "crypto-derivatives"},
+    "phemex": {"has_futures": True, "category": "crypto-derivatives"},
+    "bitmex": {"has_futures": True, "all_symbol_trades": True, "category": "crypto-derivatives"},
+    "apex": {"has_futures": True, "category": "crypto-derivatives"},
 
     # === STOCK MARKET ===
-    "alpaca": {"class": ccxt.alpaca, "has_futures": False, "category": "stocks", "asset_types": ["stocks", "options"]},
+    "alpaca": {"has_futures": False, "category": "stocks", "asset_types": ["stocks", "options"]},
 }
 
 
+def _symbol_required_errors() -> tuple:
+    """CCXT errors raised when fetchMyTrades needs a symbol after all."""
+    import ccxt.async_support as ccxt
+
+    return (ccxt.ArgumentsRequired, ccxt.NotSupported)
+
+
 def encrypt_api_key(api_key: str) -> str:
     """Encrypt API key before storing in database."""
     return cipher.encrypt(api_key.encode()).decode()
@@ -102,14 +163,26 @@ def create_exchange_client(
     api_key: str,
     api_secret: str,
     passphrase: Optional[str] = None,
-    testnet: bool = False
+    testnet: bool = False,
+    streaming: bool = False
 ) -> Any:
-    """Create a CCXT exchange client instance."""
+    """Create a CCXT exchange client instance.
+
+    With `streaming`, a CCXT Pro (WebSocket) client is created instead.
+    """
     if exchange_id not in SUPPORTED_EXCHANGES:
         raise ValueError(f"Exchange {exchange_id} is not supported")
 
     config = SUPPORTED_EXCHANGES[exchange_id]
-    exchange_class = config["class"]
+    import ccxt.async_support as ccxt
+
+    exchange_class = getattr(ccxt, exchange_id)
+    if streaming:
+        import ccxt.pro as ccxtpro
+
+        exchange_class = getattr(ccxtpro, exchange_id, None)
+        if exchange_class is None:
+            raise ValueError(f"Exchange {exchange_id} has no streaming API")
 
     options = {
         "apiKey": api_key,
@@ -127,34 +200,186 @@ def create_exchange_client(
     return exchange_class(options)
 
 
+class ExchangeClientPool:
+    """Async CCXT clients for saved exchange connections, keyed by connection id.
+
+    A client is built (and its credentials decrypted) on first use and reused
+    until it has been idle for `idle_seconds`, or its connection's credentials
+    change. Use `client()` as an async context manager so in-use clients are
+    never evicted.
+    """
+
+    def __init__(self, idle_seconds: int = EXCHANGE_CLIENT_IDLE_SECONDS):
+        self.idle_seconds = idle_seconds
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._sweeper: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _fingerprint(connection: Dict[str, Any]) -> tuple:
+        return (
+            connection["exchange"],
+            connection.get("api_key_encrypted"),
+            connection.get("api_secret_encrypted"),
+            connection.get("passphrase_encrypted"),
+        )
+
+    async def _acquire(self, connection: Dict[str, Any]) -> Dict[str, Any]:
+        key = str(connection["_id"])
+        fingerprint = self._fingerprint(connection)
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            entry = self._entries.get(key)
+            if entry and entry["fingerprint"] != fingerprint:
+                # Credentials changed: retire the old client once it is released
+                self._entries.pop(key)
+                if not entry["in_use"]:
+                    await entry["client"].close()
+                else:
+                    entry["retired"] = True
+                entry = None
+
+            if entry is None:
+                passphrase = connection.get("passphrase_encrypted")
+                client = create_exchange_client(
+                    connection["exchange"],
+                    decrypt_api_key(connection["api_key_encrypted"]),
+                    decrypt_api_key(connection["api_secret_encrypted"]),
+                    decrypt_api_key(passphrase) if passphrase else None,
+                )
+                await markets_cache.warm(client)
+                entry = {"client": client, "fingerprint": fingerprint, "in_use": 0, "retired": False}
+                self._entries[key] = entry
+
+            entry["in_use"] += 1
+            entry["last_used"] = time.monotonic()
+            return entry
+
+    @asynccontextmanager
+    async def client(self, connection: Dict[str, Any]) -> AsyncIterator[Any]:
+        """Borrow the pooled client for an exchange connection document."""
+        entry = await self._acquire(connection)
+        try:
+            yield entry["client"]
+        finally:
+            entry["in_use"] -= 1
+            entry["last_used"] = time.monotonic()
+            if entry["retired"] and not entry["in_use"]:
+                await entry["client"].close()
+
+    async def evict(self, connection_id: str) -> None:
+        """Drop the client for a connection, e.g. after it is deleted."""
+        entry = self._entries.pop(str(connection_id), None)
+        self._locks.pop(str(connection_id), None)
+        if entry is None:
+            return
+        if entry["in_use"]:
+            entry["retired"] = True
+        else:
+            await entry["client"].close()
+
+    async def evict_idle(self) -> int:
+        """Close clients unused for longer than the idle timeout."""
+        cutoff = time.monotonic() - self.idle_seconds
+        idle = [
+            key for key, entry in self._entries.items()
+            if not entry["in_use"] and entry["last_used"] < cutoff
+        ]
+        for key in idle:
+            await self.evict(key)
+        return len(idle)
+
+    async def _sweep(self) -> None:
+        while True:
+            await asyncio.sleep(max(self.idle_seconds / 2, 1))
+            try:
+                await self.evict_idle()
+            except Exception as e:
+                print(f"Exchange client sweep failed: {e}")
+
+    def start(self) -> None:
+        """Start evicting idle clients in the background."""
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep())
+
+    async def close(self) -> None:
+        """Stop the sweeper and close every pooled client."""
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            await asyncio.gather(self._sweeper, return_exceptions=True)
+            self._sweeper = None
+        entries = list(self._entries.values())
+        self._entries.clear()
+        self._locks.clear()
+        await asyncio.gather(*(entry["client"].close() for entry in entries), return_exceptions=True)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+exchange_clients = ExchangeClientPool()
+
+balance_cache = TTLCache("balances", EXCHANGE_CACHE_TTL_SECONDS, EXCHANGE_CACHE_STALE_SECONDS)
+position_cache = TTLCache("positions", EXCHANGE_CACHE_TTL_SECONDS, EXCHANGE_CACHE_STALE_SECONDS)
+
+
+def _parse_balances(balance: Dict[str, Any]) -> List[ExchangeBalance]:
+    result = []
+    for currency, data in balance.items():
+        if isinstance(data, dict) and data.get("total") and float(data["total"]) > 0:
+            result.append(ExchangeBalance(
+                currency=currency,
+                total=float(data.get("total", 0)),
+                free=float(data.get("free", 0)),
+                used=float(data.get("used", 0))
+            ))
+    return result
+
+
+def parse_trade(trade: Dict[str, Any]) -> ExchangeTrade:
+    return ExchangeTrade(
+        id=str(trade.get("id", "")),
+        symbol=trade.get("symbol", ""),
+        side=trade.get("side", "").upper(),
+        price=float(trade.get("price", 0)),
+        amount=float(trade.get("amount", 0)),
+        cost=float(trade.get("cost", 0)),
+        timestamp=datetime.fromtimestamp(trade.get("timestamp", 0) / 1000),
+        fee=float(trade.get("fee", {}).get("cost", 0)) if trade.get("fee") else None,
+        fee_currency=trade.get("fee", {}).get("currency") if trade.get("fee") else None
+    )
+
+
 async def test_connection(
     exchange_id: str,
     api_key: str,
     api_secret: str,
     passphrase: Optional[str] = None
 ) -> Dict[str, Any]:
-    """Test exchange API connection and return account info."""
+    """Test exchange API connection and return account info.
+
+    Uses a throwaway client, since the credentials are not saved yet.
+    """
+    exchange = None
     try:
         exchange = create_exchange_client(exchange_id, api_key, api_secret, passphrase)
+        await markets_cache.warm(exchange)
+        balance = await exchange.fetch_balance()
+        held = {
+            currency: float(total)
+            for currency, total in balance.get("total", {}).items()
+            if total and float(total) > 0
+        }
 
-        # Use asyncio to run sync methods
-        loop = asyncio.get_event_loop()
-        balance = await loop.run_in_executor(None, exchange.fetch_balance)
-
-        # Calculate total balance in USD (simplified)
-        total_usd = 0.0
-        if "USDT" in balance.get("total", {}):
-            total_usd = float(balance["total"]["USDT"] or 0)
-        elif "USD" in balance.get("total", {}):
-            total_usd = float(balance["total"]["USD"] or 0)
-        elif "USDC" in balance.get("total", {}):
-            total_usd = float(balance["total"]["USDC"] or 0)
+        # Value every held asset from the shared ticker cache
+        prices = await ticker_cache.usd_prices(exchange_id, held)
+        total_usd = sum(amount * prices[c] for c, amount in held.items() if c in prices)
 
         return {
             "success": True,
             "exchange": exchange_id,
-            "total_balance_usd": total_usd,
-            "currencies": len([k for k, v in balance.get("total", {}).items() if v and float(v) > 0])
+            "total_balance_usd": round(total_usd, 2),
+            "currencies": len(held)
         }
     except Exception as e:
         return {
@@ -162,191 +387,359 @@ async def test_connection(
             "exchange": exchange_id,
             "error": str(e)
         }
+    finally:
+        if exchange is not None:
+            await exchange.close()
 
 
-async def fetch_balances(
-    exchange_id: str,
-    api_key: str,
-    api_secret: str,
-    passphrase: Optional[str] = None
-) -> List[ExchangeBalance]:
-    """Fetch account balances from exchange."""
-    exchange = create_exchange_client(exchange_id, api_key, api_secret, passphrase)
+async def fetch_balances(connection: Dict[str, Any]) -> List[ExchangeBalance]:
+    """Fetch account balances for a saved exchange connection, valued in USD."""
+    async with exchange_clients.client(connection) as exchange:
+        balance = await exchange.fetch_balance()
+    balances = _parse_balances(balance)
 
-    loop = asyncio.get_event_loop()
-    balance = await loop.run_in_executor(None, exchange.fetch_balance)
+    prices = await ticker_cache.usd_prices(connection["exchange"], [b.currency for b in balances])
+    for b in balances:
+        if b.currency in prices:
+            b.usd_value = round(b.total * prices[b.currency], 2)
+    return balances
 
-    result = []
-    for currency, data in balance.items():
-        if isinstance(data, dict) and data.get("total") and float(data["total"]) > 0:
-            result.append(ExchangeBalance(
-                currency=currency,
-                total=float(data.get("total", 0)),
-                free=float(data.get("free", 0)),
-                used=float(data.get("used", 0))
-            ))
 
-    return result
+async def _throttled(exchange: Any, method: str, *args) -> Any:
+    """Call a CCXT method after taking a token from the exchange's shared bucket."""
+    bucket = exchange_bucket(exchange.id, exchange.rateLimit, burst=EXCHANGE_FETCH_CONCURRENCY)
+    await bucket.acquire()
+    return await getattr(exchange, method)(*args)
+
+
+def discovery_types(exchange_id: str) -> List[str]:
+    """CCXT market types searched when discovering a venue's symbols."""
+    config = SUPPORTED_EXCHANGES.get(exchange_id, {})
+    default = ["spot", "swap", "future"] if config.get("has_futures") else ["spot"]
+    return config.get("discovery_types", default)
+
+
+def _market_type(market: Dict[str, Any]) -> str:
+    if market.get("type"):
+        return market["type"]
+    return "spot" if market.get("spot", True) else "swap"
+
+
+async def discover_symbols(exchange: Any, known_symbols: Optional[List[str]] = None) -> List[str]:
+    """Symbols worth querying for a connection's trade history.
+
+    Combines symbols already synced for the connection with markets for every
+    asset currently held, instead of guessing from the exchange's market list.
+    On venues with derivatives, swap and future markets are matched on their
+    settlement currency, and markets with an open position are always included.
+    """
+    await markets_cache.load(exchange)
+    symbols = {s for s in (known_symbols or []) if s in exchange.markets}
+    types = set(discovery_types(exchange.id))
+
+    balance = await _throttled(exchange, "fetch_balance")
+    held = {
+        currency for currency, total in balance.get("total", {}).items()
+        if total and float(total) > 0
+    }
+    for market in exchange.markets.values():
+        market_type = _market_type(market)
+        if market_type not in types or market.get("active") is False:
+            continue
+        # Spot pairs trade against the quote; contracts settle in margin currency
+        pays_in = market.get("quote") if market_type == "spot" else market.get("settle") or market.get("quote")
+        if market.get("base") in held and pays_in in DISCOVERY_QUOTES:
+            symbols.add(market["symbol"])
+
+    if types - {"spot"} and getattr(exchange, "has", {}).get("fetchPositions"):
+        try:
+            positions = await _throttled(exchange, "fetch_positions")
+        except Exception as e:
+            print(f"Failed to fetch {exchange.id} positions for symbol discovery: {e}")
+            positions = []
+        symbols.update(
+            p["symbol"] for p in positions
+            if p.get("symbol") in exchange.markets and float(p.get("contracts") or 0) != 0
+        )
+
+    return sorted(symbols)
+
+
+async def connection_symbols(
+    connection: Dict[str, Any], known_symbols: Optional[List[str]] = None
+) -> List[str]:
+    """Discover the symbols to query for a saved exchange connection."""
+    async with exchange_clients.client(connection) as exchange:
+        return await discover_symbols(exchange, known_symbols)
 
 
 async def fetch_trades(
-    exchange_id: str,
-    api_key: str,
-    api_secret: str,
-    passphrase: Optional[str] = None,
+    connection: Dict[str, Any],
     symbol: Optional[str] = None,
     since: Optional[datetime] = None,
-    limit: int = 100
+    limit: int = 100,
+    known_symbols: Optional[List[str]] = None,
+    symbols: Optional[List[str]] = None
 ) -> List[ExchangeTrade]:
-    """Fetch trade history from exchange."""
-    exchange = create_exchange_client(exchange_id, api_key, api_secret, passphrase)
-
-    loop = asyncio.get_event_loop()
+    """Fetch trade history for a saved exchange connection.
 
+    Without a symbol, venues that support it are queried once for all
+    markets; otherwise symbols are discovered from balances and
+    `known_symbols`, and fetched concurrently. Passing `symbols` fetches
+    exactly those markets and skips discovery. `limit` applies per request.
+    """
     since_timestamp = None
     if since:
         since_timestamp = int(since.timestamp() * 1000)
 
-    if symbol:
-        trades = await loop.run_in_executor(
-            None,
-            lambda: exchange.fetch_my_trades(symbol, since_timestamp, limit)
-        )
-    else:
-        # Fetch trades for all symbols (may require multiple calls)
-        await loop.run_in_executor(None, exchange.load_markets)
-        trades = []
-        # Get most traded symbols
-        for sym in list(exchange.markets.keys())[:10]:
-            try:
-                sym_trades = await loop.run_in_executor(
-                    None,
-                    lambda s=sym: exchange.fetch_my_trades(s, since_timestamp, limit)
-                )
-                trades.extend(sym_trades)
-            except Exception:
-                continue
+    config = SUPPORTED_EXCHANGES.get(connection["exchange"], {})
 
+    async with exchange_clients.client(connection) as exchange:
+        if symbol:
+            trades = await _throttled(exchange, "fetch_my_trades", symbol, since_timestamp, limit)
+        else:
+            trades = None
+            if symbols is None and config.get("all_symbol_trades"):
+                try:
+                    trades = await _throttled(exchange, "fetch_my_trades", None, since_timestamp, limit)
+                except _symbol_required_errors():
+                    trades = None
+
+            if trades is None:
+                if symbols is None:
+                    symbols = await discover_symbols(exchange, known_symbols)
+                semaphore = asyncio.Semaphore(EXCHANGE_FETCH_CONCURRENCY)
+
+                async def fetch_symbol(sym: str) -> List[Dict[str, Any]]:
+                    async with semaphore:
+                        try:
+                            return await _throttled(exchange, "fetch_my_trades", sym, since_timestamp, limit)
+                        except Exception as e:
+                            print(f"Failed to fetch {exchange.id} trades for {sym}: {e}")
+                            return []
+
+                trades = []
+                for sym_trades in await asyncio.gather(*(fetch_symbol(sym) for sym in symbols)):
+                    trades.extend(sym_trades)
+
+    trades.sort(key=lambda t: t.get("timestamp") or 0)
+    return [parse_trade(trade) for trade in trades]
+
+
+def parse_positions(
+    positions: List[Dict[str, Any]], markets: Optional[Dict[str, Any]] = None
+) -> List[ExchangePosition]:
+    """Open positions; `markets` supplies contract sizes CCXT left off a position."""
     result = []
-    for trade in trades[:limit]:
-        result.append(ExchangeTrade(
-            id=str(trade.get("id", "")),
-            symbol=trade.get("symbol", ""),
-            side=trade.get("side", "").upper(),
-            price=float(trade.get("price", 0)),
-            amount=float(trade.get("amount", 0)),
-            cost=float(trade.get("cost", 0)),
-            timestamp=datetime.fromtimestamp(trade.get("timestamp", 0) / 1000),
-            fee=float(trade.get("fee", {}).get("cost", 0)) if trade.get("fee") else None,
-            fee_currency=trade.get("fee", {}).get("currency") if trade.get("fee") else None
-        ))
-
+    for pos in positions:
+        if pos.get("contracts") and float(pos["contracts"]) != 0:
+            market = (markets or {}).get(pos.get("symbol"), {})
+            contract_size = pos.get("contractSize") or market.get("contractSize") or 1
+            result.append(ExchangePosition(
+                symbol=pos.get("symbol", ""),
+                side=pos.get("side", "").upper(),
+                size=abs(float(pos.get("contracts", 0))),
+                entry_price=float(pos.get("entryPrice", 0)),
+                mark_price=float(pos.get("markPrice", 0)),
+                unrealized_pnl=float(pos.get("unrealizedPnl", 0)),
+                leverage=int(pos.get("leverage", 1)) if pos.get("leverage") else None,
+                contract_size=float(contract_size),
+                inverse=bool(market.get("inverse")),
+            ))
     return result
 
 
-async def fetch_positions(
-    exchange_id: str,
-    api_key: str,
-    api_secret: str,
-    passphrase: Optional[str] = None
-) -> List[ExchangePosition]:
+async def load_positions(connection: Dict[str, Any]) -> List[ExchangePosition]:
+    async with exchange_clients.client(connection) as exchange:
+        positions = await exchange.fetch_positions()
+        return parse_positions(positions, exchange.markets)
+
+
+async def fetch_positions(connection: Dict[str, Any]) -> List[ExchangePosition]:
     """Fetch open positions (for futures/derivatives exchanges)."""
-    config = SUPPORTED_EXCHANGES.get(exchange_id, {})
+    config = SUPPORTED_EXCHANGES.get(connection["exchange"], {})
     if not config.get("has_futures"):
         return []
 
-    exchange = create_exchange_client(exchange_id, api_key, api_secret, passphrase)
-
     try:
-        loop = asyncio.get_event_loop()
-        positions = await loop.run_in_executor(None, exchange.fetch_positions)
-
-        result = []
-        for pos in positions:
-            if pos.get("contracts") and float(pos["contracts"]) != 0:
-                result.append(ExchangePosition(
-                    symbol=pos.get("symbol", ""),
-                    side=pos.get("side", "").upper(),
-                    size=abs(float(pos.get("contracts", 0))),
-                    entry_price=float(pos.get("entryPrice", 0)),
-                    mark_price=float(pos.get("markPrice", 0)),
-                    unrealized_pnl=float(pos.get("unrealizedPnl", 0)),
-                    leverage=int(pos.get("leverage", 1)) if pos.get("leverage") else None
-                ))
-
-        return result
+        return await load_positions(connection)
     except Exception:
         return []
 
 
-async def sync_trades_to_db(
-    exchange_id: str,
-    api_key: str,
-    api_secret: str,
-    passphrase: Optional[str],
-    user_id: str,
-    db
-) -> Dict[str, Any]:
-    """Sync trades from exchange to database."""
+async def get_balances(connection: Dict[str, Any], fresh: bool = False) -> List[ExchangeBalance]:
+    """Balances for a connection through the per-connection cache.
+
+    Concurrent requests share one exchange call; `fresh` bypasses the cache.
+    """
+    return await balance_cache.get(
+        str(connection["_id"]), lambda: fetch_balances(connection), fresh=fresh
+    )
+
+
+async def get_positions(
+    connection: Dict[str, Any],
+    fresh: bool = False,
+    strict: bool = False
+) -> List[ExchangePosition]:
+    """Open positions for a connection through the per-connection cache.
+
+    Failed fetches are not cached; they return no positions, or raise with
+    `strict`.
+    """
+    config = SUPPORTED_EXCHANGES.get(connection["exchange"], {})
+    if not config.get("has_futures"):
+        return []
+
     try:
-        # Get last synced trade timestamp
-        last_trade = await db["trades"].find_one(
-            {"user_id": user_id, "source": exchange_id},
-            sort=[("entry_time", -1)]
+        return await position_cache.get(
+            str(connection["_id"]), lambda: load_positions(connection), fresh=fresh
         )
+    except Exception:
+        if strict:
+            raise
+        return []
 
-        since = None
-        if last_trade and last_trade.get("entry_time"):
-            since = last_trade["entry_time"]
-        else:
-            # Default to last 30 days
-            since = datetime.utcnow() - timedelta(days=30)
 
-        # Fetch trades from exchange
-        trades = await fetch_trades(
-            exchange_id, api_key, api_secret, passphrase,
-            since=since, limit=500
+def invalidate_live_data(connection_id: str) -> None:
+    """Drop cached balances and positions for a connection."""
+    balance_cache.invalidate(connection_id)
+    position_cache.invalidate(connection_id)
+
+
+def _watermark_key(symbol: Optional[str]) -> str:
+    """Encode a symbol as a Mongo field name ("*" means all symbols)."""
+    if symbol is None:
+        return ALL_SYMBOLS
+    return symbol.replace("%", "%25").replace(".", "%2E").replace("$", "%24")
+
+
+def _watermark_symbol(key: str) -> Optional[str]:
+    if key == ALL_SYMBOLS:
+        return None
+    return key.replace("%24", "$").replace("%2E", ".").replace("%25", "%")
+
+
+def trade_documents(ctx: SyncContext, trades: List[ExchangeTrade]) -> List[Dict[str, Any]]:
+    return [
+        fill_document(
+            ctx, trade.id, trade.symbol, trade.side, trade.amount, trade.price,
+            trade.timestamp, trade.fee, trade.fee_currency,
         )
+        for trade in trades
+    ]
+
+
+async def store_synced_trades(db, connection: Dict[str, Any], trades: List[ExchangeTrade]) -> Dict[str, int]:
+    """Write a page of trades in one bulk upsert; returns inserted/skipped counts."""
+    ctx = SyncContext(source=connection["exchange"], user_id=connection["user_id"], db=db)
+    return await bulk_upsert_trades(db, trade_documents(ctx, trades))
+
+
+async def _symbol_pages(
+    exchange: Any,
+    ctx: SyncContext,
+    symbol: Optional[str],
+    since_ms: int
+) -> AsyncIterator[FillPage]:
+    """Page through a symbol's trades from `since_ms` until the venue runs dry.
+
+    Each page carries a watermark checkpoint, so an interrupted sync resumes
+    from the last stored page.
+    """
+    cursor = since_ms
+    key = _watermark_key(symbol)
+    while True:
+        page = await _throttled(exchange, "fetch_my_trades", symbol, cursor, EXCHANGE_SYNC_PAGE_LIMIT)
+        if not page:
+            yield FillPage(fills=[])
+            return
+
+        newest = max(trade.get("timestamp") or 0 for trade in page)
+        yield FillPage(
+            fills=trade_documents(ctx, [parse_trade(trade) for trade in page]),
+            checkpoint=(
+                "exchange_connections",
+                {"_id": ctx.connection["_id"]},
+                {"$max": {f"sync_watermarks.{key}": newest}},
+            ),
+        )
+
+        if len(page) < EXCHANGE_SYNC_PAGE_LIMIT:
+            return
+        # Re-read the boundary millisecond (duplicates are skipped on insert),
+        # but step past it if a full page shared a single timestamp.
+        cursor = newest if newest > cursor else cursor + 1
+
+
+@register_adapter(*SUPPORTED_EXCHANGES)
+async def exchange_fills(ctx: SyncContext) -> AsyncIterator[FillPage]:
+    """Sync adapter for CCXT exchanges.
+
+    Each symbol is backfilled from its stored watermark on the connection
+    document (or EXCHANGE_BACKFILL_DAYS ago on first sync). Venues that
+    return all markets at once are paged with a single cursor.
+    """
+    connection = ctx.connection
+    config = SUPPORTED_EXCHANGES.get(ctx.source, {})
+    watermarks = {
+        _watermark_symbol(key): value
+        for key, value in (connection.get("sync_watermarks") or {}).items()
+    }
+    default_since = int((datetime.utcnow() - timedelta(days=EXCHANGE_BACKFILL_DAYS)).timestamp() * 1000)
+
+    async with exchange_clients.client(connection) as exchange:
+        if config.get("all_symbol_trades"):
+            try:
+                async for page in _symbol_pages(exchange, ctx, None, watermarks.get(None, default_since)):
+                    yield page
+                return
+            except _symbol_required_errors():
+                pass
+
+        # Symbols synced before are always re-checked, even if no longer held
+        known_symbols = await ctx.db["trades"].distinct(
+            "symbol", {"user_id": ctx.user_id, "source": ctx.source}
+        )
+        known_symbols.extend(s for s in watermarks if s is not None)
+        symbols = await discover_symbols(exchange, known_symbols)
+
+        def failed(symbol: str, error: Exception) -> None:
+            ctx.failed.append({"symbol": symbol, "error": str(error)})
+
+        sources = {
+            sym: partial(_symbol_pages, exchange, ctx, sym, watermarks.get(sym, default_since))
+            for sym in symbols
+        }
+        async for page in merge_pages(sources, EXCHANGE_FETCH_CONCURRENCY, failed):
+            yield page
 
-        # Insert new trades
-        inserted_count = 0
-        for trade in trades:
-            # Check if trade already exists
-            existing = await db["trades"].find_one({
-                "user_id": user_id,
-                "source": exchange_id,
-                "external_id": trade.id
-            })
-
-            if not existing:
-                trade_doc = {
-                    "user_id": user_id,
-                    "source": exchange_id,
-                    "external_id": trade.id,
-                    "symbol": trade.symbol,
-                    "side": trade.side,
-                    "quantity": trade.amount,
-                    "entry_price": trade.price,
-                    "entry_time": trade.timestamp,
-                    "fee": trade.fee,
-                    "fee_currency": trade.fee_currency,
-                    "pnl": None,  # Will be calculated by matching engine
-                    "status": "CLOSED",
-                    "synced_at": datetime.utcnow()
-                }
-                await db["trades"].insert_one(trade_doc)
-                inserted_count += 1
 
+async def sync_trades_to_db(connection: Dict[str, Any], db) -> Dict[str, Any]:
+    """Sync trades from a saved exchange connection to the database.
+
+    Runs the exchange adapter through the shared sync pipeline, so
+    incremental syncs only fetch the delta past each symbol's watermark.
+    """
+    ctx = SyncContext(
+        source=connection["exchange"], user_id=connection["user_id"], db=db, connection=connection
+    )
+    try:
+        stats = await run_pipeline(ctx)
         return {
             "success": True,
-            "exchange": exchange_id,
-            "synced_trades": inserted_count,
-            "total_fetched": len(trades)
+            "exchange": ctx.source,
+            "synced_trades": stats["inserted"],
+            "skipped_trades": stats["skipped"],
+            "total_fetched": stats["fetched"],
+            "pages": stats["pages"],
+            "failed_symbols": ctx.failed
         }
     except Exception as e:
         return {
             "success": False,
-            "exchange": exchange_id,
+            "exchange": ctx.source,
+            "synced_trades": ctx.stats["inserted"],
             "error": str(e)
         }
 
@@ -0,0 +1,192 @@
+"""
+Import Parser - Column-wise CSV conversion for TradeTracking.io
+Converts CSV rows to trade documents with pandas, using the column mapping
+of the detected import profile (see import_profiles.py). Only the
+import path loads this module, so pandas is not imported at startup.
+"""
+
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple, Union
+
+import pandas as pd
+
+from services.import_profiles import (
+    NUMERIC_FIELDS, SELL_VALUES, TIME_FIELDS, ImportProfile,
+    detect_profile, normalize_header, read_csv_options,
+)
+
+
+def read_header(path: str) -> List[str]:
+    """Read the CSV header row."""
+    return list(pd.read_csv(path, nrows=0, encoding="utf-8-sig").columns)
+
+
+def read_chunks(source: Union[str, BinaryIO], chunk_rows: int, options: Dict[str, Any]):
+    """Iterate over a CSV file (path or binary file) in DataFrames of `chunk_rows` rows."""
+    return pd.read_csv(source, chunksize=chunk_rows, encoding="utf-8-sig", **options)
+
+
+def _to_number(series: pd.Series) -> pd.Series:
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype("float64")
+    text = series.astype("string").str.strip()
+    negative = text.str.startswith("(").fillna(False)  # accounting style "(12.50)"
+    text = text.str.replace(r"[,$()\s]", "", regex=True)
+    # Keep the leading number only: "0.00100000BTC" -> "0.00100000"
+    text = text.str.extract(r"^([-+]?\d*\.?\d+(?:[eE][-+]?\d+)?)", expand=False)
+    numbers = pd.to_numeric(text, errors="coerce").astype("float64")
+    return numbers.where(~negative, -numbers)
+
+
+def _to_time(series: pd.Series, profile: ImportProfile) -> pd.Series:
+    text = series.astype("string").str.strip()
+    if profile.date_cleanup:
+        text = text.str.replace(profile.date_cleanup, "", regex=True)
+    if profile.date_format:
+        parsed = pd.to_datetime(text, format=profile.date_format, errors="coerce", utc=True)
+    else:
+        parsed = pd.to_datetime(text, format="ISO8601", errors="coerce", utc=True)
+        missing = parsed.isna() & text.notna()
+        if missing.any():
+            parsed[missing] = pd.to_datetime(text[missing], format="mixed", errors="coerce", utc=True)
+    return parsed.dt.tz_convert(None)
+
+
+def _pick(df: pd.DataFrame, candidates: List[str]) -> Optional[pd.Series]:
+    """First non-empty value per row across candidate columns."""
+    result = None
+    for col in candidates:
+        if col not in df.columns:
+            continue
+        series = df[col]
+        if series.dtype == object or pd.api.types.is_string_dtype(series):
+            series = series.where(series.astype("string").str.strip() != "")
+        result = series if result is None else result.combine_first(series)
+    return result
+
+
+def _format_times(series: pd.Series) -> pd.Series:
+    return series.dt.strftime("%Y-%m-%dT%H:%M:%S").astype(object).where(series.notna(), None)
+
+
+def parse_trade_frame(
+    df: pd.DataFrame, profile: ImportProfile, user_id: str
+) -> Tuple[List[Dict[str, Any]], int, List[str]]:
+    """Convert a chunk of CSV rows to trade documents, column by column.
+
+    Returns (trades, skipped_count, errors).
+    """
+    df.columns = normalize_header(df.columns)
+    total = len(df)
+
+    # Rows excluded by the profile (e.g. cancelled orders) count as skipped
+    for col, allowed in profile.row_filter.items():
+        if col in df.columns:
+            values = df[col].astype("string").str.strip().str.lower()
+            df = df[values.isin([a.lower() for a in allowed]).fillna(False)]
+
+    fields: Dict[str, pd.Series] = {}
+    # Non-empty numeric cells that could not be parsed ("1,0x0"): the row is skipped
+    bad_numbers: List[Tuple[str, pd.Series]] = []
+    for field, candidates in profile.columns.items():
+        series = _pick(df, candidates)
+        if series is None:
+            continue
+        if field in NUMERIC_FIELDS:
+            raw = series
+            series = _to_number(raw)
+            bad_numbers.append((field, raw[series.isna() & raw.notna()]))
+        elif field in TIME_FIELDS:
+            series = _to_time(series, profile)
+        fields[field] = series
+
+    index = df.index
+    empty = pd.Series(None, index=index, dtype=object)
+    quantity = fields.get("quantity", pd.Series(float("nan"), index=index))
+    entry_price = fields.get("entry_price", pd.Series(float("nan"), index=index))
+    exit_price = fields.get("exit_price", pd.Series(float("nan"), index=index))
+
+    # Totals-only exports (e.g. realized gain/loss reports) carry cost and proceeds
+    if "cost" in fields:
+        entry_price = entry_price.fillna(fields["cost"].abs() / quantity.abs())
+    if "proceeds" in fields:
+        exit_price = exit_price.fillna(fields["proceeds"].abs() / quantity.abs())
+
+    symbol = fields.get("symbol", empty).astype("string").str.strip().str.upper()
+    entry_time = fields.get("entry_time", pd.Series(pd.NaT, index=index))
+
+    if "side" in fields:
+        side_text = fields["side"].astype("string").str.strip().str.upper()
+        is_sell = side_text.isin(SELL_VALUES).fillna(False)
+    else:
+        # No side column: a negative quantity denotes a short/sell
+        is_sell = (quantity < 0).fillna(False)
+
+    valid = (
+        symbol.notna() & (symbol != "")
+        & quantity.notna() & (quantity != 0)
+        & entry_price.notna() & (entry_price != 0)
+        & entry_time.notna()
+    )
+    for _, bad in bad_numbers:
+        valid &= ~index.isin(bad.index)
+
+    errors = []
+    bad_times = fields.get("entry_time")
+    if bad_times is not None:
+        raw = _pick(df, profile.columns["entry_time"])
+        invalid = bad_times.isna() & raw.notna()
+        for value in raw[invalid].head(10):
+            errors.append(f"Invalid date: {value}")
+    for field, bad in bad_numbers:
+        for value in bad.head(max(0, 10 - len(errors))):
+            errors.append(f"Invalid {field.replace('_', ' ')}: {value}")
+
+    closed = (
+        fields.get("exit_time", empty).notna()
+        | exit_price.notna()
+        | fields.get("pnl", empty).notna()
+    )
+
+    out = pd.DataFrame({
+        "symbol": symbol,
+        "side": is_sell.map({True: "SELL", False: "BUY"}),
+        "quantity": quantity.abs(),
+        "entry_price": entry_price.abs(),
+        "exit_price": exit_price.abs(),
+        "entry_time": _format_times(entry_time),
+        "exit_time": _format_times(fields["exit_time"]) if "exit_time" in fields else empty,
+        "status": closed.map({True: "CLOSED", False: "OPEN"}),
+        "pnl": fields.get("pnl", empty),
+        "fee": fields.get("fee", empty),
+    })[valid]
+
+    out = out.astype(object).where(out.notna(), None)
+    trades = out.to_dict("records")
+    for trade in trades:
+        trade["setup"] = None
+        trade["notes"] = None
+        trade["user_id"] = user_id
+        trade["import_profile"] = profile.id
+
+    skipped = total - len(trades)
+    return trades, skipped, errors
+
+
+def parse_csv_file(path: str, user_id: str) -> Dict[str, Any]:
+    """Parse a whole CSV file with its detected profile.
+
+    Runs in worker processes for archive imports, so it only takes and
+    returns picklable values.
+    """
+    header = read_header(path)
+    profile = detect_profile(header)
+    df = pd.read_csv(path, encoding="utf-8-sig", **read_csv_options(profile, header))
+    rows = len(df)
+    trades, skipped, errors = parse_trade_frame(df, profile, user_id)
+    return {
+        "profile": profile.id,
+        "rows": rows,
+        "trades": trades,
+        "skipped": skipped,
+        "errors": errors,
+    }
@@ -0,0 +1,202 @@
+"""
+Import Profiles - Broker CSV formats for TradeTracking.io
+Each profile maps a broker's export columns onto trade fields. The profile is
+chosen by fingerprinting the header row, and its column mapping is resolved
+once per file. Mapped columns are read as text, so `read_csv` skips type
+inference, and converted column-wise instead of one row at a time: a
+formatted number ("1,000", "$12.50") is coerced and an unparseable cell
+only skips its row.
+
+Supported exports:
+  - Binance (spot trade history, USD-M futures trade history)
+  - Interactive Brokers (Flex Query / Activity Statement trades)
+  - Tradier (realized gain/loss)
+  - Webull (order history)
+Unknown headers fall back to the generic alias mapping.
+
+The pandas conversion of rows lives in import_parser.py, so loading the
+profiles (e.g. to list them) does not import pandas.
+"""
+
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+# `cost` and `proceeds` are totals used to derive entry/exit prices when an
+# export has no per-share price columns.
+NUMERIC_FIELDS = {"quantity", "entry_price", "exit_price", "fee", "pnl", "cost", "proceeds"}
+TIME_FIELDS = {"entry_time", "exit_time"}
+
+SELL_VALUES = ["SELL", "SHORT", "S", "SLD"]
+
+# Generic aliases, in priority order per field (first non-empty column wins)
+GENERIC_ALIASES = {
+    "symbol": ["symbol", "ticker", "pair", "instrument"],
+    "side": ["side", "type", "direction", "action"],
+    "quantity": ["quantity", "qty", "size", "amount", "volume"],
+    "entry_price": ["price", "entry price", "avg price", "fill price"],
+    "exit_price": ["exit price", "close price", "sell price"],
+    "entry_time": ["time", "date", "entry time", "timestamp", "open time"],
+    "exit_time": ["exit time", "close time", "exit date", "close date"],
+    "fee": ["fee", "fees", "commission", "commissions"],
+    "pnl": ["pnl", "p&l", "realized pnl", "net pnl", "profit", "gain/loss"],
+}
+
+# Named broker profiles. Column names are matched case-insensitively.
+IMPORT_PROFILES = {
+    "binance_spot": {
+        "name": "Binance Spot Trade History",
+        "fingerprint": ["date(utc)", "pair", "side", "price", "executed", "amount", "fee"],
+        "columns": {
+            "entry_time": "date(utc)",
+            "symbol": "pair",
+            "side": "side",
+            "entry_price": "price",
+            "quantity": "executed",  # e.g. "0.00100000BTC"
+            "fee": "fee",
+        },
+        "date_format": "%Y-%m-%d %H:%M:%S",
+    },
+    "binance_futures": {
+        "name": "Binance USD-M Futures Trade History",
+        "fingerprint": ["date(utc)", "symbol", "side", "price", "quantity", "fee", "realized profit"],
+        "columns": {
+            "entry_time": "date(utc)",
+            "symbol": "symbol",
+            "side": "side",
+            "entry_price": "price",
+            "quantity": "quantity",
+            "fee": "fee",
+            "pnl": "realized profit",
+        },
+        "date_format": "%Y-%m-%d %H:%M:%S",
+    },
+    "ibkr_flex": {
+        "name": "Interactive Brokers Flex Query Trades",
+        "fingerprint": ["symbol", "datetime", "quantity", "tradeprice", "buy/sell"],
+        "columns": {
+            "symbol": "symbol",
+            "entry_time": "datetime",  # e.g. "20260115;093000"
+            "quantity": "quantity",
+            "entry_price": "tradeprice",
+            "side": "buy/sell",
+            "fee": "ibcommission",
+            "pnl": "fifopnlrealized",
+        },
+        "date_format": "%Y%m%d;%H%M%S",
+    },
+    "ibkr_activity": {
+        "name": "Interactive Brokers Activity Statement Trades",
+        "fingerprint": ["symbol", "date/time", "quantity", "t. price", "comm/fee"],
+        "columns": {
+            "symbol": "symbol",
+            "entry_time": "date/time",  # e.g. "2026-01-15, 09:30:00"
+            "quantity": "quantity",
+            "entry_price": "t. price",
+            "fee": "comm/fee",
+            "pnl": "realized p/l",
+        },
+        "date_format": "%Y-%m-%d, %H:%M:%S",
+    },
+    "tradier_gainloss": {
+        "name": "Tradier Realized Gain/Loss",
+        "fingerprint": ["symbol", "quantity", "open date", "close date", "cost", "proceeds"],
+        "columns": {
+            "symbol": "symbol",
+            "quantity": "quantity",
+            "entry_time": "open date",
+            "exit_time": "close date",
+            "cost": "cost",
+            "proceeds": "proceeds",
+            "pnl": "gain/loss",
+        },
+        "date_format": "%m/%d/%Y",
+    },
+    "webull_orders": {
+        "name": "Webull Order History",
+        "fingerprint": ["symbol", "side", "status", "filled", "avg price", "filled time"],
+        "columns": {
+            "symbol": "symbol",
+            "side": "side",
+            "quantity": "filled",
+            "entry_price": "avg price",
+            "entry_time": "filled time",  # e.g. "01/15/2026 09:30:00 EST"
+        },
+        "date_format": "%m/%d/%Y %H:%M:%S",
+        "date_cleanup": r"\s+[A-Z]{2,5}$",
+        "row_filter": {"status": ["Filled"]},
+    },
+}
+
+
+class ImportProfile(BaseModel):
+    id: str
+    name: str
+    fingerprint: FrozenSet[str] = frozenset()
+    columns: Dict[str, List[str]]  # trade field -> candidate columns in priority order
+    date_format: Optional[str] = None
+    date_cleanup: Optional[str] = None
+    row_filter: Dict[str, List[str]] = {}
+
+
+def _compile(profile_id: str, config: Dict[str, Any]) -> ImportProfile:
+    return ImportProfile(
+        id=profile_id,
+        name=config["name"],
+        fingerprint=frozenset(config["fingerprint"]),
+        columns={field: [col] for field, col in config["columns"].items()},
+        date_format=config.get("date_format"),
+        date_cleanup=config.get("date_cleanup"),
+        row_filter=config.get("row_filter", {}),
+    )
+
+
+# Most specific fingerprint first so a superset header picks the richer profile
+COMPILED_PROFILES = sorted(
+    (_compile(pid, config) for pid, config in IMPORT_PROFILES.items()),
+    key=lambda p: len(p.fingerprint),
+    reverse=True,
+)
+
+GENERIC_PROFILE = ImportProfile(
+    id="generic",
+    name="Generic CSV",
+    columns={field: list(aliases) for field, aliases in GENERIC_ALIASES.items()},
+)
+
+
+def normalize_header(columns) -> List[str]:
+    return [str(c).strip().lower() for c in columns]
+
+
+def detect_profile(columns) -> ImportProfile:
+    """Pick the import profile whose fingerprint matches the header row."""
+    header = set(normalize_header(columns))
+    for profile in COMPILED_PROFILES:
+        if profile.fingerprint <= header:
+            return profile
+    return GENERIC_PROFILE
+
+
+def get_supported_import_profiles() -> List[Dict[str, Any]]:
+    """Return the named import formats for display."""
+    return [
+        {"id": pid, "name": config["name"], "columns": config["fingerprint"]}
+        for pid, config in IMPORT_PROFILES.items()
+    ]
+
+
+def read_csv_options(profile: ImportProfile, columns) -> Dict[str, Any]:
+    """Build `read_csv` keyword arguments for a file with the given header.
+
+    Only mapped columns are read, all as text, so pandas does not infer
+    types chunk by chunk and one badly formatted cell cannot fail the file.
+    """
+    wanted = {col for candidates in profile.columns.values() for col in candidates}
+    wanted.update(profile.row_filter)
+
+    usecols = [
+        original for original, normalized in zip(columns, normalize_header(columns))
+        if normalized in wanted
+    ]
+    return {"usecols": usecols, "dtype": {col: "str" for col in usecols}}
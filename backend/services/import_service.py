@@ -0,0 +1,468 @@
+"""
+Trade Import Service - Background CSV imports for TradeTracking.io
+Uploads are spooled to disk and accepted as jobs. A background worker detects
+the broker format (see import_profiles.py), parses the file in chunks and
+inserts trades, recording progress on the job document
+in the `import_jobs` collection so the client can poll for counts and errors.
+
+ZIP archives of CSVs are unpacked to a temp dir and each member is parsed in
+a process pool, so archive imports scale with the number of cores.
+"""
+
+import asyncio
+import importlib
+import multiprocessing
+import os
+import shutil
+import tempfile
+import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from bson import ObjectId
+from pydantic import BaseModel
+
+from database import note_user_write
+from services.import_profiles import detect_profile, read_csv_options
+
+IMPORT_SPOOL_DIR = os.getenv(
+    "IMPORT_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "tradetracking-imports")
+)
+MAX_CONCURRENT_IMPORTS = int(os.getenv("MAX_CONCURRENT_IMPORTS", "4"))
+MAX_CONCURRENT_IMPORTS_PER_USER = int(os.getenv("MAX_CONCURRENT_IMPORTS_PER_USER", "1"))
+MAX_PENDING_IMPORTS_PER_USER = int(os.getenv("MAX_PENDING_IMPORTS_PER_USER", "5"))
+IMPORT_CHUNK_ROWS = int(os.getenv("IMPORT_CHUNK_ROWS", "5000"))
+# Active jobs are touched every heartbeat by the process running them; jobs
+# not touched for IMPORT_STALE_SECONDS belonged to a process that is gone
+IMPORT_HEARTBEAT_SECONDS = float(os.getenv("IMPORT_HEARTBEAT_SECONDS", "30"))
+IMPORT_STALE_SECONDS = int(os.getenv("IMPORT_STALE_SECONDS", "120"))
+IMPORT_PROCESS_WORKERS = int(os.getenv("IMPORT_PROCESS_WORKERS", "0")) or os.cpu_count() or 1
+IMPORT_INSERT_BATCH = int(os.getenv("IMPORT_INSERT_BATCH", "5000"))
+MAX_ARCHIVE_MEMBERS = int(os.getenv("MAX_ARCHIVE_MEMBERS", "500"))
+MAX_ARCHIVE_BYTES = int(os.getenv("MAX_ARCHIVE_BYTES", str(1024 * 1024 * 1024)))
+
+SPOOL_CHUNK_BYTES = 1024 * 1024
+MAX_RECORDED_ERRORS = 50
+
+
+class ImportLimitError(Exception):
+    """Raised when a user already has too many imports queued."""
+
+
+class ImportJob(BaseModel):
+    id: str
+    kind: str = "csv"  # csv or archive
+    status: str  # queued, running, completed, failed
+    filename: Optional[str] = None
+    profile: Optional[str] = None
+    total_rows: Optional[int] = None  # known once the file is parsed
+    total_files: Optional[int] = None
+    processed_files: int = 0
+    processed_rows: int = 0
+    imported: int = 0
+    skipped: int = 0
+    progress: float = 0.0
+    errors: List[str] = []
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+def job_from_doc(doc: Dict[str, Any]) -> ImportJob:
+    """Build the API representation of an import job document."""
+    if doc.get("kind") == "archive":
+        total = doc.get("total_files")
+        processed = doc.get("processed_files", 0)
+    else:
+        # Rows are only counted by parsing them, so progress is by bytes read
+        total = doc.get("total_bytes")
+        processed = doc.get("processed_bytes", 0)
+    if doc.get("status") == "completed":
+        progress = 1.0
+    elif total:
+        progress = min(processed / total, 1.0)
+    else:
+        progress = 0.0
+
+    return ImportJob(
+        id=str(doc["_id"]),
+        kind=doc.get("kind", "csv"),
+        status=doc["status"],
+        filename=doc.get("filename"),
+        profile=doc.get("profile"),
+        total_rows=doc.get("total_rows"),
+        total_files=doc.get("total_files"),
+        processed_files=doc.get("processed_files", 0),
+        processed_rows=doc.get("processed_rows", 0),
+        imported=doc.get("imported", 0),
+        skipped=doc.get("skipped", 0),
+        progress=round(progress, 4),
+        errors=doc.get("errors", []),
+        created_at=doc["created_at"],
+        started_at=doc.get("started_at"),
+        finished_at=doc.get("finished_at"),
+    )
+
+
+# ============================================================================
+# CSV PARSING
+# ============================================================================
+
+async def load_parser():
+    """Import the pandas-based parser on first use, off the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, importlib.import_module, "services.import_parser")
+
+
+def extract_archive(archive_path: str, dest_dir: str) -> List[str]:
+    """Extract the CSV members of a ZIP archive and return their paths.
+
+    Members are written under generated names, so entry paths inside the
+    archive never influence where files land.
+    """
+    paths = []
+    total_bytes = 0
+    with zipfile.ZipFile(archive_path) as archive:
+        members = [
+            info for info in archive.infolist()
+            if not info.is_dir()
+            and info.filename.lower().endswith(".csv")
+            and not os.path.basename(info.filename).startswith(".")
+            and not info.filename.startswith("__MACOSX/")
+        ]
+        if len(members) > MAX_ARCHIVE_MEMBERS:
+            raise ValueError(f"Archive contains more than {MAX_ARCHIVE_MEMBERS} CSV files")
+
+        for index, info in enumerate(members):
+            total_bytes += info.file_size
+            if total_bytes > MAX_ARCHIVE_BYTES:
+                raise ValueError("Archive is too large once uncompressed")
+            path = os.path.join(dest_dir, f"{index:04d}.csv")
+            with archive.open(info) as src, open(path, "wb") as out:
+                shutil.copyfileobj(src, out, SPOOL_CHUNK_BYTES)
+            paths.append(path)
+    return paths
+
+
+# ============================================================================
+# JOB MANAGEMENT
+# ============================================================================
+
+async def spool_upload(upload, directory: str = IMPORT_SPOOL_DIR, suffix: str = ".csv") -> str:
+    """Copy an uploaded file to the spool directory and return its path."""
+    loop = asyncio.get_running_loop()
+    os.makedirs(directory, exist_ok=True)
+    fd, path = tempfile.mkstemp(suffix=suffix, dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = await upload.read(SPOOL_CHUNK_BYTES)
+                if not chunk:
+                    break
+                await loop.run_in_executor(None, out.write, chunk)
+    except Exception:
+        os.unlink(path)
+        raise
+    return path
+
+
+class ImportJobManager:
+    """Runs spooled imports in the background with per-user and per-process limits."""
+
+    def __init__(
+        self,
+        max_concurrent: int = MAX_CONCURRENT_IMPORTS,
+        max_per_user: int = MAX_CONCURRENT_IMPORTS_PER_USER,
+        max_pending_per_user: int = MAX_PENDING_IMPORTS_PER_USER,
+        chunk_rows: int = IMPORT_CHUNK_ROWS,
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_per_user = max_per_user
+        self.max_pending_per_user = max_pending_per_user
+        self.chunk_rows = chunk_rows
+        self._global_slots: Optional[asyncio.Semaphore] = None
+        self._user_slots: Dict[str, asyncio.Semaphore] = {}
+        self._pending: Dict[str, int] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        # Marks the jobs this process runs, so others can tell when it is gone
+        self.owner = uuid.uuid4().hex
+
+    def _get_process_pool(self) -> ProcessPoolExecutor:
+        if self._process_pool is None:
+            # Forking would copy the server's threads and locks (Motor, the
+            # default executor) into the workers; spawned workers start clean
+            self._process_pool = ProcessPoolExecutor(
+                max_workers=IMPORT_PROCESS_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._process_pool
+
+    def _slots_for(self, user_id: str) -> Tuple[asyncio.Semaphore, asyncio.Semaphore]:
+        if self._global_slots is None:
+            self._global_slots = asyncio.Semaphore(self.max_concurrent)
+        if user_id not in self._user_slots:
+            self._user_slots[user_id] = asyncio.Semaphore(self.max_per_user)
+        return self._global_slots, self._user_slots[user_id]
+
+    async def submit(self, db, user_id: str, upload, kind: str = "csv") -> Dict[str, Any]:
+        """Spool an upload, record a queued job and schedule it.
+
+        `kind` is "csv" for a single file or "archive" for a ZIP of CSVs.
+        """
+        if self._pending.get(user_id, 0) >= self.max_pending_per_user:
+            raise ImportLimitError(
+                f"Too many imports in progress ({self.max_pending_per_user}). "
+                "Wait for them to finish before uploading more files."
+            )
+
+        path = await spool_upload(upload, suffix=".zip" if kind == "archive" else ".csv")
+        job_doc = {
+            "user_id": user_id,
+            "kind": kind,
+            "owner": self.owner,
+            "status": "queued",
+            "filename": getattr(upload, "filename", None),
+            "total_rows": None,
+            "processed_rows": 0,
+            "imported": 0,
+            "skipped": 0,
+            "errors": [],
+            "created_at": datetime.utcnow(),
+            "updated_at": datetime.utcnow(),
+            "started_at": None,
+            "finished_at": None,
+        }
+        result = await db["import_jobs"].insert_one(job_doc)
+        job_doc["_id"] = result.inserted_id
+
+        self._pending[user_id] = self._pending.get(user_id, 0) + 1
+        task = asyncio.create_task(self._run(db, result.inserted_id, user_id, path, kind))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job_doc
+
+    async def get(self, db, job_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """Fetch a job document owned by the user."""
+        if not ObjectId.is_valid(job_id):
+            return None
+        return await db["import_jobs"].find_one({"_id": ObjectId(job_id), "user_id": user_id})
+
+    async def _run(self, db, job_id: ObjectId, user_id: str, path: str, kind: str) -> None:
+        global_slots, user_slots = self._slots_for(user_id)
+        jobs = db["import_jobs"]
+        try:
+            async with user_slots, global_slots:
+                if kind == "archive":
+                    await self._process_archive(db, job_id, user_id, path)
+                else:
+                    await self._process(db, job_id, user_id, path)
+        except asyncio.CancelledError:
+            await jobs.update_one(
+                {"_id": job_id},
+                {"$set": {"status": "failed", "finished_at": datetime.utcnow()},
+                 "$push": {"errors": "Import interrupted by server shutdown"}}
+            )
+            raise
+        except Exception as e:
+            await jobs.update_one(
+                {"_id": job_id},
+                {"$set": {"status": "failed", "finished_at": datetime.utcnow()},
+                 "$push": {"errors": f"Failed to process file: {e}"}}
+            )
+        finally:
+            # Even a failed import may have stored some trades
+            note_user_write(user_id)
+            self._pending[user_id] -= 1
+            if not self._pending[user_id]:
+                del self._pending[user_id]
+                self._user_slots.pop(user_id, None)
+            if os.path.exists(path):
+                os.unlink(path)
+
+    async def _process(self, db, job_id: ObjectId, user_id: str, path: str) -> None:
+        loop = asyncio.get_running_loop()
+        jobs = db["import_jobs"]
+
+        parser = await load_parser()
+        header = await loop.run_in_executor(None, parser.read_header, path)
+        profile = detect_profile(header)
+        await jobs.update_one(
+            {"_id": job_id},
+            {"$set": {
+                "status": "running",
+                "started_at": datetime.utcnow(),
+                "updated_at": datetime.utcnow(),
+                "total_bytes": os.path.getsize(path),
+                "processed_bytes": 0,
+                "profile": profile.id,
+            }}
+        )
+
+        options = read_csv_options(profile, header)
+        source = open(path, "rb")
+        reader = await loop.run_in_executor(
+            None, lambda: parser.read_chunks(source, self.chunk_rows, options)
+        )
+        recorded_errors = 0
+        position = 0
+        rows = 0
+        try:
+            while True:
+                chunk = await loop.run_in_executor(None, next, reader, None)
+                if chunk is None:
+                    break
+
+                trades, skipped, errors = await loop.run_in_executor(
+                    None, parser.parse_trade_frame, chunk, profile, user_id
+                )
+                if trades:
+                    await db["trades"].insert_many(trades, ordered=False)
+
+                # The parser reads ahead in blocks, so this is approximate
+                read_to = source.tell()
+                rows += len(chunk)
+                counts = {
+                    "processed_rows": len(chunk),
+                    "processed_bytes": read_to - position,
+                    "imported": len(trades),
+                    "skipped": skipped,
+                }
+                position = read_to
+                recorded_errors = await self._record_progress(jobs, job_id, counts, errors, recorded_errors)
+        finally:
+            reader.close()
+            source.close()
+
+        await jobs.update_one(
+            {"_id": job_id},
+            {"$set": {"status": "completed", "total_rows": rows, "finished_at": datetime.utcnow()}}
+        )
+
+    async def _process_archive(self, db, job_id: ObjectId, user_id: str, path: str) -> None:
+        loop = asyncio.get_running_loop()
+        jobs = db["import_jobs"]
+        workdir = tempfile.mkdtemp(dir=os.path.dirname(path))
+        try:
+            members = await loop.run_in_executor(None, extract_archive, path, workdir)
+            await jobs.update_one(
+                {"_id": job_id},
+                {"$set": {
+                    "status": "running",
+                    "started_at": datetime.utcnow(),
+                    "updated_at": datetime.utcnow(),
+                    "total_files": len(members),
+                    "total_rows": 0,
+                }}
+            )
+
+            parser = await load_parser()
+            pool = self._get_process_pool()
+            futures = [
+                asyncio.wrap_future(pool.submit(parser.parse_csv_file, member, user_id))
+                for member in members
+            ]
+
+            # Merge parsed members into batched inserts as workers finish
+            batch: List[Dict[str, Any]] = []
+            recorded_errors = 0
+            for future in asyncio.as_completed(futures):
+                try:
+                    parsed = await future
+                except Exception as e:
+                    recorded_errors = await self._record_progress(
+                        jobs, job_id, {"processed_files": 1}, [f"Failed to parse file: {e}"], recorded_errors
+                    )
+                    continue
+
+                batch.extend(parsed["trades"])
+                imported = 0
+                while len(batch) >= IMPORT_INSERT_BATCH:
+                    await db["trades"].insert_many(batch[:IMPORT_INSERT_BATCH], ordered=False)
+                    imported += IMPORT_INSERT_BATCH
+                    batch = batch[IMPORT_INSERT_BATCH:]
+
+                counts = {
+                    "processed_files": 1,
+                    "total_rows": parsed["rows"],
+                    "processed_rows": parsed["rows"],
+                    "imported": imported,
+                    "skipped": parsed["skipped"],
+                }
+                recorded_errors = await self._record_progress(
+                    jobs, job_id, counts, parsed["errors"], recorded_errors
+                )
+
+            if batch:
+                await db["trades"].insert_many(batch, ordered=False)
+                await self._record_progress(jobs, job_id, {"imported": len(batch)}, [], recorded_errors)
+        finally:
+            await loop.run_in_executor(None, shutil.rmtree, workdir, True)
+
+        await jobs.update_one(
+            {"_id": job_id},
+            {"$set": {"status": "completed", "finished_at": datetime.utcnow()}}
+        )
+
+    async def _record_progress(
+        self, jobs, job_id: ObjectId, counts: Dict[str, int], errors: List[str], recorded_errors: int
+    ) -> int:
+        """Increment job counters and append errors up to the recording cap."""
+        update: Dict[str, Any] = {
+            "$inc": counts,
+            "$set": {"updated_at": datetime.utcnow()},
+        }
+        errors = errors[:max(MAX_RECORDED_ERRORS - recorded_errors, 0)]
+        if errors:
+            update["$push"] = {"errors": {"$each": errors}}
+        await jobs.update_one({"_id": job_id}, update)
+        return recorded_errors + len(errors)
+
+    async def recover_interrupted(self, db) -> None:
+        """Fail jobs whose process stopped sending heartbeats."""
+        cutoff = datetime.utcnow() - timedelta(seconds=IMPORT_STALE_SECONDS)
+        await db["import_jobs"].update_many(
+            {
+                "status": {"$in": ["queued", "running"]},
+                "updated_at": {"$lt": cutoff},
+                "owner": {"$ne": self.owner},
+            },
+            {"$set": {"status": "failed", "finished_at": datetime.utcnow()},
+             "$push": {"errors": "Import interrupted by server restart"}}
+        )
+
+    async def _heartbeat(self, db) -> None:
+        while True:
+            await asyncio.sleep(IMPORT_HEARTBEAT_SECONDS)
+            try:
+                await db["import_jobs"].update_many(
+                    {"owner": self.owner, "status": {"$in": ["queued", "running"]}},
+                    {"$set": {"updated_at": datetime.utcnow()}},
+                )
+                await self.recover_interrupted(db)
+            except Exception as e:
+                print(f"Import heartbeat failed: {e}")
+
+    def start(self, db) -> None:
+        """Keep this process's jobs alive and fail those of stopped processes."""
+        if self._heartbeat_task is None:
+            self._heartbeat_task = asyncio.create_task(self._heartbeat(db))
+
+    async def shutdown(self) -> None:
+        """Cancel in-flight imports and stop the parser processes."""
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            await asyncio.gather(self._heartbeat_task, return_exceptions=True)
+            self._heartbeat_task = None
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False, cancel_futures=True)
+            self._process_pool = None
+
+
+import_jobs = ImportJobManager()
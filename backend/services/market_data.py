@@ -0,0 +1,237 @@
+"""
+Market Data Service - Shared ticker cache for TradeTracking.io
+Last prices are fetched with public (unauthenticated) CCXT clients, one per
+exchange, and cached process-wide for a few seconds so every user valuing
+the same assets shares the same requests. Missing prices for an exchange are
+fetched in one batched `fetch_tickers` call.
+
+Used to value balances in USD and to mark open trades to market.
+"""
+
+import asyncio
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from services.markets_cache import markets_cache
+from services.rate_limiter import exchange_bucket
+
+# Seconds a cached last price is considered current
+MARKET_DATA_TTL_SECONDS = float(os.getenv("MARKET_DATA_TTL_SECONDS", "10"))
+
+# Exchange used to price trades that were not synced from an exchange
+MARKET_DATA_DEFAULT_EXCHANGE = os.getenv("MARKET_DATA_DEFAULT_EXCHANGE", "binance")
+
+# Currencies valued at 1 USD without a lookup
+USD_STABLE = {"USD", "USDT", "USDC", "BUSD", "FDUSD", "TUSD", "USDP", "DAI", "PYUSD"}
+
+# Quote currencies tried, in order, when pricing an asset in USD
+USD_QUOTES = ("USDT", "USD", "USDC")
+
+
+class TickerCache:
+    """Process-wide last-price cache filled by batched ticker requests."""
+
+    def __init__(self, ttl: float = MARKET_DATA_TTL_SECONDS):
+        self.ttl = ttl
+        self._prices: Dict[Tuple[str, str], Tuple[float, float]] = {}
+        self._clients: Dict[str, Any] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._stats = {"hits": 0, "misses": 0, "requests": 0, "errors": 0}
+
+    def _client(self, exchange_id: str) -> Any:
+        client = self._clients.get(exchange_id)
+        if client is None:
+            import ccxt.async_support as ccxt
+
+            exchange_class = getattr(ccxt, exchange_id, None)
+            if exchange_class is None:
+                raise ValueError(f"No market data for exchange {exchange_id}")
+            client = exchange_class({"enableRateLimit": True, "timeout": 10000})
+            self._clients[exchange_id] = client
+        return client
+
+    def _cached(self, exchange_id: str, symbol: str) -> Optional[float]:
+        entry = self._prices.get((exchange_id, symbol))
+        if entry and time.monotonic() - entry[1] < self.ttl:
+            return entry[0]
+        return None
+
+    async def _request(self, exchange: Any, method: str, *args) -> Any:
+        await exchange_bucket(exchange.id, exchange.rateLimit).acquire()
+        self._stats["requests"] += 1
+        return await getattr(exchange, method)(*args)
+
+    async def _fetch(self, exchange: Any, symbols: List[str]) -> Dict[str, Any]:
+        import ccxt.async_support as ccxt
+
+        if exchange.has.get("fetchTickers"):
+            try:
+                return await self._request(exchange, "fetch_tickers", symbols)
+            except ccxt.ArgumentsRequired:
+                # Venue only serves the full ticker list; cache all of it
+                return await self._request(exchange, "fetch_tickers")
+
+        results = await asyncio.gather(
+            *[self._request(exchange, "fetch_ticker", s) for s in symbols],
+            return_exceptions=True
+        )
+        return {s: t for s, t in zip(symbols, results) if isinstance(t, dict)}
+
+    async def get_prices(self, exchange_id: str, symbols: Iterable[str]) -> Dict[str, float]:
+        """Last prices for symbols on an exchange; unknown symbols are omitted."""
+        wanted = set(symbols)
+        prices = {}
+        for symbol in wanted:
+            price = self._cached(exchange_id, symbol)
+            if price is not None:
+                prices[symbol] = price
+        if len(prices) == len(wanted):
+            self._stats["hits"] += len(wanted)
+            return prices
+
+        # One batched request per exchange at a time; callers queued behind it
+        # usually find their symbols cached by the time they get the lock.
+        lock = self._locks.setdefault(exchange_id, asyncio.Lock())
+        async with lock:
+            missing = [s for s in wanted - prices.keys() if self._cached(exchange_id, s) is None]
+            self._stats["hits"] += len(wanted) - len(missing)
+            self._stats["misses"] += len(missing)
+            if missing:
+                try:
+                    exchange = self._client(exchange_id)
+                    await markets_cache.load(exchange)
+                    listed = [s for s in missing if s in exchange.markets]
+                    tickers = await self._fetch(exchange, listed) if listed else {}
+                except Exception as e:
+                    self._stats["errors"] += 1
+                    print(f"Ticker fetch failed for {exchange_id}: {e}")
+                    tickers = {}
+
+                now = time.monotonic()
+                for symbol, ticker in tickers.items():
+                    last = ticker.get("last") or ticker.get("close")
+                    if last:
+                        self._prices[(exchange_id, symbol)] = (float(last), now)
+
+            for symbol in wanted:
+                price = self._cached(exchange_id, symbol)
+                if price is not None:
+                    prices[symbol] = price
+        return prices
+
+    async def resolve_symbol(self, exchange_id: str, symbol: str) -> Optional[str]:
+        """Map a journal symbol ("BTC/USDT", "BTCUSDT", "BTC") to a market symbol."""
+        try:
+            exchange = self._client(exchange_id)
+            await markets_cache.load(exchange)
+        except Exception:
+            return None
+
+        if symbol in exchange.markets:
+            return symbol
+        market = exchange.markets_by_id.get(symbol) if exchange.markets_by_id else None
+        if market:
+            return (market[0] if isinstance(market, list) else market)["symbol"]
+        for quote in USD_QUOTES:
+            candidate = f"{symbol.upper()}/{quote}"
+            if candidate in exchange.markets:
+                return candidate
+        return None
+
+    async def usd_prices(self, exchange_id: str, currencies: Iterable[str]) -> Dict[str, float]:
+        """USD price per currency, via the first listed USD-quoted market."""
+        currencies = list(currencies)
+        result = {c: 1.0 for c in currencies if c in USD_STABLE}
+        others = [c for c in currencies if c not in USD_STABLE]
+        if not others:
+            return result
+
+        try:
+            exchange = self._client(exchange_id)
+            await markets_cache.load(exchange)
+        except Exception as e:
+            print(f"Could not load markets for {exchange_id}: {e}")
+            return result
+
+        symbol_for = {}
+        for currency in others:
+            for quote in USD_QUOTES:
+                if f"{currency}/{quote}" in exchange.markets:
+                    symbol_for[currency] = f"{currency}/{quote}"
+                    break
+
+        prices = await self.get_prices(exchange_id, symbol_for.values())
+        for currency, symbol in symbol_for.items():
+            if symbol in prices:
+                result[currency] = prices[symbol]
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self._stats["hits"] + self._stats["misses"]
+        return {
+            "entries": len(self._prices),
+            "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+            **self._stats,
+        }
+
+    async def close(self) -> None:
+        """Close the public exchange clients."""
+        clients, self._clients = list(self._clients.values()), {}
+        await asyncio.gather(*[c.close() for c in clients], return_exceptions=True)
+
+
+ticker_cache = TickerCache()
+
+
+def _pricing_exchange(trade: Dict[str, Any]) -> str:
+    import ccxt.async_support as ccxt
+
+    source = trade.get("source")
+    if source and hasattr(ccxt, source):
+        return source
+    return MARKET_DATA_DEFAULT_EXCHANGE
+
+
+async def mark_open_trades(trades: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Mark open trades to market with one batched price lookup per exchange.
+
+    Trades are priced on the exchange they were synced from, or on the
+    default exchange otherwise. Trades with no known price get None.
+    """
+    by_exchange: Dict[str, List[Dict[str, Any]]] = {}
+    for trade in trades:
+        by_exchange.setdefault(_pricing_exchange(trade), []).append(trade)
+
+    async def mark_exchange(exchange_id: str, group: List[Dict[str, Any]]) -> Dict[str, Optional[float]]:
+        names = {t["symbol"] for t in group}
+        resolved = dict(zip(names, await asyncio.gather(
+            *[ticker_cache.resolve_symbol(exchange_id, n) for n in names]
+        )))
+        prices = await ticker_cache.get_prices(exchange_id, {s for s in resolved.values() if s})
+        return {name: prices.get(symbol) for name, symbol in resolved.items() if symbol}
+
+    exchange_ids = list(by_exchange)
+    price_maps = dict(zip(exchange_ids, await asyncio.gather(
+        *[mark_exchange(e, by_exchange[e]) for e in exchange_ids]
+    )))
+
+    marks = []
+    for exchange_id, group in by_exchange.items():
+        for trade in group:
+            mark = price_maps[exchange_id].get(trade["symbol"])
+            unrealized = None
+            if mark is not None:
+                direction = 1 if trade["side"] == "BUY" else -1
+                unrealized = (mark - trade["entry_price"]) * trade["quantity"] * direction
+            marks.append({
+                "trade_id": str(trade["_id"]),
+                "symbol": trade["symbol"],
+                "side": trade["side"],
+                "quantity": trade["quantity"],
+                "entry_price": trade["entry_price"],
+                "exchange": exchange_id,
+                "mark_price": mark,
+                "unrealized_pnl": round(unrealized, 8) if unrealized is not None else None,
+            })
+    return marks
@@ -0,0 +1,216 @@
+"""
+Markets Cache - Shared CCXT markets metadata for TradeTracking.io
+`load_markets` downloads and parses every market an exchange lists, which is
+several megabytes for large venues. The result is cached on disk per exchange
+as gzipped JSON, shared by all worker processes, and used to warm new CCXT
+clients with `set_markets` instead of hitting the network.
+
+Files are written atomically (temp file + rename), read lazily on first use,
+and refreshed on a schedule by whichever worker takes the refresh lock.
+"""
+
+import asyncio
+import gzip
+import json
+import os
+import tempfile
+import time
+from typing import Any, Dict, Optional, Set, Tuple
+
+MARKETS_CACHE_DIR = os.getenv(
+    "MARKETS_CACHE_DIR", os.path.join(tempfile.gettempdir(), "tradetracking-markets")
+)
+# Cached markets older than this are ignored and reloaded from the exchange
+MARKETS_CACHE_MAX_AGE_SECONDS = int(os.getenv("MARKETS_CACHE_MAX_AGE_SECONDS", "86400"))
+# How often cached exchanges are refreshed in the background
+MARKETS_REFRESH_SECONDS = int(os.getenv("MARKETS_REFRESH_SECONDS", "3600"))
+# A refresh lock older than this is assumed abandoned by a dead worker
+MARKETS_LOCK_STALE_SECONDS = 300
+
+
+class MarketsCache:
+    """Disk-backed markets metadata per exchange, shared across processes."""
+
+    def __init__(
+        self,
+        directory: str = MARKETS_CACHE_DIR,
+        max_age: int = MARKETS_CACHE_MAX_AGE_SECONDS,
+        refresh_seconds: int = MARKETS_REFRESH_SECONDS,
+    ):
+        self.directory = directory
+        self.max_age = max_age
+        self.refresh_seconds = refresh_seconds
+        # exchange id -> (file mtime, decoded payload)
+        self._loaded: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._seen: Set[str] = set()
+        self._refresher: Optional[asyncio.Task] = None
+
+    def _path(self, exchange_id: str, suffix: str = ".json.gz") -> str:
+        return os.path.join(self.directory, f"{exchange_id}{suffix}")
+
+    # --- file I/O (blocking, run in the default executor) ---
+
+    def _read_file(self, exchange_id: str) -> Optional[Tuple[float, Dict[str, Any]]]:
+        path = self._path(exchange_id)
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return None
+        cached = self._loaded.get(exchange_id)
+        if cached and cached[0] == mtime:
+            return cached
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                payload = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable markets cache for {exchange_id}: {e}")
+            return None
+        return mtime, payload
+
+    def _write_file(self, exchange_id: str, payload: Dict[str, Any]) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=f".{exchange_id}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6) as f:
+                f.write(json.dumps(payload, separators=(",", ":"), default=str).encode("utf-8"))
+            os.replace(tmp_path, self._path(exchange_id))
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def _try_lock(self, exchange_id: str) -> bool:
+        """Take the cross-process refresh lock for an exchange."""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(exchange_id, ".lock")
+        for _ in range(2):
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.write(fd, str(os.getpid()).encode())
+                os.close(fd)
+                return True
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(path) < MARKETS_LOCK_STALE_SECONDS:
+                        return False
+                    os.unlink(path)
+                except OSError:
+                    return False
+        return False
+
+    def _unlock(self, exchange_id: str) -> None:
+        try:
+            os.unlink(self._path(exchange_id, ".lock"))
+        except OSError:
+            pass
+
+    # --- cache API ---
+
+    async def read(self, exchange_id: str) -> Optional[Dict[str, Any]]:
+        """Cached markets payload for an exchange, or None if missing or too old."""
+        self._seen.add(exchange_id)
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(None, self._read_file, exchange_id)
+        if result is None:
+            return None
+        mtime, payload = result
+        self._loaded[exchange_id] = result
+        if time.time() - mtime > self.max_age:
+            return None
+        return payload
+
+    async def write(self, exchange: Any) -> None:
+        """Persist a client's loaded markets and currencies."""
+        payload = {
+            "exchange": exchange.id,
+            "fetched_at": time.time(),
+            "markets": list(exchange.markets.values()),
+            "currencies": dict(exchange.currencies or {}),
+        }
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, self._write_file, exchange.id, payload)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"Could not write markets cache for {exchange.id}: {e}")
+
+    async def warm(self, exchange: Any) -> bool:
+        """Set markets on a client from the cache, without touching the network."""
+        if getattr(exchange, "markets", None):
+            return True
+        try:
+            payload = await self.read(exchange.id)
+            if payload is None:
+                return False
+            exchange.set_markets(payload["markets"], payload.get("currencies") or None)
+            return True
+        except Exception as e:
+            print(f"Could not warm {exchange.id} markets from cache: {e}")
+            return False
+
+    async def load(self, exchange: Any) -> Dict[str, Any]:
+        """Drop-in for `exchange.load_markets()` that goes through the cache.
+
+        On a cache miss the markets are loaded from the exchange once per
+        process and written back for the other workers.
+        """
+        if await self.warm(exchange):
+            return exchange.markets
+
+        lock = self._locks.setdefault(exchange.id, asyncio.Lock())
+        async with lock:
+            if await self.warm(exchange):
+                return exchange.markets
+            await exchange.load_markets()
+            await self.write(exchange)
+        return exchange.markets
+
+    async def refresh(self, exchange_id: str, force: bool = False) -> bool:
+        """Reload an exchange's markets from the network into the cache.
+
+        Skipped if another worker holds the refresh lock or refreshed the
+        file recently (unless `force`).
+        """
+        loop = asyncio.get_running_loop()
+        if not await loop.run_in_executor(None, self._try_lock, exchange_id):
+            return False
+        client = None
+        try:
+            cached = await loop.run_in_executor(None, self._read_file, exchange_id)
+            if cached and not force and time.time() - cached[0] < self.refresh_seconds / 2:
+                return False
+            import ccxt.async_support as ccxt
+
+            client = getattr(ccxt, exchange_id)({"enableRateLimit": True, "timeout": 30000})
+            await client.load_markets()
+            await self.write(client)
+            return True
+        except Exception as e:
+            print(f"Markets refresh failed for {exchange_id}: {e}")
+            return False
+        finally:
+            if client is not None:
+                await client.close()
+            await loop.run_in_executor(None, self._unlock, exchange_id)
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            for exchange_id in sorted(self._seen):
+                await self.refresh(exchange_id)
+
+    def start(self) -> None:
+        """Refresh markets for exchanges used by this worker on a schedule."""
+        if self._refresher is None:
+            self._refresher = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self) -> None:
+        if self._refresher is not None:
+            self._refresher.cancel()
+            await asyncio.gather(self._refresher, return_exceptions=True)
+            self._refresher = None
+
+
+markets_cache = MarketsCache()
@@ -1,16 +1,51 @@
 """
 Stripe Payment Service for TradeTracking.io
 Handles subscription management, checkout, and webhooks
+
+The Stripe SDK is synchronous, so every API call runs on a dedicated thread
+pool instead of blocking the event loop. Subscription status is cached on
+the user document (`subscription`) and kept current by webhooks, so reading
+it never calls Stripe. Webhook events are applied in the background by
+services/stripe_events.py.
 """
 
-import stripe
+import asyncio
 import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from typing import Dict, Any, Optional
 from pydantic import BaseModel
 from datetime import datetime
 
-# Initialize Stripe
-stripe.api_key = os.getenv("STRIPE_SECRET_KEY", "")
+# Threads available for concurrent Stripe API calls
+STRIPE_MAX_WORKERS = int(os.getenv("STRIPE_MAX_WORKERS", "8"))
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _stripe():
+    """Import and configure the Stripe SDK on first use."""
+    import stripe
+
+    if not stripe.api_key:
+        stripe.api_key = os.getenv("STRIPE_SECRET_KEY", "")
+    return stripe
+
+
+async def _run(fn, *args, **kwargs):
+    """Run a blocking Stripe SDK call on the Stripe thread pool."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=STRIPE_MAX_WORKERS, thread_name_prefix="stripe")
+    return await asyncio.get_running_loop().run_in_executor(_executor, partial(fn, *args, **kwargs))
+
+
+def shutdown_stripe_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+        _executor = None
+
 
 # Product/Price IDs (should be configured in Stripe Dashboard)
 SUBSCRIPTION_TIERS = {
@@ -80,8 +115,11 @@ async def create_checkout_session(
     if not price_id:
         return {"success": False, "error": f"Price not configured for {tier} {billing_cycle}"}
 
+    stripe = _stripe()
+
     try:
-        session = stripe.checkout.Session.create(
+        session = await _run(
+            stripe.checkout.Session.create,
             customer_email=email,
             payment_method_types=["card"],
             line_items=[{
@@ -118,8 +156,11 @@ async def create_customer_portal_session(
     return_url: str
 ) -> Dict[str, Any]:
     """Create a Stripe Customer Portal session for managing subscription."""
+    stripe = _stripe()
+
     try:
-        session = stripe.billing_portal.Session.create(
+        session = await _run(
+            stripe.billing_portal.Session.create,
             customer=stripe_customer_id,
             return_url=return_url
         )
@@ -132,32 +173,42 @@ async def create_customer_portal_session(
         return {"success": False, "error": str(e)}
 
 
+def subscription_info(subscription) -> SubscriptionInfo:
+    """SubscriptionInfo from a Stripe subscription object (API or webhook)."""
+    metadata = subscription.get("metadata") or {}
+    period_start = subscription.get("current_period_start")
+    period_end = subscription.get("current_period_end")
+    return SubscriptionInfo(
+        tier=metadata.get("tier", "starter"),
+        status=subscription.get("status"),
+        current_period_start=datetime.fromtimestamp(period_start) if period_start else None,
+        current_period_end=datetime.fromtimestamp(period_end) if period_end else None,
+        cancel_at_period_end=bool(subscription.get("cancel_at_period_end")),
+        stripe_subscription_id=subscription.get("id")
+    )
+
+
 async def get_subscription_status(stripe_subscription_id: str) -> SubscriptionInfo:
     """Get current subscription status from Stripe."""
-    try:
-        subscription = stripe.Subscription.retrieve(stripe_subscription_id)
-
-        tier = subscription.metadata.get("tier", "starter")
+    stripe = _stripe()
 
-        return SubscriptionInfo(
-            tier=tier,
-            status=subscription.status,
-            current_period_start=datetime.fromtimestamp(subscription.current_period_start),
-            current_period_end=datetime.fromtimestamp(subscription.current_period_end),
-            cancel_at_period_end=subscription.cancel_at_period_end,
-            stripe_subscription_id=stripe_subscription_id
-        )
+    try:
+        subscription = await _run(stripe.Subscription.retrieve, stripe_subscription_id)
+        return subscription_info(subscription)
     except stripe.error.StripeError:
         return SubscriptionInfo(tier="starter", status="none")
 
 
 async def cancel_subscription(stripe_subscription_id: str, immediate: bool = False) -> Dict[str, Any]:
     """Cancel a subscription."""
+    stripe = _stripe()
+
     try:
         if immediate:
-            subscription = stripe.Subscription.delete(stripe_subscription_id)
+            subscription = await _run(stripe.Subscription.delete, stripe_subscription_id)
         else:
-            subscription = stripe.Subscription.modify(
+            subscription = await _run(
+                stripe.Subscription.modify,
                 stripe_subscription_id,
                 cancel_at_period_end=True
             )
@@ -171,9 +222,10 @@ async def cancel_subscription(stripe_subscription_id: str, immediate: bool = Fal
         return {"success": False, "error": str(e)}
 
 
-async def handle_webhook_event(payload: bytes, sig_header: str) -> Dict[str, Any]:
-    """Handle Stripe webhook events."""
+def verify_webhook_event(payload: bytes, sig_header: str) -> Dict[str, Any]:
+    """Check a webhook's Stripe signature and parse its event."""
     webhook_secret = os.getenv("STRIPE_WEBHOOK_SECRET", "")
+    stripe = _stripe()
 
     try:
         event = stripe.Webhook.construct_event(payload, sig_header, webhook_secret)
@@ -182,6 +234,19 @@ async def handle_webhook_event(payload: bytes, sig_header: str) -> Dict[str, Any
     except stripe.error.SignatureVerificationError:
         return {"success": False, "error": "Invalid signature"}
 
+    return {"success": True, "event": event}
+
+
+async def handle_webhook_event(payload: bytes, sig_header: str) -> Dict[str, Any]:
+    """Handle Stripe webhook events."""
+    verified = verify_webhook_event(payload, sig_header)
+    if not verified["success"]:
+        return verified
+    return interpret_webhook_event(verified["event"])
+
+
+def interpret_webhook_event(event) -> Dict[str, Any]:
+    """Map a verified Stripe event to the action it implies for a user."""
     event_type = event["type"]
     data = event["data"]["object"]
 
@@ -205,15 +270,16 @@ async def handle_webhook_event(payload: bytes, sig_header: str) -> Dict[str, Any
             "stripe_subscription_id": data.get("subscription")
         })
 
-    elif event_type == "customer.subscription.updated":
-        # Subscription was updated (upgrade/downgrade)
+    elif event_type in ("customer.subscription.created", "customer.subscription.updated"):
+        # Subscription started or changed (upgrade/downgrade, renewal, past due)
         user_id = data.get("metadata", {}).get("user_id")
         tier = data.get("metadata", {}).get("tier")
         result.update({
             "action": "subscription_updated",
             "user_id": user_id,
             "tier": tier,
-            "status": data.get("status")
+            "status": data.get("status"),
+            "subscription": subscription_info(data).model_dump()
         })
 
     elif event_type == "customer.subscription.deleted":
@@ -222,7 +288,8 @@ async def handle_webhook_event(payload: bytes, sig_header: str) -> Dict[str, Any
         result.update({
             "action": "subscription_cancelled",
             "user_id": user_id,
-            "tier": "starter"  # Downgrade to free
+            "tier": "starter",  # Downgrade to free
+            "subscription": SubscriptionInfo(tier="starter", status="canceled").model_dump()
         })
 
     elif event_type == "invoice.payment_failed":
@@ -236,6 +303,64 @@ async def handle_webhook_event(payload: bytes, sig_header: str) -> Dict[str, Any
     return result
 
 
+# Subscription statuses that grant the paid tier
+ACTIVE_STATUSES = {"active", "trialing"}
+
+
+def _user_filter(user_id: str) -> Dict[str, Any]:
+    from bson import ObjectId
+
+    return {"_id": ObjectId(user_id) if ObjectId.is_valid(user_id) else user_id}
+
+
+async def cache_subscription(db, user_id: str, info: SubscriptionInfo) -> None:
+    """Store a subscription snapshot on the user document."""
+    await db["users"].update_one(
+        _user_filter(user_id),
+        {"$set": {"subscription": {**info.model_dump(), "updated_at": datetime.utcnow()}}}
+    )
+
+
+async def apply_webhook_result(db, result: Dict[str, Any]) -> None:
+    """Apply a handled webhook event to the user's tier and cached subscription."""
+    action = result.get("action")
+    user_id = result.get("user_id")
+    if not user_id:
+        return
+
+    update: Dict[str, Any] = {}
+    if action == "subscription_created":
+        update = {
+            "subscription_tier": result.get("tier"),
+            "stripe_customer_id": result.get("stripe_customer_id"),
+            "stripe_subscription_id": result.get("stripe_subscription_id"),
+        }
+    elif action == "subscription_updated":
+        subscription = result["subscription"]
+        update = {"subscription": {**subscription, "updated_at": datetime.utcnow()}}
+        if subscription["status"] in ACTIVE_STATUSES:
+            update["subscription_tier"] = subscription["tier"]
+    elif action == "subscription_cancelled":
+        update = {
+            "subscription_tier": "starter",
+            "subscription": {**result["subscription"], "updated_at": datetime.utcnow()},
+        }
+
+    if update:
+        await db["users"].update_one(_user_filter(user_id), {"$set": update})
+
+    if action == "subscription_created":
+        # A snapshot of an earlier (e.g. canceled) subscription no longer
+        # applies; the next status read fetches the new one from Stripe
+        await db["users"].update_one(
+            {
+                **_user_filter(user_id),
+                "subscription.stripe_subscription_id": {"$ne": result.get("stripe_subscription_id")},
+            },
+            {"$unset": {"subscription": ""}},
+        )
+
+
 def get_pricing_info() -> Dict[str, Any]:
     """Get pricing information for frontend display."""
     return {
@@ -0,0 +1,136 @@
+"""
+Portfolio Service - Cross-venue portfolio aggregation for TradeTracking.io
+Fetches balances and positions for all of a user's exchange connections
+concurrently, each bounded by a per-venue timeout, and nets the results into
+one exposure per asset. Slow venues never hold up the response: a venue that
+misses the deadline is reported as late (served from its last cached
+snapshot when there is one) or failed, and its fetch keeps warming the cache
+in the background.
+"""
+
+import asyncio
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.exchange_service import (
+    SUPPORTED_EXCHANGES, balance_cache, get_balances, get_positions, position_cache,
+)
+
+PORTFOLIO_VENUE_TIMEOUT_SECONDS = float(os.getenv("PORTFOLIO_VENUE_TIMEOUT_SECONDS", "5"))
+
+
+def _asset_of(symbol: str) -> str:
+    """Base asset of a market symbol ("BTC/USDT:USDT" -> "BTC")."""
+    return symbol.split("/")[0].split(":")[0]
+
+
+async def _with_deadline(coro, cache, key: str, timeout: float) -> Tuple[str, Optional[List[Any]], Optional[str]]:
+    """Run a venue fetch under a deadline.
+
+    Returns (status, value, error) where status is "ok", "late" (deadline
+    missed, last cached value used) or "failed".
+    """
+    try:
+        return "ok", await asyncio.wait_for(coro, timeout), None
+    except asyncio.TimeoutError:
+        cached = cache.peek(key)
+        if cached is not None:
+            return "late", cached, f"No response within {timeout:g}s; showing last known data"
+        return "failed", None, f"No response within {timeout:g}s"
+    except Exception as e:
+        return "failed", None, str(e)
+
+
+async def _fetch_venue(connection: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+    key = str(connection["_id"])
+    started = time.monotonic()
+    has_futures = SUPPORTED_EXCHANGES.get(connection["exchange"], {}).get("has_futures")
+
+    balances_task = _with_deadline(get_balances(connection), balance_cache, key, timeout)
+    if has_futures:
+        (b_status, balances, b_error), (p_status, positions, p_error) = await asyncio.gather(
+            balances_task, _with_deadline(get_positions(connection, strict=True), position_cache, key, timeout)
+        )
+    else:
+        b_status, balances, b_error = await balances_task
+        p_status, positions, p_error = "ok", [], None
+
+    statuses = {b_status, p_status}
+    status = "failed" if "failed" in statuses else "late" if "late" in statuses else "ok"
+    return {
+        "connection_id": key,
+        "exchange": connection["exchange"],
+        "status": status,
+        "latency_ms": round((time.monotonic() - started) * 1000, 1),
+        "error": b_error or p_error,
+        "balances": balances or [],
+        "positions": positions or [],
+    }
+
+
+def _net_exposure(venues: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    assets: Dict[str, Dict[str, Any]] = {}
+
+    def entry(asset: str) -> Dict[str, Any]:
+        if asset not in assets:
+            assets[asset] = {
+                "asset": asset, "spot": 0.0, "derivatives": 0.0, "net": 0.0,
+                "usd_value": 0.0, "priced": True, "exchanges": [],
+            }
+        return assets[asset]
+
+    for venue in venues:
+        for balance in venue["balances"]:
+            e = entry(balance.currency)
+            e["spot"] += balance.total
+            if balance.usd_value is None:
+                e["priced"] = False
+            else:
+                e["usd_value"] += balance.usd_value
+            if venue["exchange"] not in e["exchanges"]:
+                e["exchanges"].append(venue["exchange"])
+        for position in venue["positions"]:
+            e = entry(_asset_of(position.symbol))
+            # Contracts to base units (contract size, inverse contracts)
+            size = position.base_size()
+            signed = -size if position.side == "SHORT" else size
+            e["derivatives"] += signed
+            e["usd_value"] += signed * position.mark_price
+            if venue["exchange"] not in e["exchanges"]:
+                e["exchanges"].append(venue["exchange"])
+
+    for e in assets.values():
+        e["net"] = e["spot"] + e["derivatives"]
+        e["usd_value"] = round(e["usd_value"], 2)
+    return sorted(assets.values(), key=lambda e: abs(e["usd_value"]), reverse=True)
+
+
+async def get_portfolio(
+    connections: List[Dict[str, Any]],
+    timeout: float = PORTFOLIO_VENUE_TIMEOUT_SECONDS
+) -> Dict[str, Any]:
+    """Aggregate balances and positions across connections concurrently."""
+    venues = await asyncio.gather(*(_fetch_venue(c, timeout) for c in connections))
+    assets = _net_exposure(venues)
+
+    return {
+        "as_of": datetime.utcnow(),
+        "total_balance_usd": round(sum(b.usd_value or 0 for v in venues for b in v["balances"]), 2),
+        "net_exposure_usd": round(sum(a["usd_value"] for a in assets), 2),
+        "partial": any(v["status"] != "ok" for v in venues),
+        "assets": assets,
+        "venues": [
+            {
+                "connection_id": v["connection_id"],
+                "exchange": v["exchange"],
+                "status": v["status"],
+                "latency_ms": v["latency_ms"],
+                "error": v["error"],
+                "balances_usd": round(sum(b.usd_value or 0 for b in v["balances"]), 2),
+                "positions": [p.model_dump() for p in v["positions"]],
+            }
+            for v in venues
+        ],
+    }
@@ -0,0 +1,66 @@
+"""
+Rate Limiter - Async token buckets for TradeTracking.io
+Used to pace outbound venue API calls so concurrent requests stay within an
+exchange's published request weight.
+"""
+
+import asyncio
+import time
+from typing import Dict, Optional, Tuple
+
+
+class TokenBucket:
+    """Token bucket refilled at `rate` tokens per second, holding up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock: Optional[asyncio.Lock] = None
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1) -> Tuple[bool, float]:
+        """Take tokens without waiting.
+
+        Returns (acquired, seconds until enough tokens are available).
+        """
+        self._refill()
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return True, 0.0
+        return False, (tokens - self._tokens) / self.rate
+
+    async def acquire(self, tokens: float = 1) -> None:
+        """Wait until tokens are available and take them (FIFO among waiters)."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                acquired, wait = self.try_acquire(tokens)
+                if acquired:
+                    return
+                await asyncio.sleep(wait)
+
+
+# Shared per-venue buckets, so all connections to one exchange in this
+# process draw from the same request budget.
+_exchange_buckets: Dict[str, TokenBucket] = {}
+
+
+def exchange_bucket(exchange_id: str, rate_limit_ms: float, burst: float = 1) -> TokenBucket:
+    """Return the process-wide bucket for an exchange.
+
+    `rate_limit_ms` is CCXT's `rateLimit`: the minimum milliseconds between
+    requests for one unit of weight.
+    """
+    bucket = _exchange_buckets.get(exchange_id)
+    if bucket is None:
+        rate = 1000.0 / max(rate_limit_ms or 1, 1)
+        bucket = TokenBucket(rate=rate, capacity=max(burst, 1))
+        _exchange_buckets[exchange_id] = bucket
+    return bucket
@@ -0,0 +1,288 @@
+"""
+Request Limits - Per-user rate limits and concurrency caps for TradeTracking.io
+Every authenticated API request is classified by route (venue syncs, live
+venue reads, analytics, streams, everything else) and checked against the
+user's subscription tier:
+
+  - a token bucket per user and route class (requests per minute + burst)
+  - a cap on the user's concurrent requests in that class
+
+Over either limit the request gets 429 with Retry-After. Limits are held
+in-process (so caps are per worker process); with RATE_LIMIT_SHARED the
+per-minute budget is also counted in MongoDB and shared by all workers.
+"""
+
+import math
+import os
+import re
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from jose import JWTError, jwt
+from pymongo import ReturnDocument
+from starlette.responses import JSONResponse
+
+from auth import ALGORITHM, SECRET_KEY
+from database import db
+from services.cache import TTLCache
+from services.rate_limiter import TokenBucket
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_SHARED = os.getenv("RATE_LIMIT_SHARED", "false").lower() == "true"
+RATE_LIMIT_IDLE_SECONDS = int(os.getenv("RATE_LIMIT_IDLE_SECONDS", "600"))
+# How long a user's tier is cached, so an upgrade applies within this time
+RATE_LIMIT_TIER_TTL_SECONDS = float(os.getenv("RATE_LIMIT_TIER_TTL_SECONDS", "60"))
+
+
+@dataclass(frozen=True)
+class RouteLimit:
+    per_minute: float
+    burst: int
+    concurrent: int
+
+
+# Limits per route class and subscription tier
+ROUTE_LIMITS: Dict[str, Dict[str, RouteLimit]] = {
+    # Venue syncs and imports: the heaviest work, also run in the background
+    "sync": {
+        "starter": RouteLimit(per_minute=2, burst=2, concurrent=1),
+        "pro": RouteLimit(per_minute=10, burst=5, concurrent=2),
+        "elite": RouteLimit(per_minute=30, burst=10, concurrent=4),
+    },
+    # Live reads from exchanges and brokers (balances, positions, portfolio)
+    "venue": {
+        "starter": RouteLimit(per_minute=30, burst=10, concurrent=2),
+        "pro": RouteLimit(per_minute=120, burst=30, concurrent=4),
+        "elite": RouteLimit(per_minute=300, burst=60, concurrent=8),
+    },
+    # Aggregations over the user's trades; the dashboard loads three at once
+    "analytics": {
+        "starter": RouteLimit(per_minute=30, burst=10, concurrent=3),
+        "pro": RouteLimit(per_minute=90, burst=20, concurrent=4),
+        "elite": RouteLimit(per_minute=180, burst=40, concurrent=6),
+    },
+    # Server-sent event streams hold a slot for as long as they are open
+    "stream": {
+        "starter": RouteLimit(per_minute=10, burst=5, concurrent=2),
+        "pro": RouteLimit(per_minute=30, burst=10, concurrent=5),
+        "elite": RouteLimit(per_minute=60, burst=20, concurrent=10),
+    },
+    "api": {
+        "starter": RouteLimit(per_minute=120, burst=60, concurrent=8),
+        "pro": RouteLimit(per_minute=300, burst=120, concurrent=16),
+        "elite": RouteLimit(per_minute=600, burst=240, concurrent=32),
+    },
+}
+
+ROUTE_CLASSES = [
+    ("sync", "POST", re.compile(r"^/api/v1/exchanges/[^/]+/sync$")),
+    ("sync", "POST", re.compile(r"^/api/v1/(trades/import|imports/archive)$")),
+    ("venue", "GET", re.compile(r"^/api/v1/exchanges/[^/]+/(balances|positions)$")),
+    ("venue", "GET", re.compile(r"^/api/v1/(portfolio|trades/mark-to-market)$")),
+    ("venue", "POST", re.compile(r"^/api/v1/exchanges/(test|connect)$")),
+    ("analytics", "GET", re.compile(r"^/api/v1/(dashboard/stats|journal/stats|reports/equity)$")),
+    ("stream", "GET", re.compile(r"^/api/v1/exchanges/[^/]+/stream$")),
+]
+
+# Never limited: Stripe must always be able to deliver webhooks
+EXEMPT_PREFIXES = ("/api/v1/webhooks/", "/api/v1/health")
+
+
+def route_class(method: str, path: str) -> Optional[str]:
+    """Limit class for a request, or None if it is not limited."""
+    if not path.startswith("/api/v1/") or path.startswith(EXEMPT_PREFIXES):
+        return None
+    for name, route_method, pattern in ROUTE_CLASSES:
+        if method == route_method and pattern.match(path):
+            return name
+    return "api"
+
+
+def _bearer_username(headers) -> Optional[str]:
+    for name, value in headers:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() != "bearer" or not token:
+                return None
+            try:
+                return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+            except JWTError:
+                # Rejected by authentication, not here
+                return None
+    return None
+
+
+class RequestLimiter:
+    """Token buckets and concurrency counters per user and route class."""
+
+    def __init__(
+        self,
+        limits: Dict[str, Dict[str, RouteLimit]] = ROUTE_LIMITS,
+        shared: bool = RATE_LIMIT_SHARED,
+        idle_seconds: float = RATE_LIMIT_IDLE_SECONDS,
+    ):
+        self.limits = limits
+        self.shared = shared
+        self.idle_seconds = idle_seconds
+        self.tiers = TTLCache("user_tiers", RATE_LIMIT_TIER_TTL_SECONDS, stale_ttl=RATE_LIMIT_TIER_TTL_SECONDS)
+        self._buckets: Dict[Tuple[str, str, str], TokenBucket] = {}
+        self._last_seen: Dict[Tuple[str, str, str], float] = {}
+        self._active: Dict[Tuple[str, str], int] = {}
+        self._pruned_at = time.monotonic()
+        self._stats: Dict[str, Dict[str, int]] = {
+            name: {"allowed": 0, "limited_rate": 0, "limited_concurrency": 0, "limited_shared": 0}
+            for name in limits
+        }
+
+    async def tier_for(self, username: str) -> str:
+        async def load() -> str:
+            user = await db.db["users"].find_one({"username": username}, {"subscription_tier": 1})
+            return (user or {}).get("subscription_tier") or "starter"
+
+        return await self.tiers.get(username, load)
+
+    def limit_for(self, route: str, tier: str) -> RouteLimit:
+        by_tier = self.limits[route]
+        return by_tier.get(tier, by_tier["starter"])
+
+    def _bucket(self, key: Tuple[str, str, str], limit: RouteLimit) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(rate=limit.per_minute / 60.0, capacity=limit.burst)
+            self._buckets[key] = bucket
+        self._last_seen[key] = time.monotonic()
+        return bucket
+
+    def _prune(self) -> None:
+        """Forget buckets of users idle long enough for them to have refilled."""
+        now = time.monotonic()
+        if now - self._pruned_at < self.idle_seconds:
+            return
+        self._pruned_at = now
+        for key, seen in list(self._last_seen.items()):
+            if now - seen > self.idle_seconds:
+                del self._last_seen[key]
+                del self._buckets[key]
+
+    async def _shared_allows(self, username: str, route: str, limit: RouteLimit) -> Tuple[bool, float]:
+        """Count the request in this minute's cross-worker window."""
+        now = time.time()
+        window = int(now // 60)
+        try:
+            doc = await db.db["rate_limit_windows"].find_one_and_update(
+                {"_id": f"{username}:{route}:{window}"},
+                {
+                    "$inc": {"count": 1},
+                    "$setOnInsert": {"expires_at": datetime.utcnow() + timedelta(minutes=2)},
+                },
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except Exception as e:
+            # Fail open: the in-process limits still apply
+            print(f"Shared rate limit check failed: {e}")
+            return True, 0.0
+        if doc["count"] > limit.per_minute:
+            return False, 60 - now % 60
+        return True, 0.0
+
+    async def acquire(self, username: str, route: str) -> Tuple[bool, float]:
+        """Admit a request; returns (admitted, seconds to wait before retrying).
+
+        An admitted request must be followed by release().
+        """
+        self._prune()
+        tier = await self.tier_for(username)
+        limit = self.limit_for(route, tier)
+        stats = self._stats[route]
+
+        active_key = (username, route)
+        if self._active.get(active_key, 0) >= limit.concurrent:
+            stats["limited_concurrency"] += 1
+            return False, 1.0
+
+        acquired, wait = self._bucket((username, route, tier), limit).try_acquire()
+        if not acquired:
+            stats["limited_rate"] += 1
+            return False, wait
+
+        if self.shared:
+            acquired, wait = await self._shared_allows(username, route, limit)
+            if not acquired:
+                stats["limited_shared"] += 1
+                return False, wait
+
+        stats["allowed"] += 1
+        self._active[active_key] = self._active.get(active_key, 0) + 1
+        return True, 0.0
+
+    def release(self, username: str, route: str) -> None:
+        key = (username, route)
+        remaining = self._active.get(key, 0) - 1
+        if remaining > 0:
+            self._active[key] = remaining
+        else:
+            self._active.pop(key, None)
+
+    def clear(self) -> None:
+        """Forget all buckets and cached tiers (requests in flight keep their slots)."""
+        self._buckets.clear()
+        self._last_seen.clear()
+        self.tiers.clear()
+
+    def metrics(self) -> Dict[str, Any]:
+        """Admitted and rejected requests per route class, plus current load."""
+        active: Dict[str, int] = {name: 0 for name in self.limits}
+        for (_, route), count in self._active.items():
+            active[route] += count
+        return {
+            "enabled": RATE_LIMIT_ENABLED,
+            "shared": self.shared,
+            "tracked_buckets": len(self._buckets),
+            "routes": {
+                name: {**counters, "active": active[name]}
+                for name, counters in self._stats.items()
+            },
+            "tier_cache": self.tiers.stats(),
+        }
+
+
+request_limiter = RequestLimiter()
+
+
+class RequestLimitMiddleware:
+    """ASGI middleware applying `request_limiter` to authenticated API calls."""
+
+    def __init__(self, app, limiter: Optional[RequestLimiter] = None, enabled: bool = RATE_LIMIT_ENABLED):
+        self.app = app
+        self.limiter = limiter
+        self.enabled = enabled
+
+    async def __call__(self, scope, receive, send) -> None:
+        if not self.enabled or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        route = route_class(scope["method"], scope["path"])
+        username = _bearer_username(scope["headers"]) if route else None
+        if username is None:
+            await self.app(scope, receive, send)
+            return
+
+        limiter = self.limiter if self.limiter is not None else request_limiter
+        admitted, wait = await limiter.acquire(username, route)
+        if not admitted:
+            retry_after = max(1, math.ceil(wait))
+            response = JSONResponse(
+                {"detail": f"Rate limit exceeded for {route} requests. Retry in {retry_after}s."},
+                status_code=429,
+                headers={"Retry-After": str(retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release(username, route)
@@ -7,20 +7,61 @@ Supports stock market brokers that are NOT in CCXT:
   - Schwab (stocks, options) - formerly TD Ameritrade
   - Webull (stocks, options, crypto)
   - Firstrade (stocks, options, ETFs)
+
+Broker clients share one pooled HTTP client per broker API (keep-alive, and
+HTTP/2 where the server supports it), so calls reuse open connections instead
+of paying TCP and TLS setup each time.
 """
 
 import httpx
-from typing import List, Dict, Optional, Any
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from importlib.util import find_spec
+from typing import List, Dict, Optional, Any, AsyncIterator, Tuple
 from pydantic import BaseModel
 from datetime import datetime, timedelta
 from cryptography.fernet import Fernet
 import os
+import time
 import asyncio
+from functools import partial
+from pymongo import ReturnDocument
+
+from services.sync_pipeline import (
+    FillPage, SyncContext, fill_document, get_adapter, merge_pages, register_adapter, run_pipeline,
+)
 
 # Encryption key for API keys
 ENCRYPTION_KEY = os.getenv("ENCRYPTION_KEY", Fernet.generate_key().decode())
 cipher = Fernet(ENCRYPTION_KEY.encode() if isinstance(ENCRYPTION_KEY, str) else ENCRYPTION_KEY)
 
+# Connection pool limits per broker API
+BROKER_HTTP_MAX_CONNECTIONS = int(os.getenv("BROKER_HTTP_MAX_CONNECTIONS", "50"))
+BROKER_HTTP_MAX_KEEPALIVE = int(os.getenv("BROKER_HTTP_MAX_KEEPALIVE", "20"))
+BROKER_HTTP_KEEPALIVE_SECONDS = float(os.getenv("BROKER_HTTP_KEEPALIVE_SECONDS", "60"))
+
+# Request timeouts (seconds); connect is kept short so a dead host fails fast
+BROKER_HTTP_TIMEOUT_SECONDS = float(os.getenv("BROKER_HTTP_TIMEOUT_SECONDS", "30"))
+BROKER_HTTP_CONNECT_TIMEOUT_SECONDS = float(os.getenv("BROKER_HTTP_CONNECT_TIMEOUT_SECONDS", "5"))
+
+# Negotiate HTTP/2 when the `h2` package is installed (httpx[http2])
+BROKER_HTTP2 = os.getenv("BROKER_HTTP2", "true").lower() == "true"
+
+# Accounts of one broker login synced concurrently
+BROKER_SYNC_ACCOUNT_CONCURRENCY = int(os.getenv("BROKER_SYNC_ACCOUNT_CONCURRENCY", "4"))
+
+# Events per Tradier history page (the API maximum)
+TRADIER_HISTORY_PAGE_LIMIT = 500
+
+# IBKR Client Portal gateway; its brokerage session expires after a few
+# minutes without traffic, so live sessions are tickled on this interval
+IBKR_GATEWAY_URL = os.getenv("IBKR_GATEWAY_URL", "https://localhost:5000/v1/api")
+IBKR_TICKLE_SECONDS = float(os.getenv("IBKR_TICKLE_SECONDS", "60"))
+
+# /iserver/account/trades serves at most this many days of executions
+IBKR_TRADES_MAX_DAYS = 7
+# Executions per page handed to the sync pipeline
+IBKR_TRADES_PAGE_SIZE = 100
+
 
 class StockBrokerTrade(BaseModel):
     id: str
@@ -128,6 +169,66 @@ STOCK_BROKERS = {
 }
 
 
+# ============================================================================
+# HTTP CONNECTION POOL
+# ============================================================================
+
+class BrokerHTTPPool:
+    """Shared httpx clients, one per broker API.
+
+    Clients are created on first use and kept open until `close()` (app
+    shutdown). They are shared by every user of a broker, so credentials are
+    sent per request and cookies are never stored.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = BROKER_HTTP_MAX_CONNECTIONS,
+        max_keepalive: int = BROKER_HTTP_MAX_KEEPALIVE,
+        keepalive_seconds: float = BROKER_HTTP_KEEPALIVE_SECONDS,
+        timeout: float = BROKER_HTTP_TIMEOUT_SECONDS,
+        connect_timeout: float = BROKER_HTTP_CONNECT_TIMEOUT_SECONDS,
+        http2: bool = BROKER_HTTP2,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_seconds,
+        )
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.http2 = http2 and find_spec("h2") is not None
+        self.transport = transport
+        self._clients: Dict[Tuple[str, bool], httpx.AsyncClient] = {}
+
+    def client(self, broker_id: str, verify: bool = True) -> httpx.AsyncClient:
+        """Return the pooled client for a broker, creating it on first use."""
+        key = (broker_id, verify)
+        client = self._clients.get(key)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                http2=self.http2,
+                limits=self.limits,
+                timeout=self.timeout,
+                verify=verify,
+                transport=self.transport,
+                cookies=CookieJar(policy=DefaultCookiePolicy(allowed_domains=[])),
+            )
+            self._clients[key] = client
+        return client
+
+    async def close(self) -> None:
+        clients = list(self._clients.values())
+        self._clients.clear()
+        await asyncio.gather(*(c.aclose() for c in clients), return_exceptions=True)
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+
+broker_http = BrokerHTTPPool()
+
+
 # ============================================================================
 # TRADIER INTEGRATION (Recommended - Best API for stocks)
 # ============================================================================
@@ -135,107 +236,114 @@ STOCK_BROKERS = {
 class TradierClient:
     """Tradier API client for stocks and options trading."""
 
-    def __init__(self, access_token: str, sandbox: bool = False):
+    def __init__(self, access_token: str, sandbox: bool = False, pool: Optional[BrokerHTTPPool] = None):
         self.access_token = access_token
         self.base_url = STOCK_BROKERS["tradier"]["sandbox_url" if sandbox else "base_url"]
         self.headers = {
             "Authorization": f"Bearer {access_token}",
             "Accept": "application/json"
         }
+        self.http = (pool if pool is not None else broker_http).client("tradier")
+        self._profile: Optional[Dict[str, Any]] = None
+
+    async def _get(self, path: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        response = await self.http.get(f"{self.base_url}{path}", headers=self.headers, params=params)
+        response.raise_for_status()
+        return response.json()
 
     async def get_profile(self) -> Dict[str, Any]:
         """Get user profile and account information."""
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.base_url}/user/profile",
-                headers=self.headers
-            )
-            response.raise_for_status()
-            return response.json()
+        self._profile = await self._get("/user/profile")
+        return self._profile
 
     async def get_accounts(self) -> List[StockBrokerAccount]:
-        """Get all trading accounts."""
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.base_url}/user/profile",
-                headers=self.headers
-            )
-            response.raise_for_status()
-            data = response.json()
-
-            accounts = []
-            for acc in data.get("profile", {}).get("account", []):
-                if isinstance(acc, dict):
-                    accounts.append(StockBrokerAccount(
-                        account_id=acc.get("account_number", ""),
-                        account_type=acc.get("type", ""),
-                        total_value=float(acc.get("value", 0)),
-                        cash_balance=float(acc.get("cash", {}).get("cash_available", 0)),
-                        buying_power=float(acc.get("buying_power", 0))
-                    ))
-            return accounts
+        """Get all trading accounts (from the profile, if already fetched)."""
+        data = self._profile if self._profile is not None else await self.get_profile()
+
+        account_data = data.get("profile", {}).get("account", [])
+        if isinstance(account_data, dict):
+            account_data = [account_data]
+
+        accounts = []
+        for acc in account_data:
+            accounts.append(StockBrokerAccount(
+                account_id=acc.get("account_number", ""),
+                account_type=acc.get("type", ""),
+                total_value=float(acc.get("value", 0)),
+                cash_balance=float(acc.get("cash", {}).get("cash_available", 0)),
+                buying_power=float(acc.get("buying_power", 0))
+            ))
+        return accounts
 
     async def get_positions(self, account_id: str) -> List[StockBrokerPosition]:
         """Get current positions for an account."""
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.base_url}/accounts/{account_id}/positions",
-                headers=self.headers
-            )
-            response.raise_for_status()
-            data = response.json()
-
-            positions = []
-            pos_data = data.get("positions", {}).get("position", [])
-            if isinstance(pos_data, dict):
-                pos_data = [pos_data]
-
-            for pos in pos_data:
-                positions.append(StockBrokerPosition(
-                    symbol=pos.get("symbol", ""),
-                    quantity=float(pos.get("quantity", 0)),
-                    avg_cost=float(pos.get("cost_basis", 0)) / float(pos.get("quantity", 1)),
-                    current_price=float(pos.get("close_price", 0)),
-                    market_value=float(pos.get("market_value", 0)),
-                    unrealized_pnl=float(pos.get("unrealized_pnl", 0)),
-                    unrealized_pnl_percent=float(pos.get("unrealized_pnl_pct", 0)) * 100
-                ))
-            return positions
+        data = await self._get(f"/accounts/{account_id}/positions")
+
+        positions = []
+        pos_data = data.get("positions", {}).get("position", [])
+        if isinstance(pos_data, dict):
+            pos_data = [pos_data]
+
+        for pos in pos_data:
+            positions.append(StockBrokerPosition(
+                symbol=pos.get("symbol", ""),
+                quantity=float(pos.get("quantity", 0)),
+                avg_cost=float(pos.get("cost_basis", 0)) / float(pos.get("quantity", 1)),
+                current_price=float(pos.get("close_price", 0)),
+                market_value=float(pos.get("market_value", 0)),
+                unrealized_pnl=float(pos.get("unrealized_pnl", 0)),
+                unrealized_pnl_percent=float(pos.get("unrealized_pnl_pct", 0)) * 100
+            ))
+        return positions
+
+    async def get_history_page(
+        self,
+        account_id: str,
+        start_date: Optional[str] = None,
+        page: int = 1,
+        limit: int = TRADIER_HISTORY_PAGE_LIMIT
+    ) -> List[Dict[str, Any]]:
+        """Get one page of raw trade events on or after `start_date` (YYYY-MM-DD)."""
+        params: Dict[str, Any] = {"type": "trade", "page": page, "limit": limit}
+        if start_date:
+            params["start"] = start_date
+
+        data = await self._get(f"/accounts/{account_id}/history", params=params)
+        # An account without history returns {"history": "null"}
+        history = data.get("history") or {}
+        events = history.get("event", []) if isinstance(history, dict) else []
+        if isinstance(events, dict):
+            events = [events]
+        return events
 
     async def get_history(self, account_id: str, start_date: Optional[datetime] = None) -> List[StockBrokerTrade]:
-        """Get trade history for an account."""
-        async with httpx.AsyncClient() as client:
-            params = {"limit": 500}
-            if start_date:
-                params["start"] = start_date.strftime("%Y-%m-%d")
-
-            response = await client.get(
-                f"{self.base_url}/accounts/{account_id}/history",
-                headers=self.headers,
-                params=params
-            )
-            response.raise_for_status()
-            data = response.json()
-
-            trades = []
-            history = data.get("history", {}).get("event", [])
-            if isinstance(history, dict):
-                history = [history]
-
-            for event in history:
-                if event.get("type") == "trade":
-                    trade_data = event.get("trade", {})
-                    trades.append(StockBrokerTrade(
-                        id=str(event.get("id", "")),
-                        symbol=trade_data.get("symbol", ""),
-                        side=trade_data.get("trade_type", "").upper(),
-                        quantity=float(trade_data.get("quantity", 0)),
-                        price=float(trade_data.get("price", 0)),
-                        total_cost=float(trade_data.get("amount", 0)),
-                        timestamp=datetime.fromisoformat(event.get("date", "").replace("Z", "+00:00")),
-                        commission=float(trade_data.get("commission", 0))
-                    ))
-            return trades
+        """Get trade history for an account, following pagination."""
+        start = start_date.strftime("%Y-%m-%d") if start_date else None
+        trades = []
+        page = 1
+        while True:
+            events = await self.get_history_page(account_id, start, page)
+            trades.extend(t for t in map(parse_tradier_event, events) if t is not None)
+            if len(events) < TRADIER_HISTORY_PAGE_LIMIT:
+                return trades
+            page += 1
+
+
+def parse_tradier_event(event: Dict[str, Any]) -> Optional[StockBrokerTrade]:
+    """Convert a Tradier history event to a trade (None for non-trade events)."""
+    if event.get("type") != "trade":
+        return None
+    trade_data = event.get("trade", {})
+    return StockBrokerTrade(
+        id=str(event.get("id", "")),
+        symbol=trade_data.get("symbol", ""),
+        side=trade_data.get("trade_type", "").upper(),
+        quantity=float(trade_data.get("quantity", 0)),
+        price=float(trade_data.get("price", 0)),
+        total_cost=float(trade_data.get("amount", 0)),
+        timestamp=datetime.fromisoformat(event.get("date", "").replace("Z", "+00:00")),
+        commission=float(trade_data.get("commission", 0))
+    )
 
 
 # ============================================================================
@@ -249,56 +357,212 @@ class IBKRClient:
     The gateway runs locally and exposes a REST API on localhost:5000.
     """
 
-    def __init__(self, base_url: str = "https://localhost:5000/v1/api"):
+    def __init__(self, base_url: str = IBKR_GATEWAY_URL, pool: Optional[BrokerHTTPPool] = None):
         self.base_url = base_url
+        # The gateway serves a self-signed certificate
+        self.http = (pool if pool is not None else broker_http).client("ibkr", verify=False)
+
+    async def _get(self, path: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        response = await self.http.get(f"{self.base_url}{path}", params=params)
+        response.raise_for_status()
+        return response.json()
+
+    async def _post(self, path: str) -> Any:
+        response = await self.http.post(f"{self.base_url}{path}")
+        response.raise_for_status()
+        return response.json()
 
     async def get_accounts(self) -> List[Dict[str, Any]]:
         """Get all accounts."""
-        async with httpx.AsyncClient(verify=False) as client:
-            response = await client.get(f"{self.base_url}/portfolio/accounts")
-            response.raise_for_status()
-            return response.json()
+        return await self._get("/portfolio/accounts")
 
     async def get_positions(self, account_id: str) -> List[StockBrokerPosition]:
         """Get positions for an account."""
-        async with httpx.AsyncClient(verify=False) as client:
-            response = await client.get(f"{self.base_url}/portfolio/{account_id}/positions/0")
-            response.raise_for_status()
-            data = response.json()
-
-            positions = []
-            for pos in data:
-                positions.append(StockBrokerPosition(
-                    symbol=pos.get("contractDesc", ""),
-                    quantity=float(pos.get("position", 0)),
-                    avg_cost=float(pos.get("avgCost", 0)),
-                    current_price=float(pos.get("mktPrice", 0)),
-                    market_value=float(pos.get("mktValue", 0)),
-                    unrealized_pnl=float(pos.get("unrealizedPnl", 0)),
-                    unrealized_pnl_percent=float(pos.get("unrealizedPnlPercent", 0))
-                ))
-            return positions
+        data = await self._get(f"/portfolio/{account_id}/positions/0")
+
+        positions = []
+        for pos in data:
+            positions.append(StockBrokerPosition(
+                symbol=pos.get("contractDesc", ""),
+                quantity=float(pos.get("position", 0)),
+                avg_cost=float(pos.get("avgCost", 0)),
+                current_price=float(pos.get("mktPrice", 0)),
+                market_value=float(pos.get("mktValue", 0)),
+                unrealized_pnl=float(pos.get("unrealizedPnl", 0)),
+                unrealized_pnl_percent=float(pos.get("unrealizedPnlPercent", 0))
+            ))
+        return positions
+
+    async def get_executions(self, since_ms: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Raw executions at or after `since_ms`, oldest first.
+
+        Only as many days as needed to reach `since_ms` are requested (up to
+        the endpoint's 7-day maximum).
+        """
+        days = IBKR_TRADES_MAX_DAYS
+        if since_ms is not None:
+            elapsed_days = (time.time() * 1000 - since_ms) / 86_400_000
+            days = max(1, min(IBKR_TRADES_MAX_DAYS, int(elapsed_days) + 1))
+
+        data = await self._get("/iserver/account/trades", params={"days": days})
+        executions = [t for t in data or [] if since_ms is None or t.get("trade_time_r", 0) >= since_ms]
+        executions.sort(key=lambda t: t.get("trade_time_r", 0))
+        return executions
 
     async def get_trades(self, days: int = 7) -> List[StockBrokerTrade]:
-        """Get recent trades/orders."""
-        async with httpx.AsyncClient(verify=False) as client:
-            response = await client.get(f"{self.base_url}/iserver/account/trades")
-            response.raise_for_status()
-            data = response.json()
-
-            trades = []
-            for trade in data:
-                trades.append(StockBrokerTrade(
-                    id=str(trade.get("execution_id", "")),
-                    symbol=trade.get("symbol", ""),
-                    side=trade.get("side", "").upper(),
-                    quantity=float(trade.get("size", 0)),
-                    price=float(trade.get("price", 0)),
-                    total_cost=float(trade.get("size", 0)) * float(trade.get("price", 0)),
-                    timestamp=datetime.fromtimestamp(trade.get("trade_time_r", 0) / 1000),
-                    commission=float(trade.get("commission", 0))
-                ))
-            return trades
+        """Get trades executed in the last `days` days (at most 7)."""
+        since_ms = int((time.time() - days * 86400) * 1000)
+        return [parse_ibkr_trade(t) for t in await self.get_executions(since_ms)]
+
+
+def ibkr_history_gap(since_ms: Optional[int], now_ms: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """The executions IBKR can no longer serve since `since_ms`, if any.
+
+    /iserver/account/trades only reaches back IBKR_TRADES_MAX_DAYS, so a
+    watermark older than that leaves executions in between unsynced.
+    """
+    if since_ms is None:
+        return None
+    if now_ms is None:
+        now_ms = int(time.time() * 1000)
+    oldest_ms = now_ms - IBKR_TRADES_MAX_DAYS * 86_400_000
+    if since_ms >= oldest_ms:
+        return None
+    start = datetime.utcfromtimestamp(since_ms / 1000)
+    end = datetime.utcfromtimestamp(oldest_ms / 1000)
+    return {
+        "type": "history_gap",
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "message": (
+            f"Executions between {start:%Y-%m-%d %H:%M} and {end:%Y-%m-%d %H:%M} UTC are older than "
+            f"IBKR's {IBKR_TRADES_MAX_DAYS}-day limit and were not synced; import them from a Flex Query"
+        ),
+    }
+
+
+def parse_ibkr_trade(trade: Dict[str, Any]) -> StockBrokerTrade:
+    side = trade.get("side", "").upper()
+    return StockBrokerTrade(
+        id=str(trade.get("execution_id", "")),
+        symbol=trade.get("symbol", ""),
+        side={"B": "BUY", "S": "SELL"}.get(side, side),
+        quantity=float(trade.get("size", 0)),
+        price=float(trade.get("price", 0)),
+        total_cost=float(trade.get("size", 0)) * float(trade.get("price", 0)),
+        timestamp=datetime.utcfromtimestamp(trade.get("trade_time_r", 0) / 1000),
+        commission=float(trade.get("commission", 0))
+    )
+
+
+class IBKRSession:
+    """A Client Portal gateway session kept alive between syncs.
+
+    `ensure()` returns a ready client: it tickles the gateway, asks it to
+    re-authenticate if the brokerage session was lost, and primes the
+    /iserver endpoints. From then on a background task POSTs /tickle every
+    `tickle_seconds`, so the next sync does not pay for a full re-auth.
+    """
+
+    def __init__(
+        self,
+        base_url: str = IBKR_GATEWAY_URL,
+        pool: Optional[BrokerHTTPPool] = None,
+        tickle_seconds: float = IBKR_TICKLE_SECONDS,
+        reauth_attempts: int = 10,
+        reauth_poll_seconds: float = 1.0
+    ):
+        self.client = IBKRClient(base_url, pool)
+        self.tickle_seconds = tickle_seconds
+        self.reauth_attempts = reauth_attempts
+        self.reauth_poll_seconds = reauth_poll_seconds
+        self.authenticated = False
+        self.tickles = 0
+        self._last_tickle = 0.0
+        self._primed = False
+        self._lock = asyncio.Lock()
+        self._keepalive: Optional[asyncio.Task] = None
+
+    async def tickle(self) -> bool:
+        """Ping the gateway; returns whether the brokerage session is authenticated."""
+        data = await self.client._post("/tickle")
+        self.tickles += 1
+        self._last_tickle = time.monotonic()
+        status = (data.get("iserver") or {}).get("authStatus") or {}
+        self.authenticated = bool(status.get("authenticated"))
+        return self.authenticated
+
+    async def _reauthenticate(self) -> None:
+        await self.client._post("/iserver/reauthenticate")
+        for _ in range(self.reauth_attempts):
+            status = await self.client._post("/iserver/auth/status")
+            if status.get("authenticated"):
+                self.authenticated = True
+                self._primed = False
+                return
+            await asyncio.sleep(self.reauth_poll_seconds)
+        raise RuntimeError("IBKR gateway is not logged in; sign in to the Client Portal gateway")
+
+    async def ensure(self) -> IBKRClient:
+        """Return the client once the session is authenticated and primed."""
+        async with self._lock:
+            if not self.authenticated or time.monotonic() - self._last_tickle > self.tickle_seconds:
+                if not await self.tickle():
+                    await self._reauthenticate()
+            if not self._primed:
+                # /iserver/account/* answers only after /iserver/accounts was read
+                await self.client._get("/iserver/accounts")
+                self._primed = True
+            if self._keepalive is None:
+                self._keepalive = asyncio.create_task(self._keep_alive())
+        return self.client
+
+    async def _keep_alive(self) -> None:
+        while True:
+            await asyncio.sleep(self.tickle_seconds)
+            try:
+                await self.tickle()
+            except Exception as e:
+                self.authenticated = False
+                print(f"IBKR tickle failed for {self.client.base_url}: {e}")
+
+    async def close(self) -> None:
+        if self._keepalive is not None:
+            self._keepalive.cancel()
+            await asyncio.gather(self._keepalive, return_exceptions=True)
+            self._keepalive = None
+
+
+class IBKRSessionPool:
+    """One managed session per gateway URL, closed on app shutdown.
+
+    Only operator-configured gateways (IBKR_GATEWAY_URL by default) get a
+    session: the client skips TLS verification for the gateway's self-signed
+    certificate, so its URL must never come from user input, and the pool
+    stays bounded by the allowlist.
+    """
+
+    def __init__(self, allowed_urls: Optional[List[str]] = None, **session_options):
+        self.allowed_urls = set(allowed_urls or [IBKR_GATEWAY_URL])
+        self.session_options = session_options
+        self._sessions: Dict[str, IBKRSession] = {}
+
+    def get(self, base_url: str = IBKR_GATEWAY_URL) -> IBKRSession:
+        if base_url not in self.allowed_urls:
+            raise ValueError("IBKR gateway URL is not configured on this server")
+        session = self._sessions.get(base_url)
+        if session is None:
+            session = IBKRSession(base_url, **self.session_options)
+            self._sessions[base_url] = session
+        return session
+
+    async def close(self) -> None:
+        sessions = list(self._sessions.values())
+        self._sessions.clear()
+        await asyncio.gather(*(s.close() for s in sessions))
+
+
+ibkr_sessions = IBKRSessionPool()
 
 
 # ============================================================================
@@ -345,7 +609,7 @@ async def test_broker_connection(broker_id: str, credentials: Dict[str, str]) ->
                 "message": f"Connected to Tradier account"
             }
         elif broker_id == "ibkr":
-            client = IBKRClient()
+            client = await ibkr_sessions.get().ensure()
             accounts = await client.get_accounts()
             return {
                 "success": True,
@@ -377,66 +641,146 @@ def get_supported_stock_brokers() -> List[Dict[str, Any]]:
             "auth_type": config.get("auth_type"),
             "docs": config.get("docs"),
             "note": config.get("note"),
-            "integration_status": "ready" if bid in ["tradier", "alpaca"] else "coming_soon"
+            "integration_status": "ready" if bid in ["tradier", "alpaca", "ibkr"] else "coming_soon"
         }
         for bid, config in STOCK_BROKERS.items()
     ]
 
 
+def broker_trade_document(ctx: SyncContext, trade: StockBrokerTrade) -> Dict[str, Any]:
+    return fill_document(
+        ctx, trade.id, trade.symbol, trade.side, trade.quantity, trade.price,
+        trade.timestamp, trade.commission,
+    )
+
+
+async def _broker_watermarks(ctx: SyncContext) -> Dict[str, Any]:
+    """Load (creating if needed) the user's sync state for a broker."""
+    state = await ctx.db["broker_connections"].find_one_and_update(
+        {"user_id": ctx.user_id, "broker": ctx.source},
+        {"$setOnInsert": {"sync_watermarks": {}}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return (state or {}).get("sync_watermarks") or {}
+
+
+def _watermark_checkpoint(ctx: SyncContext, key: str, value: Any) -> tuple:
+    return (
+        "broker_connections",
+        {"user_id": ctx.user_id, "broker": ctx.source},
+        {"$max": {f"sync_watermarks.{key}": value}},
+    )
+
+
+async def _tradier_account_pages(
+    client: TradierClient,
+    ctx: SyncContext,
+    account_id: str,
+    start: Optional[str]
+) -> AsyncIterator[FillPage]:
+    """Page through an account's trade history from its `start` watermark.
+
+    The watermark moves to the newest event date only with the account's
+    last page, so it does not depend on the order Tradier pages events in:
+    an interrupted sync re-reads the account from the old watermark and the
+    duplicates are skipped on insert. The watermark day itself is also
+    re-read on the next sync, since Tradier filters by date.
+    """
+    page = 1
+    newest: Optional[str] = None
+    while True:
+        events = await client.get_history_page(account_id, start, page)
+        trades = [t for t in map(parse_tradier_event, events) if t is not None]
+        if trades:
+            page_newest = max(t.timestamp for t in trades).strftime("%Y-%m-%d")
+            newest = max(newest or page_newest, page_newest)
+
+        last = len(events) < TRADIER_HISTORY_PAGE_LIMIT
+        checkpoint = _watermark_checkpoint(ctx, account_id, newest) if last and newest else None
+        yield FillPage(fills=[broker_trade_document(ctx, t) for t in trades], checkpoint=checkpoint)
+
+        if last:
+            return
+        page += 1
+
+
+@register_adapter("tradier")
+async def tradier_fills(ctx: SyncContext) -> AsyncIterator[FillPage]:
+    """Sync adapter for Tradier: all accounts concurrently, each from the
+    `start` watermark stored in `broker_connections`."""
+    client = TradierClient(ctx.credentials.get("access_token", ""))
+    accounts, watermarks = await asyncio.gather(client.get_accounts(), _broker_watermarks(ctx))
+
+    def failed(account_id: str, error: Exception) -> None:
+        ctx.failed.append({"account_id": account_id, "error": str(error)})
+
+    sources = {
+        a.account_id: partial(_tradier_account_pages, client, ctx, a.account_id, watermarks.get(a.account_id))
+        for a in accounts
+    }
+    async for page in merge_pages(sources, BROKER_SYNC_ACCOUNT_CONCURRENCY, failed):
+        yield page
+
+
+@register_adapter("ibkr")
+async def ibkr_fills(ctx: SyncContext) -> AsyncIterator[FillPage]:
+    """Sync adapter for IBKR: executions since the stored watermark (ms),
+    fetched over the server's kept-alive gateway session."""
+    session = ibkr_sessions.get()
+    client = await session.ensure()
+    watermarks = await _broker_watermarks(ctx)
+
+    since_ms = watermarks.get("executions")
+    gap = ibkr_history_gap(since_ms)
+    if gap is not None:
+        ctx.warnings.append(gap)
+        print(f"IBKR sync for user {ctx.user_id}: {gap['message']}")
+
+    executions = await client.get_executions(since_ms)
+    for i in range(0, len(executions), IBKR_TRADES_PAGE_SIZE):
+        page = executions[i:i + IBKR_TRADES_PAGE_SIZE]
+        yield FillPage(
+            fills=[broker_trade_document(ctx, parse_ibkr_trade(t)) for t in page],
+            checkpoint=_watermark_checkpoint(ctx, "executions", page[-1].get("trade_time_r", 0)),
+        )
+
+
 async def sync_broker_trades_to_db(
     broker_id: str,
     credentials: Dict[str, str],
     user_id: str,
     db
 ) -> Dict[str, Any]:
-    """Sync trades from stock broker to database."""
-    try:
-        if broker_id == "tradier":
-            client = TradierClient(credentials.get("access_token", ""))
-            accounts = await client.get_accounts()
+    """Sync trades from stock broker to database.
 
-            total_synced = 0
-            for account in accounts:
-                trades = await client.get_history(account.account_id)
-
-                for trade in trades:
-                    existing = await db["trades"].find_one({
-                        "user_id": user_id,
-                        "source": broker_id,
-                        "external_id": trade.id
-                    })
-
-                    if not existing:
-                        trade_doc = {
-                            "user_id": user_id,
-                            "source": broker_id,
-                            "external_id": trade.id,
-                            "symbol": trade.symbol,
-                            "side": trade.side,
-                            "quantity": trade.quantity,
-                            "entry_price": trade.price,
-                            "entry_time": trade.timestamp,
-                            "fee": trade.commission,
-                            "status": "CLOSED",
-                            "synced_at": datetime.utcnow()
-                        }
-                        await db["trades"].insert_one(trade_doc)
-                        total_synced += 1
+    Runs the broker's adapter through the shared sync pipeline; repeated
+    syncs only fetch events past the stored watermarks.
+    """
+    ctx = SyncContext(source=broker_id, user_id=user_id, db=db, credentials=credentials)
+    if get_adapter(broker_id) is None:
+        return {
+            "success": False,
+            "broker": broker_id,
+            "error": f"Broker {broker_id} sync not yet implemented"
+        }
 
-            return {
-                "success": True,
-                "broker": broker_id,
-                "synced_trades": total_synced
-            }
-        else:
-            return {
-                "success": False,
-                "broker": broker_id,
-                "error": f"Broker {broker_id} sync not yet implemented"
-            }
+    try:
+        stats = await run_pipeline(ctx)
+        return {
+            "success": True,
+            "broker": broker_id,
+            "synced_trades": stats["inserted"],
+            "skipped_trades": stats["skipped"],
+            "total_fetched": stats["fetched"],
+            "pages": stats["pages"],
+            "failed_accounts": ctx.failed,
+            "warnings": ctx.warnings
+        }
     except Exception as e:
         return {
             "success": False,
             "broker": broker_id,
+            "synced_trades": ctx.stats["inserted"],
             "error": str(e)
         }
@@ -0,0 +1,287 @@
+"""
+Stream Service - Live fills and positions for TradeTracking.io
+Keeps one upstream watch loop per exchange connection that has browser
+subscribers. Exchanges with a CCXT Pro private WebSocket are watched over
+it; others are polled, backing off while nothing changes. Venues that need
+a symbol per request are polled for symbols discovered when polling starts
+and refreshed every STREAM_SYMBOLS_REFRESH_SECONDS. New fills are
+written through to the trades collection and position snapshots to the
+connection document, then fanned out to every subscriber's queue (served to
+browsers as Server-Sent Events).
+"""
+
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Set
+
+from services.exchange_service import (
+    SUPPORTED_EXCHANGES, connection_symbols, create_exchange_client, decrypt_api_key,
+    fetch_trades, load_positions, parse_positions, parse_trade, store_synced_trades,
+)
+
+STREAM_POLL_MIN_SECONDS = float(os.getenv("STREAM_POLL_MIN_SECONDS", "5"))
+STREAM_POLL_MAX_SECONDS = float(os.getenv("STREAM_POLL_MAX_SECONDS", "60"))
+# Seconds an upstream loop keeps running after its last subscriber leaves
+STREAM_LINGER_SECONDS = float(os.getenv("STREAM_LINGER_SECONDS", "30"))
+STREAM_HEARTBEAT_SECONDS = float(os.getenv("STREAM_HEARTBEAT_SECONDS", "15"))
+# Seconds between symbol rediscoveries (balances, positions) while polling
+STREAM_SYMBOLS_REFRESH_SECONDS = float(os.getenv("STREAM_SYMBOLS_REFRESH_SECONDS", "900"))
+STREAM_QUEUE_SIZE = 100
+# Consecutive WebSocket failures before a connection falls back to polling
+STREAM_WS_MAX_FAILURES = 3
+SEEN_FILL_IDS = 1000
+
+
+def create_stream_client(connection: Dict[str, Any]) -> Optional[Any]:
+    """CCXT Pro client for a connection, or None if it cannot watch fills."""
+    passphrase = connection.get("passphrase_encrypted")
+    try:
+        client = create_exchange_client(
+            connection["exchange"],
+            decrypt_api_key(connection["api_key_encrypted"]),
+            decrypt_api_key(connection["api_secret_encrypted"]),
+            decrypt_api_key(passphrase) if passphrase else None,
+            streaming=True,
+        )
+    except ValueError:
+        return None
+    if not client.has.get("watchMyTrades"):
+        return None
+    return client
+
+
+class ConnectionStream:
+    """Upstream watch loop and subscribers for one exchange connection."""
+
+    def __init__(self, hub: "StreamHub", connection: Dict[str, Any]):
+        self.hub = hub
+        self.connection = connection
+        self.key = str(connection["_id"])
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.mode: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+        self.linger: Optional[asyncio.TimerHandle] = None
+        self._seen: "OrderedDict[str, None]" = OrderedDict()
+        self._positions: Optional[List[Dict[str, Any]]] = None
+        self._fill_symbols: Set[str] = set()
+
+    # --- fan-out ---
+
+    def publish(self, event: str, data: Any) -> None:
+        message = {"event": event, "data": data}
+        for queue in self.subscribers:
+            if queue.full():
+                # Slow consumer: drop its oldest event rather than block the loop
+                queue.get_nowait()
+            queue.put_nowait(message)
+
+    # --- write-through ---
+
+    async def handle_fills(self, raw_trades: List[Any]) -> int:
+        """Store and publish fills not seen before; returns how many were new."""
+        fills = []
+        for raw in raw_trades:
+            fill = parse_trade(raw) if isinstance(raw, dict) else raw
+            if fill.id in self._seen:
+                continue
+            self._seen[fill.id] = None
+            self._fill_symbols.add(fill.symbol)
+            fills.append(fill)
+        while len(self._seen) > SEEN_FILL_IDS:
+            self._seen.popitem(last=False)
+        if not fills:
+            return 0
+
+        await store_synced_trades(self.hub.db, self.connection, fills)
+        for fill in fills:
+            self.publish("fill", fill.model_dump(mode="json"))
+        return len(fills)
+
+    async def handle_positions(self, positions: List[Any]) -> bool:
+        """Store and publish a position snapshot if it changed."""
+        snapshot = [p.model_dump(mode="json") for p in positions]
+        if snapshot == self._positions:
+            return False
+        self._positions = snapshot
+        await self.hub.db["exchange_connections"].update_one(
+            {"_id": self.connection["_id"]},
+            {"$set": {"positions": snapshot, "positions_updated_at": datetime.utcnow()}}
+        )
+        self.publish("positions", snapshot)
+        return True
+
+    # --- upstream loops ---
+
+    async def run(self) -> None:
+        failures = 0
+        while failures < STREAM_WS_MAX_FAILURES:
+            client = self.hub.client_factory(self.connection)
+            if client is None:
+                break
+            self.mode = "websocket"
+            self.publish("status", {"mode": self.mode})
+            started = time.monotonic()
+            try:
+                await asyncio.gather(self._watch_fills(client), self._watch_positions(client))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Only repeated quick failures count towards falling back
+                healthy = time.monotonic() - started > STREAM_POLL_MAX_SECONDS
+                failures = 1 if healthy else failures + 1
+                print(f"Stream for connection {self.key} failed ({failures}): {e}")
+                await asyncio.sleep(min(2 ** failures, STREAM_POLL_MAX_SECONDS))
+            finally:
+                await client.close()
+
+        self.mode = "polling"
+        self.publish("status", {"mode": self.mode})
+        await self._poll()
+
+    async def _watch_fills(self, client: Any) -> None:
+        while True:
+            await self.handle_fills(await client.watch_my_trades())
+
+    async def _watch_positions(self, client: Any) -> None:
+        if not SUPPORTED_EXCHANGES.get(self.connection["exchange"], {}).get("has_futures"):
+            return
+        if client.has.get("watchPositions"):
+            while True:
+                positions = await client.watch_positions()
+                await self.handle_positions(parse_positions(positions, getattr(client, "markets", None)))
+        else:
+            await self._poll_positions()
+
+    async def _poll_positions(self) -> None:
+        interval = STREAM_POLL_MIN_SECONDS
+        while True:
+            changed = await self.handle_positions(await load_positions(self.connection))
+            interval = STREAM_POLL_MIN_SECONDS if changed else min(interval * 2, STREAM_POLL_MAX_SECONDS)
+            await asyncio.sleep(interval)
+
+    async def _poll(self) -> None:
+        """Poll fills (and positions), slowing down while nothing changes."""
+        config = SUPPORTED_EXCHANGES.get(self.connection["exchange"], {})
+        has_futures = config.get("has_futures")
+        # Trade timestamps are parsed as local time (see parse_trade)
+        since = datetime.now()
+        interval = STREAM_POLL_MIN_SECONDS
+        # None: one request covers every market, no discovery needed
+        symbols: Optional[List[str]] = None
+        discovered_at: Optional[float] = None
+        while True:
+            changed = False
+            try:
+                if not config.get("all_symbol_trades") and (
+                    discovered_at is None
+                    or time.monotonic() - discovered_at >= STREAM_SYMBOLS_REFRESH_SECONDS
+                ):
+                    # Symbols that filled while streaming stay polled even once sold
+                    symbols = await connection_symbols(self.connection, sorted(self._fill_symbols))
+                    discovered_at = time.monotonic()
+                fills = await fetch_trades(self.connection, since=since, symbols=symbols)
+                if fills:
+                    since = max(since, fills[-1].timestamp)
+                changed = await self.handle_fills(fills) > 0
+                if has_futures:
+                    changed = await self.handle_positions(await load_positions(self.connection)) or changed
+            except Exception as e:
+                print(f"Polling connection {self.key} failed: {e}")
+            interval = STREAM_POLL_MIN_SECONDS if changed else min(interval * 2, STREAM_POLL_MAX_SECONDS)
+            await asyncio.sleep(interval)
+
+
+class StreamHub:
+    """Registry of connection streams shared by all subscribers in the process."""
+
+    def __init__(self, client_factory: Callable[[Dict[str, Any]], Optional[Any]] = create_stream_client):
+        self.client_factory = client_factory
+        self.db = None
+        self._streams: Dict[str, ConnectionStream] = {}
+
+    def subscribe(self, db, connection: Dict[str, Any]) -> asyncio.Queue:
+        """Register a subscriber, starting the connection's loop if needed."""
+        self.db = db
+        key = str(connection["_id"])
+        stream = self._streams.get(key)
+        if stream is None:
+            stream = self._streams[key] = ConnectionStream(self, connection)
+        if stream.linger is not None:
+            stream.linger.cancel()
+            stream.linger = None
+        if stream.task is None or stream.task.done():
+            stream.task = asyncio.create_task(stream.run())
+
+        queue: asyncio.Queue = asyncio.Queue(maxsize=STREAM_QUEUE_SIZE)
+        stream.subscribers.add(queue)
+        if stream.mode:
+            queue.put_nowait({"event": "status", "data": {"mode": stream.mode}})
+        return queue
+
+    def unsubscribe(self, connection_id: str, queue: asyncio.Queue, linger: float = STREAM_LINGER_SECONDS) -> None:
+        """Remove a subscriber; the loop stops once nobody is left for `linger` seconds."""
+        stream = self._streams.get(str(connection_id))
+        if stream is None:
+            return
+        stream.subscribers.discard(queue)
+        if not stream.subscribers and stream.linger is None:
+            if linger <= 0:
+                self._stop(stream.key)
+            else:
+                stream.linger = asyncio.get_running_loop().call_later(linger, self._stop, stream.key)
+
+    def _stop(self, key: str) -> None:
+        stream = self._streams.get(key)
+        if stream is None or stream.subscribers:
+            return
+        del self._streams[key]
+        if stream.task is not None:
+            stream.task.cancel()
+
+    async def stop(self, connection_id: str) -> None:
+        """Stop a connection's loop, e.g. after it is deleted."""
+        stream = self._streams.pop(str(connection_id), None)
+        if stream is None:
+            return
+        if stream.linger is not None:
+            stream.linger.cancel()
+        stream.publish("closed", {})
+        if stream.task is not None:
+            stream.task.cancel()
+            await asyncio.gather(stream.task, return_exceptions=True)
+
+    async def close(self) -> None:
+        await asyncio.gather(*(self.stop(key) for key in list(self._streams)))
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "streams": len(self._streams),
+            "subscribers": sum(len(s.subscribers) for s in self._streams.values()),
+            "websocket": sum(1 for s in self._streams.values() if s.mode == "websocket"),
+            "polling": sum(1 for s in self._streams.values() if s.mode == "polling"),
+        }
+
+
+stream_hub = StreamHub()
+
+
+async def sse_events(connection: Dict[str, Any], db, hub: Optional[StreamHub] = None) -> AsyncIterator[str]:
+    """Server-Sent Events for a connection, with periodic keep-alive comments."""
+    hub = hub or stream_hub
+    queue = hub.subscribe(db, connection)
+    try:
+        while True:
+            try:
+                message = await asyncio.wait_for(queue.get(), STREAM_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            yield f"event: {message['event']}\ndata: {json.dumps(message['data'])}\n\n"
+            if message["event"] == "closed":
+                return
+    finally:
+        hub.unsubscribe(connection["_id"], queue)
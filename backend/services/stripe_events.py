@@ -0,0 +1,258 @@
+"""
+Stripe Events - Webhook ingestion queue for TradeTracking.io
+The webhook route only verifies the signature and stores the event in
+`stripe_events` (keyed by Stripe's event id), then acknowledges it. Stripe
+retries and duplicate deliveries hit the same key and are dropped, so an
+event is applied at most once.
+
+A background worker applies stored events in `created` order per customer.
+Customers are processed concurrently; a lease in `stripe_event_locks` keeps
+two workers (or processes) from applying the same customer's events at once.
+Webhook latency therefore stays flat during bursts such as mass renewals.
+"""
+
+import asyncio
+import json
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from services.payment_service import apply_webhook_result, interpret_webhook_event
+
+STRIPE_EVENTS_POLL_SECONDS = float(os.getenv("STRIPE_EVENTS_POLL_SECONDS", "5"))
+STRIPE_EVENTS_CONCURRENCY = int(os.getenv("STRIPE_EVENTS_CONCURRENCY", "8"))
+STRIPE_EVENTS_MAX_ATTEMPTS = int(os.getenv("STRIPE_EVENTS_MAX_ATTEMPTS", "5"))
+STRIPE_EVENTS_LEASE_SECONDS = int(os.getenv("STRIPE_EVENTS_LEASE_SECONDS", "60"))
+STRIPE_EVENTS_BATCH_SIZE = 500
+
+# Events carrying the full subscription state: an older one arriving after a
+# newer one has been applied would roll the subscription back, so it is skipped
+SNAPSHOT_EVENTS = {
+    "customer.subscription.created",
+    "customer.subscription.updated",
+    "customer.subscription.deleted",
+}
+
+
+def event_customer(event: Dict[str, Any]) -> str:
+    """Key that orders an event: its Stripe customer, else the user it names."""
+    data = event.get("data", {}).get("object", {})
+    customer = data.get("customer")
+    if isinstance(customer, dict):
+        customer = customer.get("id")
+    return customer or (data.get("metadata") or {}).get("user_id") or event["id"]
+
+
+class StripeEventQueue:
+    """Stores webhook events and applies them in the background."""
+
+    def __init__(
+        self,
+        concurrency: int = STRIPE_EVENTS_CONCURRENCY,
+        poll_seconds: float = STRIPE_EVENTS_POLL_SECONDS,
+        max_attempts: int = STRIPE_EVENTS_MAX_ATTEMPTS,
+    ):
+        self.concurrency = concurrency
+        self.poll_seconds = poll_seconds
+        self.max_attempts = max_attempts
+        self.owner = uuid.uuid4().hex
+        self.db = None
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._stats = {
+            "received": 0,
+            "duplicates": 0,
+            "processed": 0,
+            "stale": 0,
+            "retried": 0,
+            "failed": 0,
+            "pending": 0,
+            "last_lag_seconds": 0.0,
+            "max_lag_seconds": 0.0,
+        }
+
+    # --- ingestion ---
+
+    async def ingest(self, db, event) -> bool:
+        """Store a verified event; returns False if it was already received."""
+        # StripeObject -> plain dicts for storage
+        payload = json.loads(json.dumps(event))
+        doc = {
+            "_id": payload["id"],
+            "type": payload["type"],
+            "customer": event_customer(payload),
+            "created": payload.get("created", 0),
+            "payload": payload,
+            "status": "pending",
+            "attempts": 0,
+            "received_at": datetime.utcnow(),
+        }
+        try:
+            await db["stripe_events"].insert_one(doc)
+        except DuplicateKeyError:
+            self._stats["duplicates"] += 1
+            return False
+        self._stats["received"] += 1
+        if self._wake is not None:
+            self._wake.set()
+        return True
+
+    # --- leases ---
+
+    async def _claim(self, db, customer: str) -> Optional[Dict[str, Any]]:
+        """Lease a customer's events; None if another worker holds them."""
+        now = datetime.utcnow()
+        try:
+            return await db["stripe_event_locks"].find_one_and_update(
+                {
+                    "_id": customer,
+                    "$or": [{"lease_until": None}, {"lease_until": {"$lt": now}}],
+                },
+                {"$set": {
+                    "lease_until": now + timedelta(seconds=STRIPE_EVENTS_LEASE_SECONDS),
+                    "lease_owner": self.owner,
+                }},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            # The lock exists and its lease is live
+            return None
+
+    async def _release(self, db, customer: str, applied_through: int) -> None:
+        await db["stripe_event_locks"].update_one(
+            {"_id": customer, "lease_owner": self.owner},
+            {
+                "$set": {"lease_until": None, "lease_owner": None},
+                "$max": {"applied_through": applied_through},
+            },
+        )
+
+    # --- applying events ---
+
+    async def _finish(self, db, event: Dict[str, Any], status: str) -> None:
+        now = datetime.utcnow()
+        await db["stripe_events"].update_one(
+            {"_id": event["_id"]},
+            {"$set": {"status": status, "processed_at": now}},
+        )
+        lag = (now - event["received_at"]).total_seconds()
+        self._stats["last_lag_seconds"] = lag
+        self._stats["max_lag_seconds"] = max(self._stats["max_lag_seconds"], lag)
+
+    async def _apply_customer(self, db, customer: str) -> None:
+        lock = await self._claim(db, customer)
+        if lock is None:
+            return
+        applied_through = lock.get("applied_through", 0)
+        try:
+            # Read under the lease: events listed before claiming may have
+            # been applied meanwhile by the worker that held it
+            events = await db["stripe_events"].find(
+                {"customer": customer, "status": "pending"}
+            ).sort([("created", 1), ("received_at", 1)]).to_list(length=STRIPE_EVENTS_BATCH_SIZE)
+            for event in events:
+                if event["type"] in SNAPSHOT_EVENTS and event["created"] < applied_through:
+                    self._stats["stale"] += 1
+                    await self._finish(db, event, "stale")
+                    continue
+                try:
+                    await apply_webhook_result(db, interpret_webhook_event(event["payload"]))
+                except Exception as e:
+                    attempts = event["attempts"] + 1
+                    failed = attempts >= self.max_attempts
+                    self._stats["failed" if failed else "retried"] += 1
+                    print(f"Stripe event {event['_id']} failed (attempt {attempts}): {e}")
+                    await db["stripe_events"].update_one(
+                        {"_id": event["_id"]},
+                        {"$set": {
+                            "attempts": attempts,
+                            "last_error": str(e),
+                            "status": "failed" if failed else "pending",
+                        }},
+                    )
+                    if not failed:
+                        # Later events wait so the customer's order is kept
+                        break
+                    continue
+                self._stats["processed"] += 1
+                await self._finish(db, event, "processed")
+                if event["type"] in SNAPSHOT_EVENTS:
+                    # Only a full subscription snapshot supersedes older ones;
+                    # an invoice or checkout event must not mark them stale
+                    applied_through = max(applied_through, event["created"])
+        finally:
+            await self._release(db, customer, applied_through)
+
+    async def run_once(self, db) -> int:
+        """Apply pending events; returns how many were pending."""
+        cursor = db["stripe_events"].find({"status": "pending"}).sort(
+            [("created", 1), ("received_at", 1)]
+        )
+        events = await cursor.to_list(length=STRIPE_EVENTS_BATCH_SIZE)
+        self._stats["pending"] = len(events)
+        customers = {event["customer"] for event in events}
+
+        slots = asyncio.Semaphore(self.concurrency)
+
+        async def apply(customer: str) -> None:
+            async with slots:
+                await self._apply_customer(db, customer)
+
+        await asyncio.gather(*(apply(c) for c in customers))
+        return len(events)
+
+    # --- background worker ---
+
+    async def _run(self) -> None:
+        while True:
+            self._wake.clear()
+            try:
+                pending = await self.run_once(self.db)
+            except Exception as e:
+                print(f"Stripe event worker failed: {e}")
+                pending = 0
+            if pending >= STRIPE_EVENTS_BATCH_SIZE:
+                continue
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self, db) -> None:
+        """Start applying stored events in the background."""
+        if self._task is not None:
+            return
+        self.db = db
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        self._wake = None
+
+    def metrics(self) -> Dict[str, Any]:
+        """Ingestion and processing counters plus receive-to-apply lag."""
+        return {
+            "enabled": self._task is not None,
+            "pending": self._stats["pending"],
+            "received_total": self._stats["received"],
+            "duplicates_total": self._stats["duplicates"],
+            "processed_total": self._stats["processed"],
+            "stale_total": self._stats["stale"],
+            "retried_total": self._stats["retried"],
+            "failed_total": self._stats["failed"],
+            "last_lag_seconds": round(self._stats["last_lag_seconds"], 3),
+            "max_lag_seconds": round(self._stats["max_lag_seconds"], 3),
+        }
+
+
+stripe_events = StripeEventQueue()
@@ -0,0 +1,250 @@
+"""
+Sync Pipeline - Shared trade sync for exchanges and brokers in TradeTracking.io
+Every venue (CCXT exchanges, direct stock brokers) is a sync adapter: an
+async generator that yields pages of normalized fills. The pipeline drains
+the adapter through a bounded queue (so a fast venue cannot run ahead of the
+database), writes fills in deduplicated bulk upserts, and only then applies
+each page's checkpoint (watermark update). Memory stays bounded by the queue
+and batch size however long the history is.
+
+Adding a venue means registering a fetch generator:
+
+    @register_adapter("etrade")
+    async def etrade_fills(ctx: SyncContext) -> AsyncIterator[FillPage]:
+        ...
+        yield FillPage(fills=[fill_document(ctx, ...)], checkpoint=...)
+"""
+
+import asyncio
+import os
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from services.trade_store import bulk_upsert_trades
+
+# Fills written per bulk upsert (a partial batch is written whenever the
+# writer has caught up with the venue)
+SYNC_PIPELINE_BATCH_SIZE = int(os.getenv("SYNC_PIPELINE_BATCH_SIZE", "1000"))
+
+# Pages fetched ahead of the writer before fetching pauses
+SYNC_PIPELINE_QUEUE_PAGES = int(os.getenv("SYNC_PIPELINE_QUEUE_PAGES", "8"))
+
+
+@dataclass
+class SyncContext:
+    """One sync run: who and what is being synced, plus its running totals."""
+    source: str
+    user_id: str
+    db: Any
+    connection: Optional[Dict[str, Any]] = None  # saved connection document
+    credentials: Dict[str, str] = field(default_factory=dict)
+    failed: List[Dict[str, Any]] = field(default_factory=list)
+    # Conditions that left the synced history incomplete (e.g. a gap the
+    # venue no longer serves), reported with the sync result
+    warnings: List[Dict[str, Any]] = field(default_factory=list)
+    stats: Dict[str, int] = field(
+        default_factory=lambda: {"pages": 0, "fetched": 0, "inserted": 0, "skipped": 0}
+    )
+
+
+@dataclass
+class FillPage:
+    """A page of fills from one venue request.
+
+    `checkpoint` is (collection, filter, update), applied once the page's
+    fills are stored, e.g. a `$max` on a sync watermark.
+    """
+    fills: List[Dict[str, Any]]
+    checkpoint: Optional[Tuple[str, Dict[str, Any], Dict[str, Any]]] = None
+
+
+SyncAdapter = Callable[[SyncContext], AsyncIterator[FillPage]]
+
+_adapters: Dict[str, SyncAdapter] = {}
+
+
+def register_adapter(*sources: str) -> Callable[[SyncAdapter], SyncAdapter]:
+    """Register a fill generator for one or more sources."""
+    def decorator(adapter: SyncAdapter) -> SyncAdapter:
+        for source in sources:
+            _adapters[source] = adapter
+        return adapter
+    return decorator
+
+
+def get_adapter(source: str) -> Optional[SyncAdapter]:
+    return _adapters.get(source)
+
+
+def fill_document(
+    ctx: SyncContext,
+    external_id: str,
+    symbol: str,
+    side: str,
+    quantity: float,
+    price: float,
+    timestamp: datetime,
+    fee: Optional[float] = None,
+    fee_currency: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Trade document for a synced fill."""
+    return {
+        "user_id": ctx.user_id,
+        "source": ctx.source,
+        "external_id": external_id,
+        "symbol": symbol,
+        "side": side,
+        "quantity": quantity,
+        "entry_price": price,
+        "entry_time": timestamp,
+        "fee": fee,
+        "fee_currency": fee_currency,
+        "pnl": None,  # Will be calculated by matching engine
+        "status": "CLOSED",
+        "synced_at": datetime.utcnow(),
+    }
+
+
+async def merge_pages(
+    sources: Dict[str, Callable[[], AsyncIterator[FillPage]]],
+    concurrency: int,
+    on_error: Callable[[str, Exception], None],
+) -> AsyncIterator[FillPage]:
+    """Interleave pages from several generators, running up to `concurrency`.
+
+    Used for venues fetched per symbol or per account. A generator that
+    raises is reported to `on_error` and the others carry on.
+    """
+    if not sources:
+        return
+    queue: asyncio.Queue = asyncio.Queue(maxsize=max(concurrency, 1))
+    pending = iter(sources.items())
+    done = object()
+
+    async def drain() -> None:
+        for key, make_pages in pending:
+            try:
+                async for page in make_pages():
+                    await queue.put(page)
+            except Exception as e:
+                on_error(key, e)
+        await queue.put(done)
+
+    workers = [asyncio.create_task(drain()) for _ in range(min(concurrency, len(sources)))]
+    finished = 0
+    try:
+        while finished < len(workers):
+            page = await queue.get()
+            if page is done:
+                finished += 1
+            else:
+                yield page
+    finally:
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+
+def _merge_updates(target: Dict[str, Any], update: Dict[str, Any]) -> None:
+    for op, fields in update.items():
+        merged = target.setdefault(op, {})
+        for name, value in fields.items():
+            if op == "$max" and name in merged:
+                merged[name] = max(merged[name], value)
+            elif op == "$min" and name in merged:
+                merged[name] = min(merged[name], value)
+            else:
+                merged[name] = value
+
+
+class _Writer:
+    """Buffers fills and checkpoints; checkpoints are applied after their fills."""
+
+    def __init__(self, ctx: SyncContext, batch_size: int):
+        self.ctx = ctx
+        self.batch_size = batch_size
+        self.fills: Dict[str, Dict[str, Any]] = {}
+        self.checkpoints: Dict[Tuple[str, str], Tuple[Dict[str, Any], Dict[str, Any]]] = {}
+
+    def add(self, page: FillPage) -> None:
+        stats = self.ctx.stats
+        stats["pages"] += 1
+        stats["fetched"] += len(page.fills)
+        for doc in page.fills:
+            if doc["external_id"] in self.fills:
+                # Overlapping pages (e.g. a re-read boundary) repeat fills
+                stats["skipped"] += 1
+            else:
+                self.fills[doc["external_id"]] = doc
+        if page.checkpoint:
+            collection, selector, update = page.checkpoint
+            key = (collection, repr(sorted(selector.items())))
+            if key not in self.checkpoints:
+                self.checkpoints[key] = (selector, {})
+            _merge_updates(self.checkpoints[key][1], update)
+
+    @property
+    def full(self) -> bool:
+        return len(self.fills) >= self.batch_size
+
+    async def flush(self) -> None:
+        if self.fills:
+            written = await bulk_upsert_trades(self.ctx.db, list(self.fills.values()))
+            self.ctx.stats["inserted"] += written["inserted"]
+            self.ctx.stats["skipped"] += written["skipped"]
+            self.fills = {}
+        for (collection, _), (selector, update) in self.checkpoints.items():
+            await self.ctx.db[collection].update_one(selector, update)
+        self.checkpoints = {}
+
+
+async def run_pipeline(
+    ctx: SyncContext,
+    pages: Optional[AsyncIterator[FillPage]] = None,
+    batch_size: int = SYNC_PIPELINE_BATCH_SIZE,
+    queue_pages: int = SYNC_PIPELINE_QUEUE_PAGES,
+) -> Dict[str, int]:
+    """Drain a venue's fills into the database; returns ctx.stats.
+
+    `pages` defaults to the adapter registered for ctx.source. If the adapter
+    fails, everything fetched before the failure is still written (with its
+    checkpoints) before the error is raised.
+    """
+    if pages is None:
+        adapter = get_adapter(ctx.source)
+        if adapter is None:
+            raise ValueError(f"No sync adapter for {ctx.source}")
+        pages = adapter(ctx)
+
+    queue: asyncio.Queue = asyncio.Queue(maxsize=queue_pages)
+
+    async def produce() -> None:
+        try:
+            async for page in pages:
+                await queue.put(page)
+        except Exception as e:
+            await queue.put(e)
+        else:
+            await queue.put(None)
+        finally:
+            await pages.aclose()
+
+    producer = asyncio.create_task(produce())
+    writer = _Writer(ctx, batch_size)
+    try:
+        while True:
+            page = await queue.get()
+            if page is None or isinstance(page, Exception):
+                await writer.flush()
+                if page is not None:
+                    raise page
+                break
+            writer.add(page)
+            if writer.full or queue.empty():
+                await writer.flush()
+    finally:
+        if not producer.done():
+            producer.cancel()
+            await asyncio.gather(producer, return_exceptions=True)
+    return ctx.stats
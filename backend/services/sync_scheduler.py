@@ -0,0 +1,297 @@
+"""
+Sync Scheduler - Background exchange syncs for TradeTracking.io
+Periodically syncs every active exchange connection on a jittered interval
+chosen by the owner's subscription tier. Syncs are bounded by a global worker
+cap plus per-exchange concurrency and start-rate budgets.
+
+Manual syncs (POST /api/v1/exchanges/{id}/sync) go through the same
+scheduler, so a connection is never synced twice at once: in-process callers
+share the running sync, and a lease on the connection document keeps other
+worker processes from starting a second one.
+"""
+
+import asyncio
+import os
+import random
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import ReturnDocument
+
+from services.exchange_service import sync_trades_to_db
+from services.rate_limiter import TokenBucket
+
+SYNC_SCHEDULER_ENABLED = os.getenv("SYNC_SCHEDULER_ENABLED", "true").lower() == "true"
+SYNC_POLL_SECONDS = float(os.getenv("SYNC_POLL_SECONDS", "30"))
+SYNC_MAX_WORKERS = int(os.getenv("SYNC_MAX_WORKERS", "8"))
+SYNC_EXCHANGE_CONCURRENCY = int(os.getenv("SYNC_EXCHANGE_CONCURRENCY", "2"))
+SYNC_EXCHANGE_STARTS_PER_MINUTE = float(os.getenv("SYNC_EXCHANGE_STARTS_PER_MINUTE", "30"))
+SYNC_LEASE_SECONDS = int(os.getenv("SYNC_LEASE_SECONDS", "900"))
+SYNC_JITTER = 0.2
+
+# Minutes between background syncs per subscription tier
+SYNC_INTERVALS = {
+    "starter": 360,
+    "pro": 30,
+    "elite": 10,
+}
+
+
+def next_sync_delay(tier: str) -> timedelta:
+    """Jittered delay until a connection's next background sync."""
+    minutes = SYNC_INTERVALS.get(tier, SYNC_INTERVALS["starter"])
+    return timedelta(minutes=minutes * random.uniform(1 - SYNC_JITTER, 1 + SYNC_JITTER))
+
+
+class SyncScheduler:
+    """Claims due connections, queues them and runs syncs on a worker pool."""
+
+    def __init__(
+        self,
+        max_workers: int = SYNC_MAX_WORKERS,
+        exchange_concurrency: int = SYNC_EXCHANGE_CONCURRENCY,
+        exchange_starts_per_minute: float = SYNC_EXCHANGE_STARTS_PER_MINUTE,
+        poll_seconds: float = SYNC_POLL_SECONDS,
+    ):
+        self.max_workers = max_workers
+        self.exchange_concurrency = exchange_concurrency
+        self.exchange_starts_per_minute = exchange_starts_per_minute
+        self.poll_seconds = poll_seconds
+        self.owner = uuid.uuid4().hex
+        self.db = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # Connections leased by this process and waiting in the queue; each
+        # future resolves with the sync result once a worker has run it
+        self._queued: Dict[str, asyncio.Future] = {}
+        self._exchange_slots: Dict[str, asyncio.Semaphore] = {}
+        self._exchange_budgets: Dict[str, TokenBucket] = {}
+        self._workers: Optional[asyncio.Semaphore] = None
+        self._stats = {
+            "completed": 0,
+            "failed": 0,
+            "deduplicated": 0,
+            "last_lag_seconds": 0.0,
+            "max_lag_seconds": 0.0,
+            "due": 0,
+            "oldest_due_seconds": 0.0,
+        }
+
+    # --- limits ---
+
+    def _worker_slots(self) -> asyncio.Semaphore:
+        if self._workers is None:
+            self._workers = asyncio.Semaphore(self.max_workers)
+        return self._workers
+
+    def _exchange_limits(self, exchange_id: str) -> Tuple[asyncio.Semaphore, TokenBucket]:
+        if exchange_id not in self._exchange_slots:
+            self._exchange_slots[exchange_id] = asyncio.Semaphore(self.exchange_concurrency)
+            self._exchange_budgets[exchange_id] = TokenBucket(
+                rate=self.exchange_starts_per_minute / 60.0,
+                capacity=self.exchange_concurrency,
+            )
+        return self._exchange_slots[exchange_id], self._exchange_budgets[exchange_id]
+
+    # --- leases ---
+
+    async def _claim(self, db, connection_id) -> Optional[Dict[str, Any]]:
+        """Lease a connection so no other process syncs it concurrently."""
+        now = datetime.utcnow()
+        return await db["exchange_connections"].find_one_and_update(
+            {
+                "_id": connection_id,
+                "$or": [{"sync_lease_until": None}, {"sync_lease_until": {"$lt": now}}],
+            },
+            {"$set": {
+                "sync_lease_until": now + timedelta(seconds=SYNC_LEASE_SECONDS),
+                "sync_lease_owner": self.owner,
+            }},
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _release(self, db, connection: Dict[str, Any], tier: str, succeeded: bool) -> None:
+        now = datetime.utcnow()
+        update = {
+            "sync_lease_until": None,
+            "sync_lease_owner": None,
+            "next_sync_at": now + next_sync_delay(tier),
+        }
+        if succeeded:
+            update["last_sync"] = now
+        await db["exchange_connections"].update_one(
+            {"_id": connection["_id"], "sync_lease_owner": self.owner},
+            {"$set": update},
+        )
+
+    async def _tier_for(self, db, user_id: str) -> str:
+        from bson import ObjectId
+
+        if not ObjectId.is_valid(user_id):
+            return "starter"
+        user = await db["users"].find_one({"_id": ObjectId(user_id)}, {"subscription_tier": 1})
+        return (user or {}).get("subscription_tier", "starter")
+
+    # --- running syncs ---
+
+    async def _execute(self, db, connection: Dict[str, Any], tier: str, due_at: Optional[datetime]) -> Dict[str, Any]:
+        slots, budget = self._exchange_limits(connection["exchange"])
+        result: Dict[str, Any] = {"success": False, "exchange": connection["exchange"]}
+        try:
+            async with self._worker_slots(), slots:
+                await budget.acquire()
+                if due_at is not None:
+                    lag = max((datetime.utcnow() - due_at).total_seconds(), 0.0)
+                    self._stats["last_lag_seconds"] = lag
+                    self._stats["max_lag_seconds"] = max(self._stats["max_lag_seconds"], lag)
+                result = await sync_trades_to_db(connection, db)
+            return result
+        except Exception as e:
+            result["error"] = str(e)
+            return result
+        finally:
+            self._stats["completed" if result.get("success") else "failed"] += 1
+            await self._release(db, connection, tier, bool(result.get("success")))
+
+    def _run_once(self, db, connection: Dict[str, Any], tier: str, due_at: Optional[datetime]) -> asyncio.Future:
+        key = str(connection["_id"])
+        future = asyncio.ensure_future(self._execute(db, connection, tier, due_at))
+        self._inflight[key] = future
+        future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return future
+
+    def _pending(self, key: str) -> Optional[asyncio.Future]:
+        """Result of a sync this process is running or has queued for a connection."""
+        return self._inflight.get(key) or self._queued.get(key)
+
+    async def sync_now(self, db, connection: Dict[str, Any]) -> Dict[str, Any]:
+        """Sync a connection immediately, joining a sync already running or
+        queued for it in this process."""
+        key = str(connection["_id"])
+        pending = self._pending(key)
+        if pending is not None:
+            self._stats["deduplicated"] += 1
+            return await asyncio.shield(pending)
+
+        claimed = await self._claim(db, connection["_id"])
+        if claimed is None:
+            # The background loop may have leased it while we were claiming
+            pending = self._pending(key)
+            if pending is not None:
+                self._stats["deduplicated"] += 1
+                return await asyncio.shield(pending)
+            # Another worker process holds the lease
+            self._stats["deduplicated"] += 1
+            return {
+                "success": True,
+                "exchange": connection["exchange"],
+                "status": "in_progress",
+                "synced_trades": 0,
+            }
+
+        tier = await self._tier_for(db, claimed["user_id"])
+        return await asyncio.shield(self._run_once(db, claimed, tier, None))
+
+    # --- background loop ---
+
+    async def _enqueue_due(self, db) -> int:
+        """Claim due connections up to the free queue capacity."""
+        now = datetime.utcnow()
+        capacity = self.max_workers * 2 - self._queue.qsize()
+        if capacity <= 0:
+            return 0
+
+        due_query = {
+            "status": "active",
+            "$or": [{"next_sync_at": None}, {"next_sync_at": {"$lte": now}}],
+        }
+        due = await db["exchange_connections"].find(
+            due_query, {"_id": 1, "next_sync_at": 1}
+        ).sort("next_sync_at", 1).to_list(capacity)
+
+        self._stats["due"] = await db["exchange_connections"].count_documents(due_query)
+        oldest = next((c["next_sync_at"] for c in due if c.get("next_sync_at")), None)
+        self._stats["oldest_due_seconds"] = (now - oldest).total_seconds() if oldest else 0.0
+
+        queued = 0
+        for candidate in due:
+            key = str(candidate["_id"])
+            if self._pending(key) is not None:
+                continue
+            connection = await self._claim(db, candidate["_id"])
+            if connection is None:
+                continue
+            self._queued[key] = asyncio.get_running_loop().create_future()
+            await self._queue.put((connection, candidate.get("next_sync_at") or now))
+            queued += 1
+        return queued
+
+    async def _poll(self) -> None:
+        while True:
+            try:
+                await self._enqueue_due(self.db)
+            except Exception as e:
+                print(f"Sync scheduler poll failed: {e}")
+            await asyncio.sleep(self.poll_seconds)
+
+    async def _worker(self) -> None:
+        while True:
+            connection, due_at = await self._queue.get()
+            key = str(connection["_id"])
+            result: Dict[str, Any] = {"success": False, "exchange": connection["exchange"]}
+            try:
+                tier = await self._tier_for(self.db, connection["user_id"])
+                result = await self._run_once(self.db, connection, tier, due_at)
+            except Exception as e:
+                result["error"] = str(e)
+                print(f"Background sync failed for {connection.get('_id')}: {e}")
+            finally:
+                waiting = self._queued.pop(key, None)
+                if waiting is not None and not waiting.done():
+                    waiting.set_result(result)
+                self._queue.task_done()
+
+    def start(self, db) -> None:
+        """Start polling for due connections and the worker tasks."""
+        if self._tasks:
+            return
+        self.db = db
+        self._queue = asyncio.Queue()
+        self._tasks.append(asyncio.create_task(self._poll()))
+        for _ in range(self.max_workers):
+            self._tasks.append(asyncio.create_task(self._worker()))
+
+    async def stop(self) -> None:
+        """Stop background work and wait for running syncs to release their leases."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Queued syncs that never started: their leases expire on their own
+        for waiting in self._queued.values():
+            if not waiting.done():
+                waiting.set_result({"success": False, "status": "queued", "error": "Sync scheduler stopped"})
+        self._queued.clear()
+        if self._inflight:
+            await asyncio.gather(*self._inflight.values(), return_exceptions=True)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Queue depth, in-flight syncs, lag and outcome counters."""
+        return {
+            "enabled": bool(self._tasks),
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "running": len(self._inflight),
+            "due_connections": self._stats["due"],
+            "oldest_due_seconds": round(self._stats["oldest_due_seconds"], 3),
+            "last_lag_seconds": round(self._stats["last_lag_seconds"], 3),
+            "max_lag_seconds": round(self._stats["max_lag_seconds"], 3),
+            "completed_total": self._stats["completed"],
+            "failed_total": self._stats["failed"],
+            "deduplicated_total": self._stats["deduplicated"],
+            "max_workers": self.max_workers,
+        }
+
+
+sync_scheduler = SyncScheduler()
@@ -0,0 +1,51 @@
+"""
+Trade Store - Bulk writes of synced trades for TradeTracking.io
+Synced trades are deduplicated by the unique (user_id, source, external_id)
+index: each page is written as one unordered bulk of upserts that only set
+fields on insert, so already-stored trades are skipped server-side.
+"""
+
+from typing import Any, Dict, List
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from database import note_user_write
+
+DUPLICATE_KEY_ERROR = 11000
+
+
+async def bulk_upsert_trades(db, trade_docs: List[Dict[str, Any]]) -> Dict[str, int]:
+    """Insert trades that are not stored yet.
+
+    Each document must carry user_id, source and external_id. Returns the
+    number of inserted and skipped (already stored) trades.
+    """
+    if not trade_docs:
+        return {"inserted": 0, "skipped": 0}
+
+    operations = [
+        UpdateOne(
+            {"user_id": doc["user_id"], "source": doc["source"], "external_id": doc["external_id"]},
+            {"$setOnInsert": doc},
+            upsert=True
+        )
+        for doc in trade_docs
+    ]
+
+    try:
+        result = await db["trades"].bulk_write(operations, ordered=False)
+        inserted = result.upserted_count
+    except BulkWriteError as e:
+        # Concurrent syncs of the same trade race on the unique index; the
+        # loser's upsert fails with a duplicate key, which means "skipped".
+        errors = e.details.get("writeErrors", [])
+        if any(err.get("code") != DUPLICATE_KEY_ERROR for err in errors):
+            raise
+        inserted = e.details.get("nUpserted", 0)
+
+    if inserted:
+        for user_id in {doc["user_id"] for doc in trade_docs}:
+            note_user_write(user_id)
+
+    return {"inserted": inserted, "skipped": len(trade_docs) - inserted}
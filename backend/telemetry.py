@@ -0,0 +1,229 @@
+"""
+HTTP and event-loop telemetry for TradeTracking.io, exposed at GET /metrics.
+
+RequestMetricsMiddleware records latency and status per route template plus
+requests in flight; LoopLagMonitor measures how late the event loop wakes
+up. render_metrics() combines them with executor, MongoDB, cache and
+background-service numbers in Prometheus text format. Recording is a
+perf_counter call and a bucket increment per request, so it stays on in
+production.
+"""
+
+import asyncio
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import motor.frameworks.asyncio as motor_asyncio
+
+from metrics import CounterFamily, HistogramFamily, PrometheusText, route_path
+from mongo_monitor import mongo_monitor, pool_monitor
+from services import payment_service
+from services.exchange_service import balance_cache, position_cache
+from services.market_data import ticker_cache
+from services.request_limits import request_limiter
+from services.stream_service import stream_hub
+from services.stripe_events import stripe_events
+from services.sync_scheduler import sync_scheduler
+
+# Seconds between event-loop lag probes
+LOOP_LAG_INTERVAL_SECONDS = float(os.getenv("LOOP_LAG_INTERVAL_SECONDS", "0.5"))
+
+# Event-loop lag buckets in milliseconds
+LOOP_LAG_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.duration = HistogramFamily(("method", "route"))
+        self.responses = CounterFamily(("method", "route", "status"))
+        self.in_flight = 0
+
+
+request_metrics = RequestMetrics()
+
+
+class RequestMetricsMiddleware:
+    """ASGI middleware timing every HTTP request by route template and status."""
+
+    def __init__(self, app, metrics: Optional[RequestMetrics] = None):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        metrics = self.metrics if self.metrics is not None else request_metrics
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        metrics.in_flight += 1
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            metrics.in_flight -= 1
+            route = route_path(scope)
+            metrics.duration.observe((time.perf_counter() - started) * 1000, scope["method"], route)
+            metrics.responses.inc(scope["method"], route, str(status_code))
+
+
+class LoopLagMonitor:
+    """Sleeps for a fixed interval and records how late it wakes up."""
+
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL_SECONDS):
+        self.interval = interval
+        self.lag = HistogramFamily((), LOOP_LAG_BUCKETS_MS)
+        self.last_ms = 0.0
+        self.max_ms = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag_ms = max(0.0, loop.time() - started - self.interval) * 1000
+            self.lag.observe(lag_ms)
+            self.last_ms = lag_ms
+            self.max_ms = max(self.max_ms, lag_ms)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+loop_lag = LoopLagMonitor()
+
+
+def executor_stats() -> Dict[str, Tuple[int, int, int]]:
+    """(queued work items, threads, max threads) per thread pool.
+
+    "default" runs loop.run_in_executor(None, ...) work such as CCXT and
+    bcrypt calls; "motor" runs MongoDB operations; "stripe" runs Stripe SDK
+    calls. Pools that have not been created yet are left out.
+    """
+    pools = {
+        "default": getattr(asyncio.get_running_loop(), "_default_executor", None),
+        "motor": getattr(motor_asyncio, "_EXECUTOR", None),
+        "stripe": payment_service._executor,
+    }
+    return {
+        name: (pool._work_queue.qsize(), len(pool._threads), pool._max_workers)
+        for name, pool in pools.items()
+        if pool is not None
+    }
+
+
+def _cache_stats() -> List[Dict[str, Any]]:
+    caches = [balance_cache.stats(), position_cache.stats(), request_limiter.tiers.stats()]
+    caches.append({"name": "tickers", **ticker_cache.stats()})
+    return caches
+
+
+def render_metrics() -> str:
+    """Everything in Prometheus text format."""
+    out = PrometheusText()
+
+    # HTTP
+    out.gauge("http_requests_in_flight", "HTTP requests being handled.", [({}, request_metrics.in_flight)])
+    out.histogram(
+        "http_request_duration_seconds", "HTTP request latency by route template.",
+        request_metrics.duration, scale=0.001,
+    )
+    out.counter(
+        "http_responses_total", "HTTP responses by route template and status code.",
+        [(dict(zip(request_metrics.responses.labels, labels)), n) for labels, n in request_metrics.responses.items()],
+    )
+
+    # Event loop and thread pools
+    out.histogram("event_loop_lag_seconds", "How late the event loop ran a timer.", loop_lag.lag, scale=0.001)
+    out.gauge("event_loop_lag_max_seconds", "Largest event-loop lag seen.", [({}, loop_lag.max_ms / 1000)])
+    pools = executor_stats()
+    out.gauge("executor_queue_depth", "Work items waiting for a thread.",
+              [({"executor": name}, queued) for name, (queued, _, _) in pools.items()])
+    out.gauge("executor_threads", "Threads started by the pool.",
+              [({"executor": name}, threads) for name, (_, threads, _) in pools.items()])
+    out.gauge("executor_max_threads", "Thread limit of the pool.",
+              [({"executor": name}, limit) for name, (_, _, limit) in pools.items()])
+
+    # MongoDB
+    out.histogram(
+        "mongodb_command_duration_seconds", "MongoDB command latency by command and collection.",
+        mongo_monitor.commands, scale=0.001,
+    )
+    out.counter(
+        "mongodb_command_failures_total", "Failed MongoDB commands.",
+        [({"command": c, "collection": coll}, n) for (c, coll), n in mongo_monitor.failures.items()],
+    )
+    out.counter("mongodb_slow_commands_total", "MongoDB commands over the slow threshold.",
+                [({}, mongo_monitor.slow_commands)])
+    out.histogram("mongodb_request_round_trips", "MongoDB commands per HTTP request.", mongo_monitor.round_trips)
+    pool = pool_monitor.metrics()
+    out.gauge("mongodb_pool_max_size", "Connection pool size limit per server.", [({}, pool["max_pool_size"])])
+    out.gauge("mongodb_pool_connections", "Open pooled connections.",
+              [({"address": a}, n) for a, n in pool["open"].items()])
+    out.gauge("mongodb_pool_checked_out", "Connections currently in use.",
+              [({"address": a}, n) for a, n in pool["checked_out"].items()])
+    out.histogram("mongodb_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection.",
+                  pool_monitor.checkout_wait, scale=0.001)
+
+    # Caches
+    caches = _cache_stats()
+    out.counter("cache_hits_total", "Cache lookups served from cache (fresh or stale).",
+                [({"cache": c["name"]}, c["hits"] + c.get("stale_hits", 0)) for c in caches])
+    out.counter("cache_misses_total", "Cache lookups that loaded the value.",
+                [({"cache": c["name"]}, c["misses"]) for c in caches])
+    out.gauge("cache_hit_ratio", "Share of lookups served from cache.",
+              [({"cache": c["name"]}, c["hit_rate"]) for c in caches])
+    out.gauge("cache_entries", "Entries held by the cache.", [({"cache": c["name"]}, c["entries"]) for c in caches])
+
+    # Background work
+    sync = sync_scheduler.metrics()
+    out.gauge("sync_queue_depth", "Exchange syncs waiting for a worker.", [({}, sync["queue_depth"])])
+    out.gauge("sync_running", "Exchange syncs in progress.", [({}, sync["running"])])
+    out.gauge("sync_lag_seconds", "Delay of the last background sync past its due time.",
+              [({}, sync["last_lag_seconds"])])
+    out.gauge("sync_due_connections", "Active connections due for a sync.", [({}, sync["due_connections"])])
+    out.gauge("sync_oldest_due_seconds", "How long the longest-waiting due connection has waited.",
+              [({}, sync["oldest_due_seconds"])])
+    out.counter("sync_runs_total", "Finished exchange syncs.", [
+        ({"outcome": "completed"}, sync["completed_total"]),
+        ({"outcome": "failed"}, sync["failed_total"]),
+        ({"outcome": "deduplicated"}, sync["deduplicated_total"]),
+    ])
+    streams = stream_hub.metrics()
+    out.gauge("stream_connections", "Live exchange streams.", [({}, streams["streams"])])
+    out.gauge("stream_subscribers", "Clients subscribed to live streams.", [({}, streams["subscribers"])])
+    events = stripe_events.metrics()
+    out.gauge("stripe_events_pending", "Stripe webhook events waiting to be applied.", [({}, events["pending"])])
+    out.counter("stripe_events_total", "Stripe webhook events by outcome.", [
+        ({"outcome": outcome}, events[f"{outcome}_total"])
+        for outcome in ("received", "duplicates", "processed", "stale", "retried", "failed")
+    ])
+    limiter = request_limiter.metrics()
+    limits = limiter["routes"]
+    out.counter("rate_limit_requests_total", "Rate limiter decisions by route class.", [
+        ({"route_class": name, "outcome": outcome}, counters[outcome])
+        for name, counters in limits.items()
+        for outcome in ("allowed", "limited_rate", "limited_concurrency", "limited_shared")
+    ])
+    out.gauge("rate_limit_active_requests", "Admitted requests in progress by route class.",
+              [({"route_class": name}, counters["active"]) for name, counters in limits.items()])
+    out.gauge("rate_limit_tracked_buckets", "Per-user token buckets held in memory.",
+              [({}, limiter["tracked_buckets"])])
+
+    return out.render()
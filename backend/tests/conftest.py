@@ -70,6 +70,10 @@ async def mock_db_connection(mock_mongo_client):
     for col in cols:
         await db.db[col].drop()
 
+    # Rate limit buckets are per username, and every test is "testuser"
+    from services.request_limits import request_limiter
+    request_limiter.clear()
+
 @pytest.fixture
 async def client(mock_db_connection):
     # The app startup will call our mocked connect_to_mongo
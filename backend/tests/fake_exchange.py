@@ -0,0 +1,246 @@
+"""
+Fake exchange - a CCXT-compatible stand-in for tests and benchmarks.
+
+Serves synthetic or recorded fills, balances, positions and tickers through
+the async CCXT methods the services call, with configurable per-call latency
+and an enforced request budget, and counts every call. Install it in place of
+real clients with `install_fake_exchange`.
+"""
+
+import asyncio
+import bisect
+import json
+import random
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+import ccxt.async_support as ccxt
+
+DAY_MS = 24 * 3600 * 1000
+
+
+def synthetic_fills(
+    count: int,
+    symbols: List[str],
+    start_ms: Optional[int] = None,
+    span_ms: int = 300 * DAY_MS,
+    seed: int = 7,
+) -> List[Dict[str, Any]]:
+    """Deterministic CCXT-shaped fills spread evenly over `span_ms`."""
+    rng = random.Random(seed)
+    if start_ms is None:
+        start_ms = int(time.time() * 1000) - span_ms - DAY_MS
+    step = max(span_ms // max(count, 1), 1)
+    fills = []
+    for i in range(count):
+        symbol = symbols[i % len(symbols)]
+        price = round(rng.uniform(10, 50000), 2)
+        amount = round(rng.uniform(0.001, 2), 6)
+        fills.append({
+            "id": f"f{i}",
+            "symbol": symbol,
+            "side": "buy" if rng.random() < 0.5 else "sell",
+            "price": price,
+            "amount": amount,
+            "cost": round(price * amount, 8),
+            "timestamp": start_ms + i * step,
+            "fee": {"cost": round(price * amount * 0.001, 8), "currency": symbol.split("/")[1]},
+        })
+    return fills
+
+
+class FakeExchange:
+    """Async CCXT look-alike backed by in-memory fills.
+
+    - `latency`: seconds slept per API call.
+    - `rate_limit_ms`: advertised as `rateLimit`; with `enforce_rate_limit`,
+      calls arriving faster than that budget (plus `burst`) raise
+      `ccxt.RateLimitExceeded` like a venue answering HTTP 429.
+    - `all_symbols`: whether `fetch_my_trades` accepts `symbol=None`.
+    """
+
+    def __init__(
+        self,
+        exchange_id: str = "binance",
+        fills: Optional[List[Dict[str, Any]]] = None,
+        balances: Optional[Dict[str, float]] = None,
+        positions: Optional[List[Dict[str, Any]]] = None,
+        latency: float = 0.0,
+        rate_limit_ms: float = 1,
+        enforce_rate_limit: bool = False,
+        burst: int = 10,
+        all_symbols: bool = False,
+    ):
+        self.id = exchange_id
+        self.rateLimit = rate_limit_ms
+        self.latency = latency
+        self.enforce_rate_limit = enforce_rate_limit
+        self.burst = burst
+        self.all_symbols = all_symbols
+        self.has = {
+            "fetchMyTrades": True,
+            "fetchTickers": True,
+            "fetchPositions": positions is not None,
+        }
+        self.calls: Counter = Counter()
+        self.rate_limited = 0
+        self.closed = False
+        self._tokens = float(burst)
+        self._refilled = time.monotonic()
+
+        self.set_fills(fills or [])
+        self.balances = balances if balances is not None else {
+            s.split("/")[0]: 1.0 for s in self.by_symbol
+        }
+        self.positions = positions or []
+        self.markets = {
+            symbol: {
+                "id": symbol.replace("/", ""), "symbol": symbol, "spot": True,
+                "base": symbol.split("/")[0], "quote": symbol.split("/")[1],
+            }
+            for symbol in sorted(set(self.by_symbol) | {f"{c}/USDT" for c in self.balances if c != "USDT"})
+        }
+        self.markets_by_id = {m["id"]: [m] for m in self.markets.values()}
+        self.currencies: Dict[str, Any] = {}
+
+    @classmethod
+    def from_recording(cls, path: str, **kwargs) -> "FakeExchange":
+        """Replay a JSON recording: {"fills": [...], "balances": {...}, "positions": [...]}."""
+        with open(path) as f:
+            recording = json.load(f)
+        return cls(
+            fills=recording.get("fills", []),
+            balances=recording.get("balances"),
+            positions=recording.get("positions"),
+            **kwargs,
+        )
+
+    def set_fills(self, fills: List[Dict[str, Any]]) -> None:
+        self.fills = sorted(fills, key=lambda f: f["timestamp"])
+        self.timestamps = [f["timestamp"] for f in self.fills]
+        self.by_symbol: Dict[str, List[Dict[str, Any]]] = {}
+        for fill in self.fills:
+            self.by_symbol.setdefault(fill["symbol"], []).append(fill)
+        self.symbol_timestamps = {
+            s: [f["timestamp"] for f in rows] for s, rows in self.by_symbol.items()
+        }
+
+    async def _call(self, method: str) -> None:
+        self.calls[method] += 1
+        if self.enforce_rate_limit:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._refilled) * 1000 / self.rateLimit)
+            self._refilled = now
+            if self._tokens < 1:
+                self.rate_limited += 1
+                raise ccxt.RateLimitExceeded(f"{self.id} 429 Too Many Requests")
+            self._tokens -= 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    @property
+    def api_calls(self) -> int:
+        return sum(self.calls.values())
+
+    # --- CCXT surface ---
+
+    async def load_markets(self, reload: bool = False) -> Dict[str, Any]:
+        return self.markets
+
+    def set_markets(self, markets, currencies=None) -> Dict[str, Any]:
+        return self.markets
+
+    async def fetch_balance(self) -> Dict[str, Any]:
+        await self._call("fetch_balance")
+        balance = {"total": dict(self.balances), "free": dict(self.balances), "used": {}}
+        for currency, total in self.balances.items():
+            balance[currency] = {"total": total, "free": total, "used": 0.0}
+        return balance
+
+    async def fetch_my_trades(self, symbol=None, since=None, limit=None, params=None) -> List[Dict[str, Any]]:
+        await self._call("fetch_my_trades")
+        if symbol is None:
+            if not self.all_symbols:
+                raise ccxt.ArgumentsRequired(f"{self.id} fetchMyTrades() requires a symbol argument")
+            rows, stamps = self.fills, self.timestamps
+        else:
+            rows, stamps = self.by_symbol.get(symbol, []), self.symbol_timestamps.get(symbol, [])
+        start = bisect.bisect_left(stamps, since) if since is not None else 0
+        end = start + limit if limit else len(rows)
+        return [dict(fill) for fill in rows[start:end]]
+
+    async def fetch_positions(self, symbols=None, params=None) -> List[Dict[str, Any]]:
+        await self._call("fetch_positions")
+        return [dict(p) for p in self.positions]
+
+    async def fetch_tickers(self, symbols=None, params=None) -> Dict[str, Any]:
+        await self._call("fetch_tickers")
+        tickers = {}
+        for symbol in symbols or self.markets:
+            rows = self.by_symbol.get(symbol)
+            last = rows[-1]["price"] if rows else 1.0
+            tickers[symbol] = {"symbol": symbol, "last": last}
+        return tickers
+
+    async def close(self) -> None:
+        self.closed = True
+
+
+def install_fake_exchange(target, fake: FakeExchange) -> None:
+    """Make exchange_service build `fake` for every connection.
+
+    `target` is pytest's `monkeypatch`, or the exchange_service module itself
+    (benchmarks), whose client factory is then replaced for the process.
+    """
+    from services import exchange_service
+
+    def factory(exchange_id, api_key, api_secret, passphrase=None, testnet=False, streaming=False):
+        return fake
+
+    if hasattr(target, "setattr"):
+        target.setattr(exchange_service, "create_exchange_client", factory)
+        target.setattr(exchange_service, "exchange_clients", exchange_service.ExchangeClientPool())
+    else:
+        exchange_service.create_exchange_client = factory
+        exchange_service.exchange_clients = exchange_service.ExchangeClientPool()
+
+
+class CountingDatabase:
+    """Wraps a Motor database and counts operations that hit the server."""
+
+    ROUND_TRIPS = {
+        "find_one", "insert_one", "insert_many", "update_one", "update_many",
+        "bulk_write", "distinct", "count_documents", "find_one_and_update",
+        "delete_one", "delete_many", "aggregate", "find",
+    }
+
+    def __init__(self, db):
+        self._db = db
+        self.round_trips: Counter = Counter()
+
+    def __getitem__(self, name: str) -> "_CountingCollection":
+        return _CountingCollection(self._db[name], name, self.round_trips)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._db, name)
+
+    @property
+    def total(self) -> int:
+        return sum(self.round_trips.values())
+
+
+class _CountingCollection:
+    def __init__(self, collection, name: str, counter: Counter):
+        self._collection = collection
+        self._name = name
+        self._counter = counter
+
+    def __getattr__(self, attr: str) -> Any:
+        value = getattr(self._collection, attr)
+        if attr in CountingDatabase.ROUND_TRIPS:
+            def counted(*args, **kwargs):
+                self._counter[f"{self._name}.{attr}"] += 1
+                return value(*args, **kwargs)
+            return counted
+        return value
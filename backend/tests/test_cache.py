@@ -0,0 +1,68 @@
+import asyncio
+import pytest
+
+from services.cache import TTLCache
+
+
+class Loader:
+    def __init__(self, delay=0.02):
+        self.calls = 0
+        self.delay = delay
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return self.calls
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_one_load():
+    cache = TTLCache("test", ttl=60)
+    loader = Loader()
+
+    values = await asyncio.gather(*[cache.get("k", loader) for _ in range(10)])
+
+    assert values == [1] * 10
+    assert loader.calls == 1
+    assert await cache.get("k", loader) == 1
+    stats = cache.stats()
+    assert stats["coalesced"] == 9 and stats["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_fresh_bypasses_cache():
+    cache = TTLCache("test", ttl=60)
+    loader = Loader(delay=0)
+
+    assert await cache.get("k", loader) == 1
+    assert await cache.get("k", loader, fresh=True) == 2
+    assert await cache.get("k", loader) == 2
+
+
+@pytest.mark.asyncio
+async def test_stale_value_served_while_refreshing():
+    cache = TTLCache("test", ttl=0.01, stale_ttl=60)
+    loader = Loader()
+
+    assert await cache.get("k", loader) == 1
+    await asyncio.sleep(0.02)
+
+    # Past the TTL: the old value comes back immediately, one refresh runs
+    assert await cache.get("k", loader) == 1
+    assert await cache.get("k", loader) == 1
+    await asyncio.sleep(0.05)
+    assert loader.calls == 2
+    assert await cache.get("k", loader) == 2
+
+
+@pytest.mark.asyncio
+async def test_failed_loads_are_not_cached():
+    cache = TTLCache("test", ttl=60)
+
+    async def failing():
+        raise RuntimeError("exchange down")
+
+    with pytest.raises(RuntimeError):
+        await cache.get("k", failing)
+    assert len(cache) == 0
+    assert await cache.get("k", Loader(delay=0)) == 1
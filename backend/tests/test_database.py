@@ -0,0 +1,44 @@
+import pytest
+from pydantic import ValidationError
+from pymongo.read_preferences import Primary, SecondaryPreferred
+
+import database
+from config import DatabaseSettings
+from database import get_collection, note_user_write
+
+
+def test_settings_come_from_mongodb_environment(monkeypatch):
+    monkeypatch.setenv("MONGODB_MAX_POOL_SIZE", "20")
+    monkeypatch.setenv("MONGODB_SOCKET_TIMEOUT_MS", "15000")
+    monkeypatch.setenv("MONGODB_COMPRESSORS", "lz4,zlib")
+
+    options = DatabaseSettings().client_options()
+    assert options["maxPoolSize"] == 20 and options["socketTimeoutMS"] == 15000
+    # Unknown or uninstalled compressors are skipped
+    assert options["compressors"] == ["zlib"]
+    assert "waitQueueTimeoutMS" not in options
+
+    monkeypatch.setenv("MONGODB_ANALYTICS_MAX_STALENESS_SECONDS", "30")
+    with pytest.raises(ValidationError):
+        DatabaseSettings()
+
+
+@pytest.mark.asyncio
+async def test_analytics_reads_use_secondaries_until_the_user_writes(client, auth_headers, monkeypatch):
+    monkeypatch.setattr(database, "_recent_writes", {})
+    user_id = str((await database.db.db["users"].find_one({"username": "testuser"}))["_id"])
+
+    analytics = get_collection("trades", "analytics", user_id).read_preference
+    assert isinstance(analytics, SecondaryPreferred) and analytics.max_staleness == 90
+    assert get_collection("trades").read_preference == Primary()
+
+    trade = {"symbol": "AAPL", "side": "BUY", "entry_price": 100.0, "quantity": 1, "entry_time": "2024-01-01T00:00:00"}
+    response = await client.post("/api/v1/trades", json=trade, headers=auth_headers)
+    assert response.status_code == 200
+
+    # Read-your-writes: right after their change, this user reads from the primary
+    assert get_collection("trades", "analytics", user_id).read_preference == Primary()
+    assert isinstance(get_collection("trades", "analytics", "someone-else").read_preference, SecondaryPreferred)
+
+    note_user_write("u2")
+    assert database.recently_wrote("u2")
@@ -0,0 +1,274 @@
+import asyncio
+import time
+import pytest
+
+from services import exchange_service
+from services.exchange_service import ExchangeClientPool, encrypt_api_key
+
+
+class FakeClient:
+    def __init__(self, exchange_id, api_key):
+        self.id = exchange_id
+        self.api_key = api_key
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def fake_clients(monkeypatch):
+    created = []
+
+    def factory(exchange_id, api_key, api_secret, passphrase=None, testnet=False):
+        client = FakeClient(exchange_id, api_key)
+        created.append(client)
+        return client
+
+    monkeypatch.setattr(exchange_service, "create_exchange_client", factory)
+    return created
+
+
+def make_connection(connection_id="c1", api_key="key"):
+    return {
+        "_id": connection_id,
+        "user_id": "u1",
+        "exchange": "binance",
+        "api_key_encrypted": encrypt_api_key(api_key),
+        "api_secret_encrypted": encrypt_api_key("secret"),
+        "passphrase_encrypted": None,
+    }
+
+
+@pytest.mark.asyncio
+async def test_pool_reuses_client_per_connection(fake_clients):
+    pool = ExchangeClientPool(idle_seconds=60)
+    connection = make_connection()
+
+    async with pool.client(connection) as first:
+        pass
+    async with pool.client(connection) as second:
+        pass
+
+    assert first is second
+    assert first.api_key == "key"
+    assert len(fake_clients) == 1
+    await pool.close()
+    assert first.closed
+
+
+@pytest.mark.asyncio
+async def test_pool_rebuilds_client_when_credentials_change(fake_clients):
+    pool = ExchangeClientPool(idle_seconds=60)
+
+    async with pool.client(make_connection(api_key="old")) as old:
+        pass
+    async with pool.client(make_connection(api_key="new")) as new:
+        pass
+
+    assert old is not new
+    assert old.closed
+    assert new.api_key == "new"
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_pool_evicts_only_idle_clients(fake_clients):
+    pool = ExchangeClientPool(idle_seconds=0)
+
+    async with pool.client(make_connection("busy")) as busy:
+        async with pool.client(make_connection("idle")) as idle:
+            pass
+        assert await pool.evict_idle() == 1
+        assert idle.closed
+        assert not busy.closed
+
+    assert len(pool) == 1
+    await pool.close()
+    assert busy.closed
+
+
+class FakeTradingClient(FakeClient):
+    rateLimit = 1
+    markets = {
+        "BTC/USDT": {"symbol": "BTC/USDT", "base": "BTC", "quote": "USDT", "spot": True},
+        "ETH/USDT": {"symbol": "ETH/USDT", "base": "ETH", "quote": "USDT", "spot": True},
+        "SOL/USDT": {"symbol": "SOL/USDT", "base": "SOL", "quote": "USDT", "spot": True},
+        "DOGE/USDT": {"symbol": "DOGE/USDT", "base": "DOGE", "quote": "USDT", "spot": True},
+    }
+
+    def __init__(self, exchange_id, api_key):
+        super().__init__(exchange_id, api_key)
+        self.requested = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def load_markets(self):
+        return self.markets
+
+    async def fetch_balance(self):
+        return {"total": {"BTC": 0.5, "ETH": 2.0, "USDT": 100.0, "DOGE": 0}}
+
+    async def fetch_my_trades(self, symbol=None, since=None, limit=None):
+        self.requested.append(symbol)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        return [{
+            "id": f"{symbol}-1", "symbol": symbol, "side": "buy", "price": 1.0,
+            "amount": 1.0, "cost": 1.0, "timestamp": 1700000000000,
+        }]
+
+
+@pytest.mark.asyncio
+async def test_fetch_trades_discovers_symbols_and_fetches_concurrently(monkeypatch):
+    created = []
+
+    def factory(exchange_id, api_key, api_secret, passphrase=None, testnet=False):
+        client = FakeTradingClient(exchange_id, api_key)
+        created.append(client)
+        return client
+
+    monkeypatch.setattr(exchange_service, "create_exchange_client", factory)
+    monkeypatch.setattr(exchange_service, "exchange_clients", ExchangeClientPool(idle_seconds=60))
+
+    trades = await exchange_service.fetch_trades(make_connection(), known_symbols=["SOL/USDT", "GONE/USDT"])
+
+    client = created[0]
+    # Held assets plus previously synced symbols; DOGE has a zero balance
+    assert sorted(client.requested) == ["BTC/USDT", "ETH/USDT", "SOL/USDT"]
+    assert client.max_in_flight > 1
+    assert {t.symbol for t in trades} == {"BTC/USDT", "ETH/USDT", "SOL/USDT"}
+    await exchange_service.exchange_clients.close()
+
+
+class FakeDerivativesClient(FakeTradingClient):
+    has = {"fetchPositions": True}
+    markets = {
+        **FakeTradingClient.markets,
+        "BTC/USDT:USDT": {"symbol": "BTC/USDT:USDT", "base": "BTC", "quote": "USDT", "settle": "USDT",
+                          "type": "swap", "spot": False},
+        "XRP/USDT:USDT": {"symbol": "XRP/USDT:USDT", "base": "XRP", "quote": "USDT", "settle": "USDT",
+                          "type": "swap", "spot": False},
+        "DOGE/USDT:USDT": {"symbol": "DOGE/USDT:USDT", "base": "DOGE", "quote": "USDT", "settle": "USDT",
+                           "type": "swap", "spot": False},
+    }
+
+    async def fetch_positions(self):
+        return [
+            {"symbol": "XRP/USDT:USDT", "contracts": 100},
+            {"symbol": "DOGE/USDT:USDT", "contracts": 0},
+        ]
+
+
+@pytest.mark.asyncio
+async def test_discover_symbols_includes_derivatives_on_futures_venues():
+    client = FakeDerivativesClient("binance", "key")
+    symbols = await exchange_service.discover_symbols(client)
+    # Held BTC matches its perpetual; XRP has an open position; DOGE is neither
+    assert symbols == ["BTC/USDT", "BTC/USDT:USDT", "ETH/USDT", "XRP/USDT:USDT"]
+
+    spot_only = FakeDerivativesClient("coinbase", "key")
+    assert await exchange_service.discover_symbols(spot_only) == ["BTC/USDT", "ETH/USDT"]
+
+
+HISTORY_START = int(time.time() * 1000) - 30 * 24 * 3600 * 1000
+
+
+class FakeHistoryClient(FakeTradingClient):
+    """Venue with a paginated history of 12 BTC/USDT fills, one per second."""
+
+    fail_after_pages = None
+
+    def __init__(self, exchange_id, api_key):
+        super().__init__(exchange_id, api_key)
+        self.history = [
+            {"id": str(i), "symbol": "BTC/USDT", "side": "buy", "price": 1.0, "amount": 1.0,
+             "cost": 1.0, "timestamp": HISTORY_START + i * 1000}
+            for i in range(12)
+        ]
+        self.pages = 0
+
+    async def fetch_balance(self):
+        return {"total": {"BTC": 1.0}}
+
+    async def fetch_my_trades(self, symbol=None, since=None, limit=None):
+        if self.fail_after_pages is not None and self.pages >= self.fail_after_pages:
+            raise RuntimeError("connection reset")
+        self.pages += 1
+        self.requested.append((symbol, since))
+        return [t for t in self.history if t["timestamp"] >= since][:limit]
+
+
+@pytest.mark.asyncio
+async def test_sync_backfills_all_pages_and_resumes_from_watermark(monkeypatch, mock_db_connection):
+    from database import db
+
+    clients = []
+
+    def factory(exchange_id, api_key, api_secret, passphrase=None, testnet=False):
+        client = FakeHistoryClient(exchange_id, api_key)
+        clients.append(client)
+        return client
+
+    monkeypatch.setattr(exchange_service, "create_exchange_client", factory)
+    monkeypatch.setattr(exchange_service, "EXCHANGE_SYNC_PAGE_LIMIT", 5)
+
+    connection = make_connection()
+    del connection["_id"]
+    await db.db["exchange_connections"].insert_one(connection)
+
+    # First sync dies after two pages; the watermark keeps what was stored
+    monkeypatch.setattr(exchange_service, "exchange_clients", ExchangeClientPool(idle_seconds=60))
+    FakeHistoryClient.fail_after_pages = 2
+    result = await exchange_service.sync_trades_to_db(connection, db.db)
+    assert result["failed_symbols"] and result["synced_trades"] == 9
+    stored = await db.db["exchange_connections"].find_one({"_id": connection["_id"]})
+    assert stored["sync_watermarks"]["BTC/USDT"] == HISTORY_START + 8 * 1000
+
+    # Resumed sync starts at the watermark and pages through the rest
+    monkeypatch.setattr(exchange_service, "exchange_clients", ExchangeClientPool(idle_seconds=60))
+    FakeHistoryClient.fail_after_pages = None
+    result = await exchange_service.sync_trades_to_db(stored, db.db)
+    assert result["success"] and not result["failed_symbols"]
+    assert result["synced_trades"] == 3
+    assert result["skipped_trades"] == 1
+    assert clients[-1].requested[0] == ("BTC/USDT", HISTORY_START + 8 * 1000)
+    assert await db.db["trades"].count_documents({"source": "binance"}) == 12
+
+
+@pytest.mark.asyncio
+async def test_sync_against_fake_exchange_stays_within_rate_limit(monkeypatch, mock_db_connection):
+    from database import db
+    from services import rate_limiter
+    from tests.fake_exchange import CountingDatabase, FakeExchange, install_fake_exchange, synthetic_fills
+
+    fake = FakeExchange(
+        "bybit",
+        fills=synthetic_fills(450, ["BTC/USDT", "ETH/USDT", "SOL/USDT"]),
+        all_symbols=True,
+        rate_limit_ms=2,
+        enforce_rate_limit=True,
+        burst=5,
+    )
+    install_fake_exchange(monkeypatch, fake)
+    monkeypatch.setattr(exchange_service, "EXCHANGE_SYNC_PAGE_LIMIT", 100)
+    monkeypatch.setattr(rate_limiter, "_exchange_buckets", {})
+
+    connection = make_connection()
+    connection["exchange"] = "bybit"
+    del connection["_id"]
+    await db.db["exchange_connections"].insert_one(connection)
+
+    counting = CountingDatabase(db.db)
+    result = await exchange_service.sync_trades_to_db(connection, counting)
+
+    assert result["success"] and result["synced_trades"] == 450
+    assert fake.rate_limited == 0
+    # One all-symbols request per page; pages are batched into bulk writes,
+    # each followed by one watermark update
+    assert fake.calls == {"fetch_my_trades": result["pages"]}
+    assert 1 <= counting.round_trips["trades.bulk_write"] <= result["pages"]
+    assert counting.round_trips["exchange_connections.update_one"] == counting.round_trips["trades.bulk_write"]
+    assert await db.db["trades"].count_documents({"source": "bybit"}) == 450
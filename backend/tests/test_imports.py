@@ -0,0 +1,176 @@
+import io
+import zipfile
+import asyncio
+import pytest
+from httpx import AsyncClient
+
+
+async def wait_for_job(client: AsyncClient, job_id: str, headers, timeout: float = 5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while True:
+        response = await client.get(f"/api/v1/imports/{job_id}", headers=headers)
+        assert response.status_code == 200
+        job = response.json()
+        if job["status"] in ("completed", "failed"):
+            return job
+        assert asyncio.get_running_loop().time() < deadline, "import job did not finish"
+        await asyncio.sleep(0.02)
+
+
+@pytest.mark.asyncio
+async def test_import_runs_as_background_job(client: AsyncClient, auth_headers):
+    csv = (
+        "Symbol,Side,Quantity,Price,Time\n"
+        "AAPL,BUY,100,150.25,2026-01-15 09:30:00\n"
+        "TSLA,SELL,50,245.50,2026-01-15 14:20:00\n"
+        "MSFT,BUY,,300,2026-01-16 10:00:00\n"
+    )
+    response = await client.post(
+        "/api/v1/trades/import",
+        files={"file": ("trades.csv", csv, "text/csv")},
+        headers=auth_headers,
+    )
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+
+    job = await wait_for_job(client, job_id, auth_headers)
+    assert job["status"] == "completed"
+    assert job["total_rows"] == 3
+    assert job["processed_rows"] == 3
+    assert job["imported"] == 2
+    assert job["skipped"] == 1
+    assert job["progress"] == 1.0
+
+    trades = (await client.get("/api/v1/trades", headers=auth_headers)).json()
+    assert {t["symbol"] for t in trades} == {"AAPL", "TSLA"}
+
+
+@pytest.mark.asyncio
+async def test_import_counts_rows_with_multiline_fields(client: AsyncClient, auth_headers):
+    csv = (
+        "Symbol,Side,Quantity,Price,Time,Notes\n"
+        "AAPL,BUY,100,150.25,2026-01-15 09:30:00,\"breakout\n\nretest\"\n"
+        "TSLA,SELL,50,245.50,2026-01-15 14:20:00,\n"
+    )
+    response = await client.post(
+        "/api/v1/trades/import",
+        files={"file": ("trades.csv", csv, "text/csv")},
+        headers=auth_headers,
+    )
+    job = await wait_for_job(client, response.json()["job_id"], auth_headers)
+    assert job["status"] == "completed"
+    assert job["total_rows"] == 2
+    assert job["processed_rows"] == 2
+    assert job["imported"] == 2
+
+
+@pytest.mark.asyncio
+async def test_import_job_not_found(client: AsyncClient, auth_headers):
+    response = await client.get("/api/v1/imports/000000000000000000000000", headers=auth_headers)
+    assert response.status_code == 404
+
+    response = await client.get("/api/v1/imports/not-an-id", headers=auth_headers)
+    assert response.status_code == 404
+
+
+def test_detect_profile_by_header():
+    from services.import_profiles import detect_profile
+
+    assert detect_profile(["Date(UTC)", "Pair", "Side", "Price", "Executed", "Amount", "Fee"]).id == "binance_spot"
+    assert detect_profile(["Symbol", "DateTime", "Quantity", "TradePrice", "Buy/Sell", "IBCommission"]).id == "ibkr_flex"
+    assert detect_profile(["ticker", "type", "qty", "price", "date"]).id == "generic"
+
+
+@pytest.mark.asyncio
+async def test_import_broker_profile_keeps_exit_and_pnl(client: AsyncClient, auth_headers):
+    csv = (
+        "Symbol,Quantity,Open Date,Close Date,Cost,Proceeds,Gain/Loss\n"
+        "NVDA,10,01/02/2026,01/10/2026,\"$1,500.00\",\"$1,400.00\",($100.00)\n"
+    )
+    response = await client.post(
+        "/api/v1/trades/import",
+        files={"file": ("gainloss.csv", csv, "text/csv")},
+        headers=auth_headers,
+    )
+    job = await wait_for_job(client, response.json()["job_id"], auth_headers)
+    assert job["status"] == "completed"
+    assert job["profile"] == "tradier_gainloss"
+    assert job["imported"] == 1
+
+    trades = (await client.get("/api/v1/trades?symbol=NVDA", headers=auth_headers)).json()
+    assert trades[0]["entry_price"] == 150.0
+    assert trades[0]["exit_price"] == 140.0
+    assert trades[0]["pnl"] == -100.0
+    assert trades[0]["status"] == "CLOSED"
+
+
+@pytest.mark.asyncio
+async def test_import_coerces_formatted_numbers_and_skips_bad_cells(client: AsyncClient, auth_headers):
+    csv = (
+        "Symbol,Side,Status,Filled,Avg Price,Filled Time\n"
+        "AAPL,Buy,filled,\"1,000\",$12.50,01/15/2026 09:30:00 EST\n"
+        "TSLA,Sell,Filled,5,abc,01/15/2026 10:00:00 EST\n"
+        "MSFT,Buy,Cancelled,1,300,01/15/2026 11:00:00 EST\n"
+    )
+    response = await client.post(
+        "/api/v1/trades/import",
+        files={"file": ("orders.csv", csv, "text/csv")},
+        headers=auth_headers,
+    )
+    job = await wait_for_job(client, response.json()["job_id"], auth_headers)
+    assert job["status"] == "completed"
+    assert job["profile"] == "webull_orders"
+    assert job["imported"] == 1
+    assert job["skipped"] == 2
+    assert job["errors"] == ["Invalid entry price: abc"]
+
+    trades = (await client.get("/api/v1/trades", headers=auth_headers)).json()
+    assert [(t["symbol"], t["quantity"], t["entry_price"]) for t in trades] == [("AAPL", 1000.0, 12.5)]
+
+
+@pytest.mark.asyncio
+async def test_archive_import_parses_every_member(client: AsyncClient, auth_headers):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("2026-01.csv", "symbol,side,qty,price,date\nAMD,BUY,5,120,2026-01-05\n")
+        archive.writestr("nested/2026-02.csv", "symbol,side,qty,price,date\nAMD,SELL,5,130,2026-02-05\nAMD,BUY,,1,2026-02-06\n")
+        archive.writestr("../escape.csv", "symbol,side,qty,price,date\nAMD,BUY,1,100,2026-03-01\n")
+        archive.writestr("notes.txt", "ignored")
+
+    response = await client.post(
+        "/api/v1/imports/archive",
+        files={"file": ("history.zip", buffer.getvalue(), "application/zip")},
+        headers=auth_headers,
+    )
+    assert response.status_code == 202
+
+    job = await wait_for_job(client, response.json()["job_id"], auth_headers, timeout=30)
+    assert job["status"] == "completed", job["errors"]
+    assert job["kind"] == "archive"
+    assert job["total_files"] == 3
+    assert job["processed_files"] == 3
+    assert job["imported"] == 3
+    assert job["skipped"] == 1
+
+    trades = (await client.get("/api/v1/trades?symbol=AMD", headers=auth_headers)).json()
+    assert len(trades) == 3
+
+
+@pytest.mark.asyncio
+async def test_recover_interrupted_fails_jobs_without_heartbeat():
+    from datetime import datetime, timedelta
+    from database import db
+    from services.import_service import ImportJobManager
+
+    manager = ImportJobManager()
+    stale = datetime.utcnow() - timedelta(minutes=5)
+    await db.db["import_jobs"].insert_many([
+        {"_id": "gone", "owner": "restarted", "status": "running", "updated_at": stale, "errors": []},
+        {"_id": "alive", "owner": "other", "status": "queued", "updated_at": datetime.utcnow(), "errors": []},
+        {"_id": "mine", "owner": manager.owner, "status": "running", "updated_at": stale, "errors": []},
+    ])
+
+    await manager.recover_interrupted(db.db)
+
+    statuses = {j["_id"]: j["status"] async for j in db.db["import_jobs"].find()}
+    assert statuses == {"gone": "failed", "alive": "queued", "mine": "running"}
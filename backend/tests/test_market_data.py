@@ -0,0 +1,82 @@
+import asyncio
+import pytest
+
+from services import market_data
+from services.market_data import TickerCache
+
+
+class FakePublicClient:
+    id = "binance"
+    rateLimit = 1
+    has = {"fetchTickers": True}
+
+    def __init__(self, prices):
+        self.prices = prices
+        self.markets = {symbol: {"symbol": symbol} for symbol in prices}
+        self.markets_by_id = {s.replace("/", ""): [{"symbol": s}] for s in prices}
+        self.ticker_calls = []
+
+    async def load_markets(self):
+        return self.markets
+
+    async def fetch_tickers(self, symbols=None):
+        self.ticker_calls.append(sorted(symbols))
+        await asyncio.sleep(0.01)
+        return {s: {"symbol": s, "last": self.prices[s]} for s in symbols}
+
+    async def close(self):
+        pass
+
+
+@pytest.fixture
+def fake_tickers(monkeypatch):
+    cache = TickerCache(ttl=60)
+    client = FakePublicClient({"BTC/USDT": 50000.0, "ETH/USDT": 3000.0, "SOL/USDT": 100.0})
+    cache._clients["binance"] = client
+    monkeypatch.setattr(market_data, "ticker_cache", cache)
+    return cache, client
+
+
+@pytest.mark.asyncio
+async def test_concurrent_lookups_are_batched_and_cached(fake_tickers):
+    cache, client = fake_tickers
+
+    results = await asyncio.gather(
+        cache.get_prices("binance", ["BTC/USDT", "ETH/USDT"]),
+        cache.get_prices("binance", ["BTC/USDT"]),
+        cache.get_prices("binance", ["ETH/USDT", "SOL/USDT"]),
+    )
+
+    assert results[0] == {"BTC/USDT": 50000.0, "ETH/USDT": 3000.0}
+    assert results[2]["SOL/USDT"] == 100.0
+    # Later callers only fetch what the first batch did not cover
+    assert client.ticker_calls == [["BTC/USDT", "ETH/USDT"], ["SOL/USDT"]]
+
+    usd = await cache.usd_prices("binance", ["BTC", "USDC", "DOGE"])
+    assert usd == {"BTC": 50000.0, "USDC": 1.0}
+    assert len(client.ticker_calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_open_trades_marked_to_market(client, auth_headers, fake_tickers):
+    from database import db
+
+    me = await db.db["users"].find_one({"username": "testuser"})
+    base = {"user_id": str(me["_id"]), "status": "OPEN", "entry_time": "2024-01-01T00:00:00"}
+    await db.db["trades"].insert_many([
+        {**base, "symbol": "BTCUSDT", "side": "BUY", "quantity": 0.5, "entry_price": 40000.0},
+        {**base, "symbol": "ETH", "side": "SELL", "quantity": 2, "entry_price": 3500.0, "source": "binance"},
+        {**base, "symbol": "AAPL", "side": "BUY", "quantity": 10, "entry_price": 180.0},
+        {**base, "symbol": "BTC/USDT", "side": "BUY", "quantity": 1, "entry_price": 1.0, "status": "CLOSED"},
+    ])
+
+    response = await client.get("/api/v1/trades/mark-to-market", headers=auth_headers)
+    assert response.status_code == 200
+    data = response.json()
+
+    marks = {m["symbol"]: m for m in data["trades"]}
+    assert marks["BTCUSDT"]["unrealized_pnl"] == 5000.0
+    assert marks["ETH"]["unrealized_pnl"] == 1000.0
+    assert marks["AAPL"]["mark_price"] is None
+    assert data["total_unrealized_pnl"] == 6000.0
+    assert (data["priced"], data["unpriced"]) == (2, 1)
@@ -0,0 +1,71 @@
+import gzip
+import json
+import os
+import pytest
+
+from services.markets_cache import MarketsCache
+
+MARKETS = {
+    "BTC/USDT": {"id": "BTCUSDT", "symbol": "BTC/USDT", "base": "BTC", "quote": "USDT"},
+    "ETH/USDT": {"id": "ETHUSDT", "symbol": "ETH/USDT", "base": "ETH", "quote": "USDT"},
+}
+
+
+class FakeMarketsClient:
+    id = "binance"
+
+    def __init__(self):
+        self.markets = None
+        self.currencies = {}
+        self.network_loads = 0
+
+    async def load_markets(self):
+        self.network_loads += 1
+        self.set_markets(list(MARKETS.values()), {"BTC": {"code": "BTC"}})
+        return self.markets
+
+    def set_markets(self, markets, currencies=None):
+        self.markets = {m["symbol"]: m for m in markets}
+        self.currencies = currencies or {}
+
+
+@pytest.mark.asyncio
+async def test_markets_loaded_once_and_shared_through_disk(tmp_path):
+    first = FakeMarketsClient()
+    await MarketsCache(directory=str(tmp_path)).load(first)
+    assert first.network_loads == 1
+
+    path = tmp_path / "binance.json.gz"
+    with gzip.open(path, "rt") as f:
+        assert len(json.load(f)["markets"]) == 2
+    assert not [p for p in os.listdir(tmp_path) if p.endswith(".tmp")]
+
+    # Another worker (separate cache instance) warms a new client from disk
+    second = FakeMarketsClient()
+    assert await MarketsCache(directory=str(tmp_path)).warm(second)
+    assert second.markets.keys() == MARKETS.keys()
+    assert second.currencies == {"BTC": {"code": "BTC"}}
+    assert second.network_loads == 0
+
+
+@pytest.mark.asyncio
+async def test_expired_cache_is_reloaded_from_network(tmp_path):
+    await MarketsCache(directory=str(tmp_path)).load(FakeMarketsClient())
+    os.utime(tmp_path / "binance.json.gz", (0, 0))
+
+    client = FakeMarketsClient()
+    cache = MarketsCache(directory=str(tmp_path), max_age=3600)
+    assert not await cache.warm(client)
+    await cache.load(client)
+    assert client.network_loads == 1
+
+
+def test_refresh_lock_is_exclusive_until_stale(tmp_path):
+    cache = MarketsCache(directory=str(tmp_path))
+    assert cache._try_lock("binance")
+    assert not MarketsCache(directory=str(tmp_path))._try_lock("binance")
+
+    os.utime(tmp_path / "binance.lock", (0, 0))
+    assert MarketsCache(directory=str(tmp_path))._try_lock("binance")
+    cache._unlock("binance")
+    assert not (tmp_path / "binance.lock").exists()
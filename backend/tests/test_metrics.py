@@ -0,0 +1,81 @@
+import asyncio
+import re
+import time
+
+import pytest
+
+from telemetry import LoopLagMonitor
+
+SAMPLE = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*(\{([a-zA-Z_]+="[^"]*",?)*\})? (-?[0-9.e+-]+|\+Inf)$')
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_exposes_route_and_runtime_telemetry(client, auth_headers):
+    for _ in range(3):
+        await client.get("/api/v1/trades", headers=auth_headers)
+    await client.get("/api/v1/trades/does-not-exist", headers=auth_headers)
+    await client.get("/no/such/page")
+
+    response = await client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = response.text
+
+    for line in body.splitlines():
+        assert line.startswith("# ") or SAMPLE.match(line), line
+
+    assert 'http_request_duration_seconds_count{method="GET",route="/api/v1/trades"} ' in body
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/api/v1/trades",le="+Inf"}' in body
+    assert 'http_responses_total{method="GET",route="/api/v1/trades/{id}",status="404"} ' in body
+    # Unknown paths share one label
+    assert 'route="unmatched",status="404"' in body and "/no/such/page" not in body
+    # The /metrics request itself is in flight while rendering
+    assert "http_requests_in_flight 1" in body
+    assert 'executor_max_threads{executor="motor"}' in body or 'executor_max_threads{executor="default"}' in body
+    assert 'cache_hit_ratio{cache="balances"}' in body
+    assert 'rate_limit_requests_total{route_class="api",outcome="allowed"}' in body
+    assert "event_loop_lag_seconds" in body and "mongodb_pool_max_size 100" in body
+
+
+@pytest.mark.asyncio
+async def test_metrics_token(client, monkeypatch):
+    import main
+
+    monkeypatch.setattr(main, "METRICS_TOKEN", "scrape-secret")
+    assert (await client.get("/metrics")).status_code == 401
+    response = await client.get("/metrics", headers={"Authorization": "Bearer scrape-secret"})
+    assert response.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_health_is_a_readiness_probe(client, monkeypatch):
+    from database import db
+
+    response = await client.get("/api/v1/health")
+    assert response.status_code == 200 and response.json()["checks"] == {"mongodb": "ok"}
+
+    class Unreachable:
+        async def command(self, name):
+            raise ConnectionError("No servers available")
+
+    monkeypatch.setattr(db, "db", Unreachable())
+    response = await client.get("/api/v1/health")
+    assert response.status_code == 503
+    assert response.json()["status"] == "unavailable"
+    # Liveness is unaffected
+    assert (await client.get("/")).status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_loop_lag_monitor_sees_blocking_calls():
+    monitor = LoopLagMonitor(interval=0.01)
+    monitor.start()
+    try:
+        await asyncio.sleep(0.02)
+        time.sleep(0.06)  # blocks the loop, like a sync SDK call would
+        await asyncio.sleep(0.03)
+    finally:
+        await monitor.stop()
+    assert monitor.max_ms >= 40
+    ((_, histogram),) = monitor.lag.items()
+    assert histogram.count >= 2
@@ -0,0 +1,64 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+
+from mongo_monitor import MongoMonitor, MongoRequestStatsMiddleware, command_filter
+
+
+def run_command(monitor, request_id, name, command, duration_ms):
+    """Publish the events PyMongo would for one command."""
+    monitor.started(SimpleNamespace(
+        command_name=name, command={name: command.pop("collection"), **command},
+        connection_id=("db", 27017), request_id=request_id,
+    ))
+    monitor.succeeded(SimpleNamespace(
+        command_name=name, connection_id=("db", 27017), request_id=request_id,
+        duration_micros=int(duration_ms * 1000),
+    ))
+
+
+def test_filters_are_redacted_to_their_shape():
+    command = {"updates": [{"q": {"user_id": "u1", "entry_time": {"$gte": "2024-01-01"}}, "u": {"$set": {"pnl": 5}}}]}
+    assert command_filter("update", command) == [{"user_id": "?", "entry_time": {"$gte": "?"}}]
+
+    pipeline = {"pipeline": [{"$match": {"user_id": "u1"}}, {"$group": {"_id": "$symbol", "n": {"$sum": 1}}}]}
+    assert command_filter("aggregate", pipeline) == [
+        {"$match": {"user_id": "?"}},
+        {"$group": {"_id": "$symbol", "n": {"$sum": "?"}}},
+    ]
+    assert command_filter("insert", {"documents": [{"secret": 1}]}) is None
+
+
+@pytest.mark.asyncio
+async def test_round_trips_per_request_and_slow_command_log(capsys):
+    monitor = MongoMonitor(slow_ms=50)
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: str):
+        # N+1: one find per related document, issued from Motor's executor
+        for i in range(3):
+            await asyncio.to_thread(
+                run_command, monitor, i, "find",
+                {"collection": "trades", "filter": {"_id": item_id}}, 80 if i == 2 else 1,
+            )
+        return {}
+
+    wrapped = MongoRequestStatsMiddleware(app, monitor=monitor, debug_headers=True)
+    async with AsyncClient(transport=ASGITransport(app=wrapped), base_url="http://test") as client:
+        response = await client.get("/items/abc")
+
+    assert response.headers["X-DB-Round-Trips"] == "3"
+    assert float(response.headers["X-DB-Time-Ms"]) == pytest.approx(82, abs=0.1)
+
+    metrics = monitor.metrics()
+    assert metrics["commands"]["find trades"]["count"] == 3
+    assert metrics["round_trips_per_request"]["GET /items/{item_id}"]["count"] == 1
+    assert metrics["slow_commands_total"] == 1
+
+    log = capsys.readouterr().out
+    assert "Slow MongoDB find on trades: 80.0 ms route=GET /items/{item_id} filter={'_id': '?'}" in log
+    assert "abc" not in log
@@ -0,0 +1,199 @@
+import threading
+
+import pytest
+import stripe as stripe_sdk
+
+from services import payment_service
+from services.payment_service import apply_webhook_result, handle_webhook_event
+
+
+class FakeStripe:
+    """Stands in for the Stripe SDK module; records the calling thread."""
+
+    error = stripe_sdk.error
+
+    def __init__(self, subscription=None, event=None):
+        self.threads = []
+        parent = self
+
+        class Subscription:
+            @staticmethod
+            def retrieve(subscription_id):
+                parent.threads.append(threading.current_thread().name)
+                return subscription
+
+        class Webhook:
+            @staticmethod
+            def construct_event(payload, sig_header, secret):
+                return event
+
+        self.Subscription = Subscription
+        self.Webhook = Webhook
+
+
+SUBSCRIPTION = {
+    "id": "sub_1",
+    "status": "active",
+    "metadata": {"tier": "pro"},
+    "current_period_start": 1700000000,
+    "current_period_end": 1702592000,
+    "cancel_at_period_end": False,
+}
+
+
+async def stored_user_id():
+    from database import db
+    return (await db.db["users"].find_one({"username": "testuser"}))["_id"]
+
+
+@pytest.mark.asyncio
+async def test_subscription_status_calls_stripe_off_loop_once_then_reads_cache(client, auth_headers, monkeypatch):
+    from database import db
+
+    fake = FakeStripe(subscription=SUBSCRIPTION)
+    monkeypatch.setattr(payment_service, "_stripe", lambda: fake)
+    await db.db["users"].update_one({"username": "testuser"}, {"$set": {"stripe_subscription_id": "sub_1"}})
+
+    for _ in range(3):
+        response = await client.get("/api/v1/subscription/status", headers=auth_headers)
+        assert response.status_code == 200
+        assert response.json()["tier"] == "pro" and response.json()["status"] == "active"
+
+    # Fetched once, on the Stripe thread pool, then served from the user document
+    assert len(fake.threads) == 1 and fake.threads[0].startswith("stripe")
+
+
+@pytest.mark.asyncio
+async def test_webhook_events_refresh_cached_subscription(client, auth_headers, monkeypatch):
+    from database import db
+
+    user_id = str(await stored_user_id())
+
+    updated = {**SUBSCRIPTION, "status": "past_due", "metadata": {"tier": "elite", "user_id": user_id}}
+    event = {"type": "customer.subscription.updated", "data": {"object": updated}}
+    monkeypatch.setattr(payment_service, "_stripe", lambda: FakeStripe(event=event))
+
+    result = await handle_webhook_event(b"{}", "sig")
+    await apply_webhook_result(db.db, result)
+
+    response = await client.get("/api/v1/subscription/status", headers=auth_headers)
+    assert response.json()["status"] == "past_due" and response.json()["tier"] == "elite"
+    # A past-due subscription does not unlock the tier
+    user = await db.db["users"].find_one({"username": "testuser"})
+    assert user.get("subscription_tier", "starter") == "starter"
+
+    event = {"type": "customer.subscription.deleted", "data": {"object": updated}}
+    monkeypatch.setattr(payment_service, "_stripe", lambda: FakeStripe(event=event))
+    await apply_webhook_result(db.db, await handle_webhook_event(b"{}", "sig"))
+
+    response = await client.get("/api/v1/subscription/status", headers=auth_headers)
+    assert response.json()["status"] == "canceled" and response.json()["tier"] == "starter"
+
+    # Subscribing again replaces the canceled snapshot with the new subscription
+    renewed = {**SUBSCRIPTION, "id": "sub_2", "metadata": {"tier": "pro", "user_id": user_id}}
+    event = {
+        "type": "checkout.session.completed",
+        "data": {"object": {"customer": "cus_1", "subscription": "sub_2", "metadata": {"tier": "pro", "user_id": user_id}}},
+    }
+    monkeypatch.setattr(payment_service, "_stripe", lambda: FakeStripe(subscription=renewed, event=event))
+    await apply_webhook_result(db.db, await handle_webhook_event(b"{}", "sig"))
+
+    response = await client.get("/api/v1/subscription/status", headers=auth_headers)
+    assert response.json()["status"] == "active" and response.json()["tier"] == "pro"
+    assert response.json()["stripe_subscription_id"] == "sub_2"
+
+
+def subscription_event(event_id: str, created: int, status: str, user_id: str, tier: str = "pro") -> dict:
+    subscription = {**SUBSCRIPTION, "customer": "cus_1", "status": status, "metadata": {"tier": tier, "user_id": user_id}}
+    return {"id": event_id, "type": "customer.subscription.updated", "created": created, "data": {"object": subscription}}
+
+
+@pytest.mark.asyncio
+async def test_webhook_stores_event_once_and_acknowledges(client, monkeypatch):
+    from database import db
+
+    event = subscription_event("evt_ack", 1700000000, "active", "u1")
+    monkeypatch.setattr(payment_service, "_stripe", lambda: FakeStripe(event=event))
+
+    for _ in range(2):
+        # Stripe retries deliver the same event id
+        response = await client.post("/api/v1/webhooks/stripe", content=b"{}", headers={"stripe-signature": "sig"})
+        assert response.status_code == 200 and response.json() == {"received": True}
+
+    stored = await db.db["stripe_events"].find({"_id": "evt_ack"}).to_list(None)
+    assert len(stored) == 1
+    assert stored[0]["status"] == "pending" and stored[0]["customer"] == "cus_1"
+
+
+@pytest.mark.asyncio
+async def test_stripe_event_worker_applies_in_order_per_customer(client, auth_headers):
+    from database import db
+    from services.stripe_events import StripeEventQueue
+
+    user_id = str(await stored_user_id())
+    queue = StripeEventQueue()
+
+    # Delivered out of order: the renewal arrives before the payment failure that preceded it
+    await queue.ingest(db.db, subscription_event("evt_2", 1700000200, "active", user_id, tier="elite"))
+    await queue.ingest(db.db, subscription_event("evt_1", 1700000100, "past_due", user_id))
+    assert await queue.ingest(db.db, subscription_event("evt_2", 1700000200, "active", user_id, tier="elite")) is False
+
+    assert await queue.run_once(db.db) == 2
+    response = await client.get("/api/v1/subscription/status", headers=auth_headers)
+    assert response.json()["status"] == "active" and response.json()["tier"] == "elite"
+
+    # A late redelivery of an older snapshot does not roll the subscription back
+    await queue.ingest(db.db, subscription_event("evt_0", 1700000000, "incomplete", user_id))
+    await queue.run_once(db.db)
+    response = await client.get("/api/v1/subscription/status", headers=auth_headers)
+    assert response.json()["status"] == "active"
+
+    statuses = {e["_id"]: e["status"] async for e in db.db["stripe_events"].find({"customer": "cus_1"})}
+    assert statuses == {"evt_0": "stale", "evt_1": "processed", "evt_2": "processed"}
+    assert queue.metrics()["processed_total"] == 2 and queue.metrics()["duplicates_total"] == 1
+    assert await queue.run_once(db.db) == 0
+
+
+@pytest.mark.asyncio
+async def test_non_snapshot_event_does_not_mark_older_snapshot_stale(client, auth_headers):
+    from database import db
+    from services.stripe_events import StripeEventQueue
+
+    user_id = str(await stored_user_id())
+    queue = StripeEventQueue()
+
+    checkout = {
+        "id": "evt_checkout",
+        "type": "checkout.session.completed",
+        "created": 1700000300,
+        "data": {"object": {"customer": "cus_1", "subscription": "sub_1", "metadata": {"tier": "elite", "user_id": user_id}}},
+    }
+    await queue.ingest(db.db, checkout)
+    assert await queue.run_once(db.db) == 1
+
+    # The subscription snapshot was created before the checkout event but delivered after it
+    await queue.ingest(db.db, subscription_event("evt_sub", 1700000200, "active", user_id, tier="elite"))
+    assert await queue.run_once(db.db) == 1
+
+    stored = await db.db["stripe_events"].find_one({"_id": "evt_sub"})
+    assert stored["status"] == "processed"
+    response = await client.get("/api/v1/subscription/status", headers=auth_headers)
+    assert response.json()["status"] == "active" and response.json()["tier"] == "elite"
+
+
+@pytest.mark.asyncio
+async def test_worker_rereads_events_after_taking_the_lease(client, auth_headers):
+    from database import db
+    from services.stripe_events import StripeEventQueue
+
+    user_id = str(await stored_user_id())
+    first, second = StripeEventQueue(), StripeEventQueue()
+    await first.ingest(db.db, subscription_event("evt_once", 1700000100, "active", user_id))
+
+    # Both workers see the event pending; the first applies it before the second claims
+    assert await db.db["stripe_events"].count_documents({"status": "pending"}) == 1
+    await first.run_once(db.db)
+    await second._apply_customer(db.db, "cus_1")
+
+    assert first.metrics()["processed_total"] == 1
+    assert second.metrics()["processed_total"] == 0
@@ -0,0 +1,101 @@
+import asyncio
+import time
+import pytest
+
+from services import exchange_service
+from services.exchange_service import ExchangeBalance, ExchangePosition
+from services.portfolio_service import get_portfolio
+
+DELAYS = {"fast": 0.05, "medium": 0.1, "slow": 0.5}
+
+
+@pytest.fixture
+def fake_venues(monkeypatch):
+    exchange_service.balance_cache.clear()
+    exchange_service.position_cache.clear()
+
+    async def fetch_balances(connection):
+        await asyncio.sleep(DELAYS[connection["_id"]])
+        if connection["_id"] == "medium":
+            raise RuntimeError("invalid api key")
+        return [
+            ExchangeBalance(currency="BTC", total=1.0, free=1.0, used=0.0, usd_value=50000.0),
+            ExchangeBalance(currency="USDT", total=1000.0, free=1000.0, used=0.0, usd_value=1000.0),
+        ]
+
+    async def load_positions(connection):
+        await asyncio.sleep(DELAYS[connection["_id"]])
+        return [ExchangePosition(
+            symbol="BTC/USDT:USDT", side="SHORT", size=0.4, entry_price=51000.0,
+            mark_price=50000.0, unrealized_pnl=400.0,
+        )]
+
+    monkeypatch.setattr(exchange_service, "fetch_balances", fetch_balances)
+    monkeypatch.setattr(exchange_service, "load_positions", load_positions)
+    yield
+    exchange_service.balance_cache.clear()
+    exchange_service.position_cache.clear()
+
+
+def connection(connection_id, exchange="binance"):
+    return {"_id": connection_id, "user_id": "u1", "exchange": exchange}
+
+
+@pytest.mark.asyncio
+async def test_portfolio_fans_out_and_reports_slow_and_failed_venues(fake_venues):
+    connections = [connection("fast"), connection("medium", "coinbase"), connection("slow", "bybit")]
+
+    started = time.monotonic()
+    portfolio = await get_portfolio(connections, timeout=0.2)
+    elapsed = time.monotonic() - started
+
+    # Bounded by the timeout, not the sum of venue latencies
+    assert elapsed < 0.35
+    venues = {v["connection_id"]: v for v in portfolio["venues"]}
+    assert venues["fast"]["status"] == "ok"
+    assert venues["medium"]["status"] == "failed" and "invalid api key" in venues["medium"]["error"]
+    assert venues["slow"]["status"] == "failed"
+    assert portfolio["partial"]
+
+    btc = next(a for a in portfolio["assets"] if a["asset"] == "BTC")
+    assert btc["spot"] == 1.0 and btc["derivatives"] == -0.4
+    assert btc["net"] == pytest.approx(0.6)
+    assert btc["usd_value"] == 30000.0
+    assert portfolio["total_balance_usd"] == 51000.0
+
+    # The slow venue's fetch finished in the background; once its data is
+    # cached, missing the deadline again serves it as late instead of failed
+    await asyncio.sleep(0.4)
+    for cache in (exchange_service.balance_cache, exchange_service.position_cache):
+        cache.ttl = cache.stale_ttl = 0
+    try:
+        portfolio = await get_portfolio([connection("slow", "bybit")], timeout=0.05)
+    finally:
+        for cache in (exchange_service.balance_cache, exchange_service.position_cache):
+            cache.ttl = exchange_service.EXCHANGE_CACHE_TTL_SECONDS
+            cache.stale_ttl = exchange_service.EXCHANGE_CACHE_STALE_SECONDS
+    assert portfolio["venues"][0]["status"] == "late"
+    assert portfolio["total_balance_usd"] == 51000.0
+
+
+def test_net_exposure_converts_contracts_to_base_units():
+    from services.exchange_service import parse_positions
+    from services.portfolio_service import _net_exposure
+
+    markets = {
+        "ETH/USDT:USDT": {"contractSize": 0.01, "linear": True, "inverse": False},
+        "BTC/USD:BTC": {"contractSize": 100, "linear": False, "inverse": True},
+    }
+    positions = parse_positions([
+        # OKX linear swap: 0.01 ETH per contract
+        {"symbol": "ETH/USDT:USDT", "side": "long", "contracts": 300, "markPrice": 2000, "entryPrice": 1900},
+        # Inverse swap: 100 USD per contract, short 20 contracts = 2000 USD of BTC
+        {"symbol": "BTC/USD:BTC", "side": "short", "contracts": 20, "markPrice": 50000, "entryPrice": 50000},
+    ], markets)
+    venue = {"exchange": "okx", "balances": [], "positions": positions}
+
+    assets = {a["asset"]: a for a in _net_exposure([venue])}
+    assert assets["ETH"]["derivatives"] == pytest.approx(3.0)
+    assert assets["ETH"]["usd_value"] == 6000.0
+    assert assets["BTC"]["derivatives"] == pytest.approx(-0.04)
+    assert assets["BTC"]["usd_value"] == -2000.0
@@ -0,0 +1,65 @@
+import pytest
+
+from services.request_limits import RequestLimiter, RouteLimit, request_limiter, route_class
+
+
+def test_routes_are_classified_by_method_and_path():
+    assert route_class("POST", "/api/v1/exchanges/abc/sync") == "sync"
+    assert route_class("GET", "/api/v1/exchanges/abc/balances") == "venue"
+    assert route_class("GET", "/api/v1/journal/stats") == "analytics"
+    assert route_class("GET", "/api/v1/exchanges/abc/stream") == "stream"
+    assert route_class("GET", "/api/v1/trades") == "api"
+    assert route_class("POST", "/api/v1/webhooks/stripe") is None
+    assert route_class("GET", "/") is None
+
+
+@pytest.mark.asyncio
+async def test_sync_requests_beyond_tier_budget_get_429(client, auth_headers):
+    statuses = []
+    for _ in range(3):
+        response = await client.post("/api/v1/exchanges/65a000000000000000000000/sync", headers=auth_headers)
+        statuses.append(response.status_code)
+
+    # Starter: a burst of two syncs, then one every 30 seconds
+    assert statuses == [404, 404, 429]
+    assert 1 <= int(response.headers["Retry-After"]) <= 30
+
+    # Other route classes have their own budget
+    response = await client.get("/api/v1/trades", headers=auth_headers)
+    assert response.status_code == 200
+
+    metrics = request_limiter.metrics()
+    assert metrics["routes"]["sync"]["allowed"] >= 2 and metrics["routes"]["sync"]["limited_rate"] >= 1
+
+
+@pytest.mark.asyncio
+async def test_concurrency_cap_and_tier_limits(mock_db_connection):
+    from database import db
+
+    await db.db["users"].insert_many([
+        {"username": "free"},
+        {"username": "paid", "subscription_tier": "elite"},
+    ])
+    limiter = RequestLimiter()
+
+    assert (await limiter.acquire("free", "sync"))[0]
+    # One sync at a time on starter, even with budget left
+    admitted, wait = await limiter.acquire("free", "sync")
+    assert not admitted and wait > 0
+    limiter.release("free", "sync")
+    assert (await limiter.acquire("free", "sync"))[0]
+
+    results = [(await limiter.acquire("paid", "sync"))[0] for _ in range(4)]
+    assert results == [True] * 4
+    assert limiter.metrics()["routes"]["sync"]["active"] == 5
+
+
+@pytest.mark.asyncio
+async def test_shared_limits_count_across_workers(mock_db_connection):
+    limits = {"api": {"starter": RouteLimit(per_minute=3, burst=10, concurrent=10)}}
+    workers = [RequestLimiter(limits=limits, shared=True) for _ in range(2)]
+
+    admitted = [(await workers[i % 2].acquire("u", "api"))[0] for i in range(4)]
+    # Each worker's own bucket has room, but the per-minute total is shared
+    assert admitted == [True, True, True, False]
+    assert workers[1].metrics()["routes"]["api"]["limited_shared"] == 1
@@ -0,0 +1,18 @@
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_importing_app_does_not_load_heavy_dependencies():
+    probe = (
+        "import json, sys; import main; "
+        "print(json.dumps([m for m in ('ccxt', 'pandas', 'stripe') if m in sys.modules]))"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", probe], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    ).stdout
+
+    assert json.loads(output.strip().splitlines()[-1]) == []
@@ -0,0 +1,249 @@
+import asyncio
+
+import httpx
+import pytest
+
+from services.stock_broker_service import BrokerHTTPPool, TradierClient
+
+PROFILE = {
+    "profile": {
+        "id": "id-1",
+        "account": {
+            "account_number": "VA000001",
+            "type": "margin",
+            "value": "12500.50",
+            "cash": {"cash_available": "2500"},
+            "buying_power": "5000",
+        },
+    }
+}
+
+
+@pytest.mark.asyncio
+async def test_tradier_clients_share_pooled_connection_and_profile():
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        if request.url.path.endswith("/user/profile"):
+            return httpx.Response(200, json=PROFILE, headers={"Set-Cookie": "session=abc; Path=/"})
+        return httpx.Response(404)
+
+    pool = BrokerHTTPPool(transport=httpx.MockTransport(handler))
+    alice = TradierClient("token-a", pool=pool)
+    bob = TradierClient("token-b", pool=pool)
+    assert alice.http is bob.http
+    assert len(pool) == 1
+
+    await alice.get_profile()
+    accounts = await alice.get_accounts()
+    await bob.get_accounts()
+
+    # get_accounts reuses the profile get_profile already fetched
+    assert len(requests) == 2
+    assert accounts[0].account_id == "VA000001"
+    assert accounts[0].total_value == 12500.50
+    # Shared across users: each request carries its own token, no cookies
+    assert [r.headers["Authorization"] for r in requests] == ["Bearer token-a", "Bearer token-b"]
+    assert "cookie" not in requests[1].headers
+
+    await pool.close()
+    assert len(pool) == 0
+    assert alice.http.is_closed
+
+
+def tradier_event(account: str, i: int) -> dict:
+    day = 1 + i // 100
+    return {
+        "id": f"{account}-{i}",
+        "type": "trade",
+        "date": f"2024-03-{day:02d}T00:00:00Z",
+        "amount": "-1000.00",
+        "trade": {"symbol": "AAPL", "trade_type": "buy", "quantity": "10", "price": "100", "commission": "1"},
+    }
+
+
+@pytest.mark.asyncio
+async def test_tradier_sync_pages_accounts_concurrently_from_watermarks(monkeypatch, mock_db_connection):
+    from database import db
+    from services import stock_broker_service
+    from services.stock_broker_service import sync_broker_trades_to_db
+
+    history = {"VA1": [tradier_event("VA1", i) for i in range(1200)], "VA2": [tradier_event("VA2", i) for i in range(30)]}
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/user/profile"):
+            accounts = [{"account_number": a, "type": "margin"} for a in history]
+            return httpx.Response(200, json={"profile": {"account": accounts}})
+        account = request.url.path.split("/")[-2]
+        params = request.url.params
+        calls.append((account, params.get("start"), int(params["page"])))
+        events = [e for e in history[account] if e["date"][:10] >= params.get("start", "")]
+        limit = int(params["limit"])
+        page = events[(int(params["page"]) - 1) * limit:int(params["page"]) * limit]
+        return httpx.Response(200, json={"history": {"event": page} if page else "null"})
+
+    monkeypatch.setattr(stock_broker_service, "broker_http", BrokerHTTPPool(transport=httpx.MockTransport(handler)))
+
+    result = await sync_broker_trades_to_db("tradier", {"access_token": "t"}, "u1", db.db)
+    assert result["success"], result
+    assert result["synced_trades"] == 1230 and result["failed_accounts"] == []
+    # Beyond the 500-event cap: VA1 takes three pages
+    assert sorted(c[2] for c in calls if c[0] == "VA1") == [1, 2, 3]
+    state = await db.db["broker_connections"].find_one({"user_id": "u1", "broker": "tradier"})
+    assert state["sync_watermarks"] == {"VA1": "2024-03-12", "VA2": "2024-03-01"}
+
+    # New events after the watermark: only the watermark day onwards is fetched
+    history["VA1"].append(tradier_event("VA1", 1300))
+    calls.clear()
+    result = await sync_broker_trades_to_db("tradier", {"access_token": "t"}, "u1", db.db)
+    assert result["synced_trades"] == 1
+    assert result["total_fetched"] == 30 + 100 + 1
+    assert {(c[0], c[1]) for c in calls} == {("VA1", "2024-03-12"), ("VA2", "2024-03-01")}
+    assert await db.db["trades"].count_documents({"source": "tradier"}) == 1231
+
+
+class GatewayStub:
+    """In-memory Client Portal gateway whose session starts logged out."""
+
+    def __init__(self, executions):
+        self.executions = executions
+        self.authenticated = False
+        self.calls = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path.replace("/v1/api", "")
+        self.calls.append(path)
+        if path == "/tickle":
+            return httpx.Response(200, json={"session": "s", "iserver": {"authStatus": {"authenticated": self.authenticated}}})
+        if path == "/iserver/reauthenticate":
+            self.authenticated = True
+            return httpx.Response(200, json={"message": "triggered"})
+        if path == "/iserver/auth/status":
+            return httpx.Response(200, json={"authenticated": self.authenticated})
+        if not self.authenticated:
+            return httpx.Response(401)
+        if path == "/iserver/accounts":
+            return httpx.Response(200, json={"accounts": ["U1"]})
+        if path == "/iserver/account/trades":
+            self.days = int(request.url.params["days"])
+            return httpx.Response(200, json=self.executions)
+        return httpx.Response(404)
+
+
+def ibkr_execution(i: int, time_ms: int) -> dict:
+    return {"execution_id": f"e{i}", "symbol": "MSFT", "side": "B", "size": 5, "price": 400.0,
+            "commission": 0.5, "trade_time_r": time_ms}
+
+
+@pytest.mark.asyncio
+async def test_ibkr_session_reauthenticates_keeps_alive_and_syncs_incrementally(monkeypatch, mock_db_connection):
+    import time
+    from database import db
+    from services import stock_broker_service
+    from services.stock_broker_service import IBKRSessionPool, sync_broker_trades_to_db
+
+    now_ms = int(time.time() * 1000)
+    gateway = GatewayStub([ibkr_execution(i, now_ms - (250 - i) * 3_600_000) for i in range(250)])
+    monkeypatch.setattr(stock_broker_service, "broker_http", BrokerHTTPPool(transport=httpx.MockTransport(gateway)))
+    sessions = IBKRSessionPool(tickle_seconds=0.05, reauth_poll_seconds=0)
+    monkeypatch.setattr(stock_broker_service, "ibkr_sessions", sessions)
+
+    try:
+        result = await sync_broker_trades_to_db("ibkr", {}, "u1", db.db)
+        assert result["success"], result
+        assert result["synced_trades"] == 250 and result["pages"] == 3
+        assert gateway.calls[:4] == ["/tickle", "/iserver/reauthenticate", "/iserver/auth/status", "/iserver/accounts"]
+        assert gateway.days == 7
+        stored = await db.db["trades"].find_one({"external_id": "e0"})
+        assert stored["side"] == "BUY" and stored["source"] == "ibkr"
+
+        # The session is kept alive in the background between syncs
+        session = sessions.get()
+        tickles = session.tickles
+        await asyncio.sleep(0.2)
+        assert session.tickles >= tickles + 2
+
+        # Next sync reuses the session and asks only for the days it needs
+        gateway.calls.clear()
+        gateway.executions.append(ibkr_execution(999, now_ms + 1000))
+        result = await sync_broker_trades_to_db("ibkr", {}, "u1", db.db)
+        assert result["synced_trades"] == 1 and result["skipped_trades"] == 1
+        assert "/iserver/reauthenticate" not in gateway.calls
+        assert gateway.days == 1
+    finally:
+        await sessions.close()
+
+
+@pytest.mark.asyncio
+async def test_ibkr_sync_reports_history_past_the_trades_window(monkeypatch, mock_db_connection):
+    import time
+    from database import db
+    from services import stock_broker_service
+    from services.stock_broker_service import IBKRSessionPool, sync_broker_trades_to_db
+
+    now_ms = int(time.time() * 1000)
+    gateway = GatewayStub([ibkr_execution(1, now_ms - 3_600_000)])
+    monkeypatch.setattr(stock_broker_service, "broker_http", BrokerHTTPPool(transport=httpx.MockTransport(gateway)))
+    sessions = IBKRSessionPool(tickle_seconds=60, reauth_poll_seconds=0)
+    monkeypatch.setattr(stock_broker_service, "ibkr_sessions", sessions)
+    # Last synced ten days ago, beyond the 7 days the gateway serves
+    await db.db["broker_connections"].insert_one(
+        {"user_id": "u1", "broker": "ibkr", "sync_watermarks": {"executions": now_ms - 10 * 86_400_000}}
+    )
+
+    try:
+        result = await sync_broker_trades_to_db("ibkr", {}, "u1", db.db)
+        assert result["success"] and result["synced_trades"] == 1
+        assert [w["type"] for w in result["warnings"]] == ["history_gap"]
+        assert gateway.days == 7
+    finally:
+        await sessions.close()
+
+
+@pytest.mark.asyncio
+async def test_ibkr_sessions_only_for_configured_gateway():
+    from services.stock_broker_service import IBKR_GATEWAY_URL, IBKRSessionPool
+
+    sessions = IBKRSessionPool()
+    assert sessions.get() is sessions.get(IBKR_GATEWAY_URL)
+    with pytest.raises(ValueError):
+        sessions.get("http://169.254.169.254/latest")
+    assert len(sessions._sessions) == 1
+    await sessions.close()
+
+
+@pytest.mark.asyncio
+async def test_tradier_watermark_waits_for_last_page_of_newest_first_history(monkeypatch, mock_db_connection):
+    from database import db
+    from services import stock_broker_service
+    from services.stock_broker_service import sync_broker_trades_to_db
+
+    # Newest first, three pages; the first sync breaks on page 2
+    events = [tradier_event("VA1", i) for i in reversed(range(1200))]
+    fail = {"page": 2}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/user/profile"):
+            return httpx.Response(200, json={"profile": {"account": [{"account_number": "VA1", "type": "margin"}]}})
+        params = request.url.params
+        page, limit = int(params["page"]), int(params["limit"])
+        if page == fail["page"]:
+            return httpx.Response(503)
+        rows = [e for e in events if e["date"][:10] >= params.get("start", "")]
+        rows = rows[(page - 1) * limit:page * limit]
+        return httpx.Response(200, json={"history": {"event": rows} if rows else "null"})
+
+    monkeypatch.setattr(stock_broker_service, "broker_http", BrokerHTTPPool(transport=httpx.MockTransport(handler)))
+
+    await sync_broker_trades_to_db("tradier", {"access_token": "t"}, "u1", db.db)
+    state = await db.db["broker_connections"].find_one({"user_id": "u1", "broker": "tradier"})
+    assert state["sync_watermarks"] == {}
+
+    fail["page"] = None
+    result = await sync_broker_trades_to_db("tradier", {"access_token": "t"}, "u1", db.db)
+    assert result["success"], result
+    assert await db.db["trades"].count_documents({"source": "tradier"}) == 1200
+    state = await db.db["broker_connections"].find_one({"user_id": "u1", "broker": "tradier"})
+    assert state["sync_watermarks"] == {"VA1": "2024-03-12"}
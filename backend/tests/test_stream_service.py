@@ -0,0 +1,97 @@
+import asyncio
+import pytest
+
+from services import stream_service
+from services.stream_service import StreamHub, sse_events
+
+
+class FakeWatchClient:
+    has = {"watchMyTrades": True}
+
+    def __init__(self):
+        self.fills = asyncio.Queue()
+        self.closed = False
+
+    async def watch_my_trades(self):
+        return await self.fills.get()
+
+    async def close(self):
+        self.closed = True
+
+
+def fill(fill_id, price=100.0):
+    return {
+        "id": fill_id, "symbol": "BTC/USDT", "side": "buy", "price": price,
+        "amount": 1.0, "cost": price, "timestamp": 1700000000000,
+    }
+
+
+async def next_event(queue, event):
+    while True:
+        message = await asyncio.wait_for(queue.get(), 1)
+        if message["event"] == event:
+            return message
+
+
+@pytest.mark.asyncio
+async def test_websocket_fills_are_stored_and_fanned_out():
+    from database import db
+
+    client = FakeWatchClient()
+    hub = StreamHub(client_factory=lambda connection: client)
+    connection = {"_id": "c1", "user_id": "u1", "exchange": "binance"}
+
+    first = hub.subscribe(db.db, connection)
+    second = hub.subscribe(db.db, connection)
+    assert hub.metrics()["streams"] == 1
+
+    await client.fills.put([fill("t1"), fill("t2")])
+    await client.fills.put([fill("t2"), fill("t3")])
+
+    received = [(await next_event(first, "fill"))["data"]["id"] for _ in range(3)]
+    assert received == ["t1", "t2", "t3"]
+    assert (await next_event(second, "fill"))["data"]["id"] == "t1"
+    assert await db.db["trades"].count_documents({"source": "binance", "user_id": "u1"}) == 3
+
+    hub.unsubscribe("c1", first, linger=0)
+    assert hub.metrics()["streams"] == 1
+    hub.unsubscribe("c1", second, linger=0)
+    await asyncio.sleep(0)
+    assert hub.metrics()["streams"] == 0
+    await asyncio.sleep(0.01)
+    assert client.closed
+
+
+@pytest.mark.asyncio
+async def test_polling_fallback_serves_sse(monkeypatch):
+    from database import db
+    from services.exchange_service import parse_trade
+
+    polls = []
+    discoveries = []
+
+    async def fake_connection_symbols(connection, known_symbols=None):
+        discoveries.append(known_symbols)
+        return ["BTC/USDT"]
+
+    async def fake_fetch_trades(connection, since=None, symbols=None):
+        polls.append(symbols)
+        return [parse_trade(fill("p1"))] if len(polls) == 2 else []
+
+    monkeypatch.setattr(stream_service, "connection_symbols", fake_connection_symbols)
+    monkeypatch.setattr(stream_service, "fetch_trades", fake_fetch_trades)
+    monkeypatch.setattr(stream_service, "STREAM_POLL_MIN_SECONDS", 0.01)
+
+    hub = StreamHub(client_factory=lambda connection: None)
+    connection = {"_id": "c2", "user_id": "u1", "exchange": "binance"}
+    events = sse_events(connection, db.db, hub=hub)
+
+    messages = [await asyncio.wait_for(events.__anext__(), 1) for _ in range(2)]
+    assert messages[0] == 'event: status\ndata: {"mode": "polling"}\n\n'
+    assert messages[1].startswith("event: fill\n") and '"id": "p1"' in messages[1]
+    # Symbols are discovered once, not on every poll
+    assert discoveries == [[]] and all(symbols == ["BTC/USDT"] for symbols in polls)
+
+    await events.aclose()
+    await hub.close()
+    assert hub.metrics()["streams"] == 0
@@ -0,0 +1,59 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from services.sync_pipeline import FillPage, SyncContext, fill_document, run_pipeline
+
+
+def make_page(ctx, ids, watermark):
+    fills = [fill_document(ctx, str(i), "AAPL", "BUY", 1.0, 100.0, datetime(2024, 1, 1)) for i in ids]
+    return FillPage(fills=fills, checkpoint=("broker_connections", {"_id": "state"}, {"$max": {"wm": watermark}}))
+
+
+class SlowWrites:
+    """Database wrapper whose bulk writes take a while."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def __getitem__(self, name):
+        collection = self.db[name]
+        if name != "trades":
+            return collection
+
+        class Slow:
+            def __getattr__(self, attr):
+                return getattr(collection, attr)
+
+            async def bulk_write(self, operations, ordered=True):
+                await asyncio.sleep(0.01)
+                return await collection.bulk_write(operations, ordered=ordered)
+
+        return Slow()
+
+
+@pytest.mark.asyncio
+async def test_pipeline_batches_dedupes_and_applies_backpressure(mock_db_connection):
+    from database import db
+
+    await db.db["broker_connections"].insert_one({"_id": "state", "wm": -1})
+    ctx = SyncContext(source="tradier", user_id="u1", db=SlowWrites(db.db))
+    lead = []
+
+    async def adapter():
+        for n in range(10):
+            lead.append(n - ctx.stats["pages"])
+            # Pages overlap by one fill, like a re-read boundary
+            yield make_page(ctx, range(n * 10, n * 10 + 11), n)
+        raise RuntimeError("venue went away")
+
+    with pytest.raises(RuntimeError):
+        await run_pipeline(ctx, adapter(), batch_size=25, queue_pages=2)
+
+    # The venue is never fetched far ahead of the writer
+    assert max(lead) <= 2 + 1
+    # Everything fetched before the failure is stored, with its watermark
+    assert await db.db["trades"].count_documents({"user_id": "u1"}) == 101
+    assert ctx.stats == {"pages": 10, "fetched": 110, "inserted": 101, "skipped": 9}
+    assert (await db.db["broker_connections"].find_one({"_id": "state"}))["wm"] == 9
@@ -0,0 +1,111 @@
+import asyncio
+import pytest
+from datetime import datetime, timedelta
+
+from services import sync_scheduler as scheduler_module
+from services.sync_scheduler import SyncScheduler, SYNC_INTERVALS
+
+
+@pytest.fixture
+def fake_sync(monkeypatch):
+    calls = []
+
+    async def sync(connection, db):
+        calls.append(connection["_id"])
+        await asyncio.sleep(0.05)
+        return {"success": True, "exchange": connection["exchange"], "synced_trades": 1}
+
+    monkeypatch.setattr(scheduler_module, "sync_trades_to_db", sync)
+    return calls
+
+
+async def insert_connection(db, **fields):
+    doc = {"user_id": "u1", "exchange": "binance", "status": "active", **fields}
+    await db["exchange_connections"].insert_one(doc)
+    return doc
+
+
+@pytest.mark.asyncio
+async def test_concurrent_manual_syncs_share_one_run(fake_sync):
+    from database import db
+
+    connection = await insert_connection(db.db)
+    scheduler = SyncScheduler(max_workers=2)
+
+    results = await asyncio.gather(*[scheduler.sync_now(db.db, connection) for _ in range(3)])
+
+    assert fake_sync == [connection["_id"]]
+    assert all(r["success"] for r in results)
+    assert scheduler.metrics()["deduplicated_total"] == 2
+
+    stored = await db.db["exchange_connections"].find_one({"_id": connection["_id"]})
+    assert stored["sync_lease_owner"] is None
+    assert stored["last_sync"] is not None
+    interval = timedelta(minutes=SYNC_INTERVALS["starter"])
+    assert stored["next_sync_at"] - stored["last_sync"] >= interval * 0.79
+
+
+@pytest.mark.asyncio
+async def test_manual_sync_defers_to_lease_held_elsewhere(fake_sync):
+    from database import db
+
+    connection = await insert_connection(
+        db.db,
+        sync_lease_owner="other-process",
+        sync_lease_until=datetime.utcnow() + timedelta(minutes=5),
+    )
+    result = await SyncScheduler().sync_now(db.db, connection)
+
+    assert result["status"] == "in_progress"
+    assert fake_sync == []
+
+
+@pytest.mark.asyncio
+async def test_manual_sync_waits_for_connection_queued_by_this_process(fake_sync):
+    from database import db
+
+    connection = await insert_connection(db.db, next_sync_at=datetime.utcnow() - timedelta(minutes=1))
+    scheduler = SyncScheduler(max_workers=1)
+    scheduler.db = db.db
+    scheduler._queue = asyncio.Queue()
+    assert await scheduler._enqueue_due(db.db) == 1
+
+    # Leased and queued here but not running yet: the manual sync waits for it
+    manual = asyncio.ensure_future(scheduler.sync_now(db.db, connection))
+    await asyncio.sleep(0.02)
+    assert not manual.done()
+
+    worker = asyncio.create_task(scheduler._worker())
+    try:
+        result = await asyncio.wait_for(manual, 1)
+    finally:
+        worker.cancel()
+    assert result["success"] and result["synced_trades"] == 1
+    assert fake_sync == [connection["_id"]]
+
+
+@pytest.mark.asyncio
+async def test_scheduler_claims_only_due_active_connections(fake_sync):
+    from database import db
+
+    due = await insert_connection(db.db, next_sync_at=datetime.utcnow() - timedelta(minutes=1))
+    await insert_connection(db.db, next_sync_at=datetime.utcnow() + timedelta(hours=1))
+    await insert_connection(db.db, status="disabled")
+
+    scheduler = SyncScheduler(max_workers=2, poll_seconds=3600)
+    scheduler.start(db.db)
+    try:
+        for _ in range(50):
+            if fake_sync and not scheduler.metrics()["running"]:
+                break
+            await asyncio.sleep(0.02)
+    finally:
+        await scheduler.stop()
+
+    assert due["_id"] in fake_sync
+    assert all(
+        c["status"] == "active" and c.get("next_sync_at")
+        for c in await db.db["exchange_connections"].find({"_id": {"$in": fake_sync}}).to_list(None)
+    )
+    stored = await db.db["exchange_connections"].find_one({"_id": due["_id"]})
+    assert stored["next_sync_at"] > datetime.utcnow()
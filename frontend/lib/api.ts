@@ -1,9 +1,14 @@
 import { getSession } from "next-auth/react";
-import { Trade, DashboardStats, JournalResponse, EquityCurveResponse } from "../types";
+import { Trade, DashboardStats, JournalResponse, EquityCurveResponse, ImportJob } from "../types";
 import { TradeFilters } from "../types/filters";
 
 const API_URL = process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000";
 
+// Give up waiting on an import job after this long, or after this many
+// failed status requests in a row
+const IMPORT_POLL_TIMEOUT_MS = 30 * 60 * 1000;
+const IMPORT_POLL_MAX_ERRORS = 5;
+
 class ApiClient {
   private baseUrl: string;
 
@@ -115,7 +120,40 @@ class ApiClient {
       throw new Error(`Import failed: ${response.statusText} - ${errorText}`);
     }
 
-    return response.json();
+    // Imports run as background jobs; poll until the job finishes
+    const { job_id } = (await response.json()) as { job_id: string };
+    const deadline = Date.now() + IMPORT_POLL_TIMEOUT_MS;
+    let pollErrors = 0;
+    let job = await this.getImportJob(job_id);
+    while (job.status === "queued" || job.status === "running") {
+      if (Date.now() > deadline) {
+        throw new Error("Import is taking too long; check the import status later");
+      }
+      await new Promise((resolve) => setTimeout(resolve, 1000));
+      try {
+        job = await this.getImportJob(job_id);
+        pollErrors = 0;
+      } catch (error) {
+        pollErrors += 1;
+        if (pollErrors >= IMPORT_POLL_MAX_ERRORS) {
+          throw error;
+        }
+      }
+    }
+
+    if (job.status === "failed") {
+      throw new Error(`Import failed: ${job.errors[job.errors.length - 1] || "unknown error"}`);
+    }
+
+    return {
+      status: "success",
+      imported: job.imported,
+      message: `Successfully imported ${job.imported} trades`,
+    };
+  }
+
+  async getImportJob(jobId: string): Promise<ImportJob> {
+    return this.fetch<ImportJob>(`/api/v1/imports/${jobId}`);
   }
 
   async getTrade(id: string): Promise<Trade> {
@@ -141,6 +179,45 @@ class ApiClient {
       method: "DELETE",
     });
   }
+
+  // Live fills/positions for an exchange connection (Server-Sent Events).
+  // Uses fetch rather than EventSource so the auth header can be sent.
+  async streamExchange(
+    connectionId: string,
+    onEvent: (event: string, data: unknown) => void,
+    signal?: AbortSignal
+  ): Promise<void> {
+    const session = await getSession();
+    const token = (session as { accessToken?: string })?.accessToken;
+
+    const response = await fetch(`${this.baseUrl}/api/v1/exchanges/${connectionId}/stream`, {
+      headers: { ...(token ? { Authorization: `Bearer ${token}` } : {}) },
+      signal,
+    });
+    if (!response.ok || !response.body) {
+      throw new Error(`Stream failed: ${response.statusText}`);
+    }
+
+    const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+    let buffer = "";
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) return;
+      buffer += value;
+      let boundary;
+      while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+        const block = buffer.slice(0, boundary);
+        buffer = buffer.slice(boundary + 2);
+        let event = "message";
+        let data = "";
+        for (const line of block.split("\n")) {
+          if (line.startsWith("event: ")) event = line.slice(7);
+          else if (line.startsWith("data: ")) data += line.slice(6);
+        }
+        if (data) onEvent(event, JSON.parse(data));
+      }
+    }
+  }
 }
 
 export const api = new ApiClient(API_URL);
@@ -96,3 +96,18 @@ export interface EquityPoint {
 export interface EquityCurveResponse {
   data: EquityPoint[];
 }
+
+export interface ImportJob {
+  id: string;
+  status: "queued" | "running" | "completed" | "failed";
+  filename?: string;
+  total_rows?: number;
+  processed_rows: number;
+  imported: number;
+  skipped: number;
+  progress: number;
+  errors: string[];
+  created_at: string;
+  started_at?: string;
+  finished_at?: string;
+}